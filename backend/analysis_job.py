@@ -0,0 +1,120 @@
+import time
+import threading
+
+from backend.timing import observe_stages
+
+# "ANALYSIS" in the grading config: the kiosk gives up on a capture analysis after timeout_s
+DEFAULT_ANALYSIS_CONFIG = {"timeout_s": 120}
+
+
+class AnalysisCancelled(Exception):
+    """Raised on the analysis thread at the next stage once the job is cancelled or timed out."""
+
+
+class AnalysisJob:
+    """
+    One capture analysis on a background thread, so the Tk thread stays free.
+
+    fn(job) runs on the worker thread. Every timing span it enters (see
+    backend.timing.span) is a stage: on_progress(name) is called and a
+    cancelled job stops there with AnalysisCancelled, so the remaining
+    stages never run. A stage already running (e.g. one inference call) is
+    not interrupted.
+
+    on_done(job) is called exactly once, with job.status one of DONE,
+    FAILED, CANCELLED or TIMED_OUT. After the timeout the job is reported
+    at once; a hung stage keeps its (daemon) thread until it returns, and
+    its result is discarded.
+
+    Both callbacks run on the worker or timer thread; UI code hops back
+    with after().
+    """
+
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+
+    def __init__(self, fn, on_progress=None, on_done=None, timeout=None, name="analysis"):
+        self.fn = fn
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.timeout = timeout
+        self.name = name
+
+        self.status = self.RUNNING
+        self.stage_name = None
+        self.result = None
+        self.error = None
+        self.started = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._timer = None
+
+    # -------------------------------------------------
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        if self.timeout:
+            self._timer = threading.Timer(self.timeout, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def cancel(self):
+        """Stop at the next stage; the job is reported as CANCELLED right away."""
+        self._finish(self.CANCELLED)
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def alive(self):
+        """True while the worker thread runs, including after a timeout or cancel."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started else 0.0
+
+    # -------------------------------------------------
+    def stage(self, name):
+        """Enter a stage: report it, or stop here if the job was cancelled."""
+        if self._cancel.is_set():
+            raise AnalysisCancelled(name)
+        self.stage_name = name
+        if self.on_progress:
+            self.on_progress(name)
+
+    def _run(self):
+        try:
+            with observe_stages(self.stage):
+                result = self.fn(self)
+        except AnalysisCancelled:
+            print(f"[Analysis] {self.name} stopped before stage {self.stage_name!r}")
+            return
+        except Exception as e:
+            self._finish(self.FAILED, error=e)
+            return
+        self._finish(self.DONE, result=result)
+
+    def _expire(self):
+        print(f"[Analysis] {self.name} timed out after {self.timeout} s in stage {self.stage_name!r}")
+        self._finish(self.TIMED_OUT)
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if self.status != self.RUNNING:
+                return
+            self.status = status
+            self.result = result
+            self.error = error
+        if status != self.DONE:
+            self._cancel.set()
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.on_done:
+            self.on_done(self)
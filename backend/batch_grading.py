@@ -0,0 +1,268 @@
+"""
+Headless batch grading of saved captures, without the Tk kiosk.
+
+Runs FinalGradingPipeline (or SingleModelPipeline) over a folder or glob of
+images on N worker processes. Each worker builds its pipeline, and so loads
+its models, once. Rows are streamed to a JSON Lines or CSV report as images
+finish, and throughput stats are written next to it.
+
+    python -m backend.batch_grading captured_images/grading --workers 4 --out session.jsonl
+    python -m backend.batch_grading "captures/**/*.png" --mode single --model "Model 1" --out m1.csv
+"""
+import os
+import csv
+import glob
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+import numpy as np
+from backend.final_grading_pipeline import FinalGradingPipeline, load_grading_config
+from backend.single_model_pipeline import SingleModelPipeline
+from backend.model_registry import MODEL_PATHS
+from backend.parallel_inference import set_intra_op_threads, DEFAULT_DETECTION_CONFIG
+from backend.pcb_detector import PCBDetector
+from backend.quantization import list_images, IMAGE_EXTENSIONS
+
+FINAL_GRADING_MODELS = ["Model 1", "Model 2"]
+TRACE_MODELS = ["Model 1"]  # single-model runs that also measure traces (as on the results page)
+CSV_FIELDS = [
+    "image", "status", "grade", "total_defects", "trace_violations",
+    "defect_summary", "skipped_stages", "cache", "seconds", "error",
+]
+
+# Per-worker state, built once by the pool initializer
+_worker = {}
+
+
+# ---------------- Inputs ----------------
+def collect_images(inputs):
+    """Image paths from folders and glob patterns, de-duplicated and sorted."""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.update(list_images(item))
+        else:
+            paths.update(
+                p for p in glob.glob(item, recursive=True)
+                if p.lower().endswith(IMAGE_EXTENSIONS)
+            )
+    return sorted(paths)
+
+
+# ---------------- Worker ----------------
+def build_pipeline(mode, model_names, intra_op_threads):
+    cfg = load_grading_config()
+    model_cfgs = cfg.get("MODEL_DETECTION_CONFIGS", {})
+
+    if mode == "final":
+        # Models already run in parallel across images; keep each image sequential
+        return FinalGradingPipeline(
+            model_folders=[MODEL_PATHS[n] for n in model_names],
+            model_configs={MODEL_PATHS[n]: model_cfgs.get(n, DEFAULT_DETECTION_CONFIG) for n in model_names},
+            execution_mode="sequential",
+            intra_op_threads=intra_op_threads,
+        )
+
+    name = model_names[0]
+    return SingleModelPipeline(
+        model_path=MODEL_PATHS[name],
+        model_config=model_cfgs.get(name, DEFAULT_DETECTION_CONFIG),
+        enable_trace=name in TRACE_MODELS,
+    )
+
+
+def init_worker(mode, model_names, intra_op_threads, annotated_dir):
+    """
+    Pool initializer. A failure here would only surface as BrokenProcessPool,
+    so it is kept and reported on every row this worker grades instead.
+    """
+    set_intra_op_threads(intra_op_threads)
+    _worker["mode"] = mode
+    _worker["annotated_dir"] = annotated_dir
+    try:
+        _worker["pipeline"] = build_pipeline(mode, model_names, intra_op_threads)
+        _worker["detector"] = PCBDetector()
+    except Exception as e:
+        _worker["error"] = f"worker setup failed: {type(e).__name__}: {e}"
+        print(f"[Batch Grading] {_worker['error']}")
+
+
+def summarize(path, result, mode):
+    """Report row for one pipeline result (arrays and images are dropped)."""
+    defect_summary = result.get("defect_summary", {})
+    if mode == "final":
+        trace_coords = result.get("trace_coords") or []
+    else:
+        trace_coords = (result.get("trace") or {}).get("trace_coords") or []
+
+    return {
+        "image": path,
+        "status": "ok",
+        "grade": result.get("grade"),
+        "total_defects": sum(defect_summary.values()),
+        "trace_violations": len(trace_coords),
+        "defect_summary": defect_summary,
+        "skipped_stages": result.get("skipped_stages", []),
+        "cache": result.get("cache"),
+        "timings": result.get("timings", {}),
+    }
+
+
+def grade_image(path):
+    start = time.perf_counter()
+    row = {"image": path}
+    if "error" in _worker:
+        row.update(status="error", error=_worker["error"], seconds=0.0)
+        return row
+    try:
+        frame = cv2.imread(path)
+        detection = _worker["detector"].detect(frame) if frame is not None else None
+        if frame is None:
+            row.update(status="error", error="unreadable image")
+        elif detection is None or not detection.detected:
+            row.update(status="no_pcb")
+        else:
+            result = _worker["pipeline"].run(
+                image_path=path, annotated_dir=_worker["annotated_dir"], image=frame, pcb_detection=detection
+            )
+
+            if result is None:
+                row.update(status="no_pcb")
+            else:
+                row = summarize(path, result, _worker["mode"])
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+
+    row["seconds"] = round(time.perf_counter() - start, 4)
+    return row
+
+
+# ---------------- Report ----------------
+class ReportWriter:
+    """Streams rows to .jsonl or .csv so an interrupted overnight run keeps what it finished."""
+
+    def __init__(self, path):
+        self.path = path
+        self.csv = path.lower().endswith(".csv")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._f = open(path, "w", newline="")
+        if self.csv:
+            self._writer = csv.DictWriter(self._f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+            self._writer.writeheader()
+
+    def write(self, row):
+        if self.csv:
+            flat = dict(row)
+            for key in ("defect_summary", "skipped_stages"):
+                if key in flat:
+                    flat[key] = json.dumps(flat[key])
+            self._writer.writerow(flat)
+        else:
+            self._f.write(json.dumps(row) + "\n")
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def throughput_stats(rows, wall_seconds, workers):
+    seconds = np.array([r["seconds"] for r in rows]) if rows else np.zeros(1)
+    grades = {}
+    for r in rows:
+        if r["status"] == "ok":
+            grades[r.get("grade")] = grades.get(r.get("grade"), 0) + 1
+
+    return {
+        "images": len(rows),
+        "ok": sum(r["status"] == "ok" for r in rows),
+        "no_pcb": sum(r["status"] == "no_pcb" for r in rows),
+        "errors": sum(r["status"] == "error" for r in rows),
+        "workers": workers,
+        "wall_seconds": round(wall_seconds, 2),
+        "images_per_second": round(len(rows) / max(wall_seconds, 1e-9), 3),
+        "per_image_seconds": {
+            "mean": round(float(seconds.mean()), 4),
+            "p50": round(float(np.percentile(seconds, 50)), 4),
+            "p95": round(float(np.percentile(seconds, 95)), 4),
+        },
+        "grades": grades,
+        "trace_violations": sum(r.get("trace_violations", 0) for r in rows),
+    }
+
+
+# ---------------- Batch ----------------
+def run_batch(images, mode, model_names, workers, intra_op_threads, annotated_dir, out_path):
+    writer = ReportWriter(out_path)
+    rows = []
+    start = time.perf_counter()
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(mode, model_names, intra_op_threads, annotated_dir),
+        ) as executor:
+            futures = [executor.submit(grade_image, path) for path in images]
+            for i, future in enumerate(as_completed(futures), 1):
+                row = future.result()
+                rows.append(row)
+                writer.write(row)
+                print(f"[Batch Grading] {i}/{len(images)} {os.path.basename(row['image'])}: "
+                      f"{row['status']} {row.get('grade') or ''}".rstrip())
+    finally:
+        writer.close()
+
+    return rows, throughput_stats(rows, time.perf_counter() - start, workers)
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Grade saved PCB captures without the kiosk UI.")
+    parser.add_argument("inputs", nargs="+", help="image folders and/or glob patterns")
+    parser.add_argument("--mode", choices=["final", "single"], default="final")
+    parser.add_argument("--models", nargs="+", default=None,
+                        help="model names; final grading default: Model 1 Model 2")
+    parser.add_argument("--model", default=None, help="shorthand for a single model, e.g. 'Model 1'")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--intra-op-threads", type=int, default=1, help="torch threads per worker")
+    parser.add_argument("--annotated-dir", default="annotated_images/batch")
+    parser.add_argument("--out", default="batch_report.jsonl", help=".jsonl or .csv report")
+    parser.add_argument("--stats", default=None, help="stats JSON (default: next to the report)")
+    args = parser.parse_args()
+
+    if args.model and args.models:
+        parser.error("pass --model or --models, not both")
+    if args.mode == "single" and not args.model and len(args.models or []) != 1:
+        parser.error("--mode single grades with exactly one model: pass --model NAME")
+    model_names = [args.model] if args.model else (args.models or FINAL_GRADING_MODELS)
+    unknown = [n for n in model_names if n not in MODEL_PATHS]
+    if unknown:
+        parser.error(f"Unknown model(s): {', '.join(unknown)}")
+
+    images = collect_images(args.inputs)
+    if not images:
+        parser.error("No images found")
+
+    print(f"[Batch Grading] {len(images)} images, mode={args.mode}, models={model_names}, workers={args.workers}")
+    rows, stats = run_batch(
+        images, args.mode, model_names, args.workers, args.intra_op_threads, args.annotated_dir, args.out
+    )
+
+    stats_path = args.stats or os.path.splitext(args.out)[0] + "_stats.json"
+    with open(stats_path, "w") as f:
+        json.dump(stats, f, indent=2)
+
+    print(
+        f"[Batch Grading] {stats['ok']} graded, {stats['no_pcb']} without PCB, {stats['errors']} errors "
+        f"in {stats['wall_seconds']} s ({stats['images_per_second']} images/s)"
+    )
+    print(f"[Batch Grading] Report: {args.out}  Stats: {stats_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,17 +2,43 @@ import os
 import cv2
 import json
 import numpy as np
-from ultralytics import YOLO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from ui.theme import theme
-from backend.run_trace_detection import run_trace_detection_and_save
+from backend.run_trace_detection import (
+    run_trace_detection_and_save, log_cached_trace_result, trace_options, DEFAULT_TRACE_CONFIG
+)
+from backend.model_registry import model_registry, resolve_model_paths, DEFAULT_BUDGET_MB, MODEL_PATHS
+from backend.parallel_inference import run_models, DEFAULT_DETECTION_CONFIG
+from backend.inference_backend import (
+    load_backend, crop_to_roi, shift_detections, filter_detections, adaptive_imgsz
+)
+from backend.nms import nms_by_label, CROSS_MODEL_NMS_IOU
+from backend.timing import run_timer, span, DEFAULT_TIMINGS_CONFIG
+from backend.result_cache import (
+    result_cache, frame_digest, config_digest, weights_digest, make_key, MISS, DEFAULT_RESULT_CACHE_CONFIG
+)
 
 CONFIG_PATH = "/home/jmc2/VisionBoard-Proj/config/grading_config.json"
+TRACE_STAGE = "traces"
 
 # ---------------- Config ----------------
 DEFAULT_CONFIG = {
     "DEFECT_GRADE_THRESHOLDS": {"A": 5, "B": 20, "C": 50, "F": 100},
     "MIN_BOX_WIDTH": 6,
     "MIN_BOX_HEIGHT": 6,
+    "MODEL_CACHE_BUDGET_MB": DEFAULT_BUDGET_MB,
+    "PARALLEL_INFERENCE": {"mode": "sequential", "workers": 2, "intra_op_threads": 2},
+    "ROI_PADDING": 0.05,
+    # Run stages one by one and stop once the grade can no longer change.
+    # "order" lists model names/folders and "traces"; unlisted stages follow in default order.
+    "CASCADE": {"enabled": False, "order": []},
+    # Per-stage timings in every result and a rolling aggregate for the webserver
+    "TIMINGS": DEFAULT_TIMINGS_CONFIG,
+    # Analysis results keyed by image, weights and config: LRU in memory plus a size-capped folder
+    "RESULT_CACHE": DEFAULT_RESULT_CACHE_CONFIG,
+    # Trace analysis options: clearance engine, coarse-to-fine scale and width measurement
+    "TRACES": DEFAULT_TRACE_CONFIG,
     "CUSTOM_DEFECT_COLORS": theme.themes["dark"]["defect_colors"],
 }
 
@@ -41,62 +67,105 @@ def get_color(label, custom_colors):
     return tuple(reversed(rgb))
 
 
+def load_frame(image=None, image_path=None):
+    """
+    Return the BGR frame to analyse.
+    An in-memory frame is used as-is; the path is only decoded as a fallback.
+    """
+    if image is not None:
+        return image
+    if image_path:
+        return cv2.imread(image_path)
+    return None
+
+
+def frame_basename(image_path=None):
+    """File name for derived images (annotated copies) of a frame."""
+    if image_path:
+        return os.path.basename(image_path)
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f") + ".png"
+
+
+def capture_id_for(image_path=None):
+    """Id under which a capture's trace measurements are logged (None: content hash)."""
+    return os.path.basename(image_path) if image_path else None
+
+
+# One writer thread for all archived images; executor threads are joined at
+# interpreter exit, so pending writes still finish.
+_archive_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="archive")
+
+
+def _write_image(path, image):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if not cv2.imwrite(path, image):
+        print(f"[Archive] Failed to write {path}")
+
+
+def archive_image(path, image):
+    """Queue an image for writing to disk off the analysis path."""
+    return _archive_writer.submit(_write_image, path, image)
+
+
 # ---------------- Pipeline ----------------
 class FinalGradingPipeline:
-    def __init__(self, model_folders: list, model_configs: dict):
+    def __init__(self, model_folders: list, model_configs: dict, execution_mode=None,
+                 workers=None, intra_op_threads=None):
         """
         model_folders: list of folders, each containing .pt files
         model_configs: dict mapping model folder or file to config dict
+        execution_mode: "sequential", "thread" or "process" (default from PARALLEL_INFERENCE)
+        workers: pool size for parallel modes (default: one per model)
+        intra_op_threads: torch threads per worker process ("process" mode only), so parallel models don't oversubscribe cores
         """
+        cfg = load_grading_config()
+        parallel_cfg = {**DEFAULT_CONFIG["PARALLEL_INFERENCE"], **cfg.get("PARALLEL_INFERENCE", {})}
+        self.execution_mode = execution_mode or parallel_cfg["mode"]
+        self.workers = workers or parallel_cfg["workers"]
+        self.intra_op_threads = intra_op_threads or parallel_cfg["intra_op_threads"]
+
         self.model_configs = model_configs
         self.models = []
-        # Load all .pt files in all model folders
+        self.stage_names = {}
+        self.model_folders = {}
+        model_registry.set_budget(cfg["MODEL_CACHE_BUDGET_MB"])
+
+        # Borrow every .pt file in every model folder from the shared registry,
+        # using the inference backend selected in its config ("backend" key).
+        # Process workers keep their own registry, so the parent doesn't load weights.
         for folder in model_folders:
-            if os.path.isdir(folder):
-                pt_files = [
-                    os.path.join(folder, f)
-                    for f in os.listdir(folder)
-                    if f.endswith(".pt")
-                ]
-                for pt in pt_files:
-                    model = YOLO(pt)
-                    model._path = pt  # store the path ourselves
-                    self.models.append(model)
-            elif os.path.isfile(folder) and folder.endswith(".pt"):
-                model = YOLO(folder)
-                model._path = folder
-                self.models.append(model)
+            for pt in resolve_model_paths(folder):
+                cfg_m = model_configs.get(pt) or model_configs.get(folder, DEFAULT_DETECTION_CONFIG)
+                model = load_backend(pt, cfg_m.get("backend")) if self.execution_mode != "process" else None
+                self.models.append((pt, model, cfg_m))
+                self.stage_names[pt] = self.stage_name(folder, pt)
+                self.model_folders[pt] = folder
 
     @staticmethod
-    def non_max_suppression(boxes, scores, iou_thresh=0.3):
-        if not boxes:
-            return []
-
-        boxes = np.array(boxes)
-        scores = np.array(scores)
-
-        x1, y1, x2, y2 = boxes.T
-        areas = (x2 - x1) * (y2 - y1)
-        order = scores.argsort()[::-1]
-
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
+    def stage_name(folder, pt):
+        """Readable stage name, e.g. 'Model 1:best.pt'."""
+        names = {os.path.abspath(p): name for name, p in MODEL_PATHS.items()}
+        return f"{names.get(os.path.abspath(folder), folder)}:{os.path.basename(pt)}"
 
-            xx1 = np.maximum(x1[i], x1[order[1:]])
-            yy1 = np.maximum(y1[i], y1[order[1:]])
-            xx2 = np.minimum(x2[i], x2[order[1:]])
-            yy2 = np.minimum(y2[i], y2[order[1:]])
-
-            w = np.maximum(0, xx2 - xx1)
-            h = np.maximum(0, yy2 - yy1)
-            inter = w * h
-            iou = inter / (areas[i] + areas[order[1:]] - inter)
+    def cascade_stages(self, order):
+        """
+        (name, job) pairs in cascade order; the trace stage has job None.
+        order entries match a model name, folder or weight path, or "traces".
+        """
+        stages = [(self.stage_names[job[0]], job) for job in self.models] + [(TRACE_STAGE, None)]
 
-            order = order[np.where(iou <= iou_thresh)[0] + 1]
+        def position(stage):
+            name, job = stage
+            if job is None:
+                keys = {TRACE_STAGE}
+            else:
+                keys = {name.split(":")[0], os.path.abspath(job[0]), os.path.abspath(self.model_folders[job[0]])}
+            for i, entry in enumerate(order):
+                if entry in keys or os.path.abspath(entry) in keys:
+                    return i
+            return len(order)
 
-        return keep
+        return sorted(stages, key=position)
 
     @staticmethod
     def compute_grade(total, thresholds):
@@ -105,76 +174,119 @@ class FinalGradingPipeline:
                 return grade
         return list(thresholds.keys())[-1]
 
+    @classmethod
+    def grade_is_final(cls, total, thresholds):
+        """
+        True when more defects can no longer change compute_grade(total),
+        i.e. every bucket boundary above total maps to the same grade.
+        """
+        grade = cls.compute_grade(total, thresholds)
+        return all(
+            cls.compute_grade(limit + 1, thresholds) == grade
+            for limit in thresholds.values()
+            if limit >= total
+        )
+
+    @staticmethod
+    def collect_detections(output, offset, cfg, frame_shape, all_boxes, all_labels, all_scores):
+        """Shift one model's detections to frame coordinates and keep the plausible boxes."""
+        boxes, labels, scores = filter_detections(
+            shift_detections(output, offset),
+            frame_shape,
+            min_w=cfg["MIN_BOX_WIDTH"],
+            min_h=cfg["MIN_BOX_HEIGHT"],
+            min_area=50,
+            min_ratio=0.0001,
+        )
+        all_boxes.extend(boxes)
+        all_labels.extend(labels)
+        all_scores.extend(scores)
+
     # ---------------- Run ----------------
-    def run(self, image_path, annotated_dir):
+    def run(self, image_path=None, annotated_dir="annotated_images/grading", image=None, pcb_detection=None):
+        """
+        image: decoded BGR frame (preferred, avoids re-reading the capture)
+        image_path: capture on disk, used when no frame is given and for naming outputs
+        pcb_detection: PCBDetectionResult for the frame; inference then only covers the padded board
+            and trace detection reuses it instead of detecting the board again
+        Result carries a per-stage "timings" breakdown (ms) and "cache": "memory", "disk" or "miss".
+        """
         cfg = load_grading_config()
-        img = cv2.imread(image_path)
+        with run_timer("final_grading", cfg) as timer:
+            result = self._run(cfg, image_path, annotated_dir, image, pcb_detection)
+        if result is not None:
+            result["timings"] = timer.timings
+        return result
+
+    def cache_key(self, cfg, img, roi_box):
+        """Result cache key: frame content, board crop, model weights and detection config."""
+        cascade = {**DEFAULT_CONFIG["CASCADE"], **cfg.get("CASCADE", {})}
+        config = {
+            "models": [cfg_m for _, _, cfg_m in self.models],
+            "min_box": (cfg["MIN_BOX_WIDTH"], cfg["MIN_BOX_HEIGHT"]),
+            # Only the cascade makes the analysis itself depend on the grade thresholds
+            "cascade": (cascade, cfg["DEFECT_GRADE_THRESHOLDS"]) if cascade["enabled"] else None,
+            "traces": trace_options(cfg),
+        }
+        return make_key(
+            "final", frame_digest(img), roi_box,
+            weights_digest([pt for pt, _, _ in self.models]), config_digest(config),
+        )
+
+    def _run(self, cfg, image_path, annotated_dir, image, pcb_detection):
+        with span("decode"):
+            img = load_frame(image, image_path)
         if img is None:
             return None
 
         annotated = img.copy()
-        H, W = img.shape[:2]
-        img_area = H * W
 
-        all_boxes, all_labels, all_scores = [], [], []
-
-        # -------- YOLO inference for all models --------
-        for model in self.models:
-            cfg_m = self.model_configs.get(getattr(model, "_path", None), {"conf":0.25, "iou":0.5, "max_det":300})
-            results = model.predict(
-                image_path,
-                conf=cfg_m["conf"],
-                iou=cfg_m["iou"],
-                max_det=cfg_m["max_det"],
-                save=False,
+        # -------- Restrict inference to the board --------
+        with span("roi"):
+            roi, offset = crop_to_roi(img, pcb_detection, cfg["ROI_PADDING"])
+            imgsz = adaptive_imgsz(roi.shape) if roi is not img else None
+
+        thresholds = cfg["DEFECT_GRADE_THRESHOLDS"]
+
+        # -------- Result cache --------
+        with span("cache_lookup"):
+            result_cache.configure(cfg.get("RESULT_CACHE"))
+            key = self.cache_key(cfg, img, (*offset, *roi.shape[:2]))
+            analysis, cache_tier = result_cache.get(key)
+            if analysis is not None and analysis["trace"][0] and not os.path.exists(analysis["trace"][0]):
+                # The trace log has since rotated the annotated PNG away (or never wrote it)
+                analysis, cache_tier = None, MISS
+
+        if analysis is None:
+            analysis = self.analyse(cfg, img, roi, offset, imgsz, pcb_detection, capture_id_for(image_path))
+            with span("cache_store"):
+                result_cache.put(key, analysis)
+        else:
+            print(f"[Final Grading] Result cache hit ({cache_tier})")
+
+        final_boxes, final_labels = analysis["boxes"], analysis["labels"]
+        trace_img, trace_dists, trace_coords = analysis["trace"]
+        skipped_stages = analysis["skipped_stages"]
+        if cache_tier != MISS and TRACE_STAGE not in skipped_stages:
+            # Trace detection didn't run; still log its results under this capture
+            log_cached_trace_result(
+                capture_id_for(image_path) or frame_digest(img), trace_coords, trace_dists, trace_img
             )
-            if not results or results[0].boxes is None:
-                continue
-
-            boxes = results[0].boxes
-            names = model.names
-            for i, box in enumerate(boxes.xyxy):
-                x1, y1, x2, y2 = map(int, box)
-                bw, bh = x2 - x1, y2 - y1
-                area = bw * bh
-
-                if (
-                    bw < cfg["MIN_BOX_WIDTH"]
-                    or bh < cfg["MIN_BOX_HEIGHT"]
-                    or area < 50
-                    or area / img_area < 0.0001
-                ):
-                    continue
-
-                all_boxes.append([x1, y1, x2, y2])
-                all_labels.append(names.get(int(boxes.cls[i]), "unknown"))
-                all_scores.append(float(boxes.conf[i]))
-
-        # -------- NMS --------
-        final_boxes, final_labels = [], []
-        for lbl in set(all_labels):
-            idxs = [i for i, l in enumerate(all_labels) if l == lbl]
-            keep = self.non_max_suppression([all_boxes[i] for i in idxs], [all_scores[i] for i in idxs])
-            for i in keep:
-                final_boxes.append(all_boxes[idxs[i]])
-                final_labels.append(lbl)
-
-        # -------- Trace detection --------
-        trace_img, trace_dists, trace_coords = run_trace_detection_and_save(img, visualize=True)
 
         # -------- Draw + Count --------
         defect_summary = {}
-        for box, label in zip(final_boxes, final_labels):
-            x1, y1, x2, y2 = box
-            cv2.rectangle(annotated, (x1, y1), (x2, y2), get_color(label, cfg["CUSTOM_DEFECT_COLORS"]), 2)
-            defect_summary[label] = defect_summary.get(label, 0) + 1
+        with span("draw"):
+            for box, label in zip(final_boxes, final_labels):
+                x1, y1, x2, y2 = box
+                cv2.rectangle(annotated, (x1, y1), (x2, y2), get_color(label, cfg["CUSTOM_DEFECT_COLORS"]), 2)
+                defect_summary[label] = defect_summary.get(label, 0) + 1
 
-        os.makedirs(annotated_dir, exist_ok=True)
-        out_path = os.path.join(annotated_dir, os.path.basename(image_path))
-        cv2.imwrite(out_path, annotated)
+        out_path = os.path.join(annotated_dir, frame_basename(image_path))
+        with span("archive"):
+            archive_image(out_path, annotated)
 
         total = sum(defect_summary.values())
-        grade = self.compute_grade(total, cfg["DEFECT_GRADE_THRESHOLDS"])
+        grade = self.compute_grade(total, thresholds)
 
         return {
             "defect_summary": defect_summary,
@@ -182,5 +294,85 @@ class FinalGradingPipeline:
             "trace_distances": trace_dists,
             "trace_coords": trace_coords,
             "grade": grade,
+            "skipped_stages": skipped_stages,
             "annotated_image_path": out_path,
+            "annotated_image": annotated,
+            "cache": cache_tier,
+        }
+
+    def analyse(self, cfg, img, roi, offset, imgsz, pcb_detection=None, capture_id=None):
+        """
+        Detections after NMS plus trace results for one frame; the cacheable part of a run.
+        Returns {"boxes", "labels", "trace": (image path, distances, coords), "skipped_stages"}.
+        """
+        all_boxes, all_labels, all_scores = [], [], []
+        thresholds = cfg["DEFECT_GRADE_THRESHOLDS"]
+        cascade = {**DEFAULT_CONFIG["CASCADE"], **cfg.get("CASCADE", {})}
+        trace_img, trace_dists, trace_coords = None, [], []
+        skipped_stages = []
+
+        if cascade["enabled"]:
+            # -------- Cascade: one stage at a time, stop once the grade is decided --------
+            # Assumes later models only add defects, so the merged count is a lower bound.
+            keep = []
+            for name, job in self.cascade_stages(cascade["order"]):
+                if self.grade_is_final(len(keep), thresholds):
+                    skipped_stages.append(name)
+                    continue
+
+                if job is None:
+                    with span("trace_detection"):
+                        trace_img, trace_dists, trace_coords = run_trace_detection_and_save(
+                            img, visualize=True, pcb_detection=pcb_detection, capture_id=capture_id,
+                            **trace_options(cfg)
+                        )
+                    continue
+
+                with span("inference"):
+                    # Same execution mode as the full run: in "process" mode the stage runs in
+                    # the worker pool, since the parent holds no weights
+                    output = run_models(
+                        [job], roi,
+                        mode=self.execution_mode,
+                        workers=self.workers,
+                        intra_op_threads=self.intra_op_threads,
+                        imgsz=imgsz,
+                    )[0]
+                with span("filter"):
+                    self.collect_detections(output, offset, cfg, img.shape, all_boxes, all_labels, all_scores)
+                with span("nms"):
+                    keep = nms_by_label(all_boxes, all_scores, all_labels, CROSS_MODEL_NMS_IOU)
+
+            if skipped_stages:
+                print(f"[Final Grading] Grade decided early, skipped: {', '.join(skipped_stages)}")
+        else:
+            # -------- YOLO inference for all models --------
+            with span("inference"):
+                outputs = run_models(
+                    self.models, roi,
+                    mode=self.execution_mode,
+                    workers=self.workers,
+                    intra_op_threads=self.intra_op_threads,
+                    imgsz=imgsz,
+                )
+            with span("filter"):
+                for output in outputs:
+                    self.collect_detections(output, offset, cfg, img.shape, all_boxes, all_labels, all_scores)
+
+            # -------- NMS --------
+            with span("nms"):
+                keep = nms_by_label(all_boxes, all_scores, all_labels, CROSS_MODEL_NMS_IOU)
+
+            # -------- Trace detection --------
+            with span("trace_detection"):
+                trace_img, trace_dists, trace_coords = run_trace_detection_and_save(
+                    img, visualize=True, pcb_detection=pcb_detection, capture_id=capture_id,
+                    **trace_options(cfg)
+                )
+
+        return {
+            "boxes": [all_boxes[i] for i in keep],
+            "labels": [all_labels[i] for i in keep],
+            "trace": (trace_img, trace_dists, trace_coords),
+            "skipped_stages": skipped_stages,
         }
@@ -1,8 +1,10 @@
 import time
 import hmac
+import argparse
 import hashlib
 import os
 import requests
+from urllib.parse import quote
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -25,6 +27,15 @@ def get_ngrok_url(retry=10, delay=1):
     return None
 
 
+def sign(purpose, fields, expires):
+    """
+    HMAC over purpose|fields|expires. purpose is the endpoint ("download",
+    "timings", "traces"), so a signature issued for one is never valid for another.
+    """
+    message = "|".join([purpose, *fields, str(expires)]).encode()
+    return hmac.new(SECRET_KEY, message, hashlib.sha256).hexdigest()
+
+
 def generate_download_url(model, filename):
     """Generate a signed download URL with 5 min expiry."""
     ngrok_url = get_ngrok_url()
@@ -32,8 +43,7 @@ def generate_download_url(model, filename):
         raise RuntimeError("Ngrok tunnel not running. QR codes will not work.")
 
     expires = int(time.time() + 300)  # 5 minutes
-    message = f"{model}|{filename}|{expires}".encode()
-    signature = hmac.new(SECRET_KEY, message, hashlib.sha256).hexdigest()
+    signature = sign("download", (model, filename), expires)
 
     return (
         f"{ngrok_url}/download"
@@ -43,3 +53,40 @@ def generate_download_url(model, filename):
         f"&sig={signature}"
     )
 
+
+
+def generate_signed_url(resource, name="", ttl=300):
+    """
+    Signed URL for the /timings (resource "timings") and /traces/<capture_id>
+    (resource "traces", name = capture id) endpoints, valid for ttl seconds.
+    """
+    ngrok_url = get_ngrok_url()
+    if not ngrok_url:
+        raise RuntimeError("Ngrok tunnel not running.")
+
+    expires = int(time.time() + ttl)
+    if resource == "traces":
+        path, fields = f"/traces/{quote(name, safe='')}", (name,)
+    else:
+        path, fields = f"/{resource}", ()
+    return f"{ngrok_url}{path}?expires={expires}&sig={sign(resource, fields, expires)}"
+
+
+# ---------------- CLI ----------------
+def main():
+    """Print a signed link to the timings or trace log pages for staff."""
+    parser = argparse.ArgumentParser(description="Print a signed link to a VisionBoard status endpoint.")
+    parser.add_argument("resource", choices=["timings", "traces"])
+    parser.add_argument("capture_id", nargs="?", default="", help="capture file name (traces only)")
+    parser.add_argument("--ttl", type=int, default=300, help="link lifetime in seconds")
+    args = parser.parse_args()
+
+    if args.resource == "traces" and not args.capture_id:
+        parser.error("traces needs a capture id")
+    if args.resource == "timings" and args.capture_id:
+        parser.error("timings takes no capture id")
+    print(generate_signed_url(args.resource, args.capture_id, args.ttl))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import os
+import json
+import shutil
+import hashlib
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from backend.model_registry import model_registry
+
+# ---------------- Config ----------------
+EXPORT_CACHE_DIR = "/home/jmc2/VisionBoard-Proj/machine_learning_models/.export_cache"
+DEFAULT_BACKEND = "torch"
+DEFAULT_IMGSZ = 640
+ONNX_OPSET = 12
+MAX_WH = 7680  # per-class box offset for class-aware NMS (same trick as ultralytics)
+
+# Common output of every backend; unpacks like the (xyxy, conf, cls, names) tuple
+Detections = namedtuple("Detections", ["xyxy", "conf", "cls", "names"])
+
+_hash_memo = {}
+_export_lock = threading.Lock()
+
+
+# ---------------- Content hashing ----------------
+def file_sha256(path, chunk_size=1 << 20):
+    """Content hash of a file, memoized per (path, mtime, size)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    if memo_key not in _hash_memo:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        _hash_memo[memo_key] = h.hexdigest()
+    return _hash_memo[memo_key]
+
+
+# ---------------- Export cache ----------------
+def export_onnx(pt_path, imgsz=DEFAULT_IMGSZ, dynamic=False):
+    """
+    Export a .pt model to ONNX once and cache it by content hash.
+    Returns (onnx_path, metadata) where metadata holds class names and input size.
+    dynamic: export with dynamic height/width so callers can pick the input size per frame.
+    Only a cache miss imports torch/ultralytics.
+    """
+    digest = file_sha256(pt_path)
+    base = os.path.join(EXPORT_CACHE_DIR, f"{digest}_{imgsz}" + ("_dyn" if dynamic else ""))
+    onnx_path, meta_path = base + ".onnx", base + ".json"
+
+    with _export_lock:
+        if not (os.path.exists(onnx_path) and os.path.exists(meta_path)):
+            from ultralytics import YOLO
+
+            print(f"[Export Cache] Exporting {pt_path} to ONNX (first use)")
+            os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+            model = YOLO(pt_path, task="detect")
+            exported = model.export(format="onnx", imgsz=imgsz, opset=ONNX_OPSET, dynamic=dynamic)
+            shutil.move(str(exported), onnx_path)
+
+            meta = {
+                "source": os.path.abspath(pt_path),
+                "sha256": digest,
+                "imgsz": [imgsz, imgsz],
+                "dynamic": dynamic,
+                "names": {str(k): v for k, v in model.names.items()},
+            }
+            tmp = meta_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(meta, f, indent=2)
+            os.replace(tmp, meta_path)
+
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    meta["names"] = {int(k): v for k, v in meta["names"].items()}
+    return onnx_path, meta
+
+
+# ---------------- Pre/post processing ----------------
+def adaptive_imgsz(shape, long_side=DEFAULT_IMGSZ, stride=32):
+    """
+    Network input size (h, w) that follows the aspect ratio of `shape`:
+    the long side is `long_side`, the short side is rounded up to the stride.
+    """
+    h, w = shape[:2]
+    scale = long_side / max(h, w)
+    return (
+        max(stride, int(np.ceil(h * scale / stride)) * stride),
+        max(stride, int(np.ceil(w * scale / stride)) * stride),
+    )
+
+
+def crop_to_roi(img, pcb_detection, pad_ratio):
+    """
+    View of the padded PCB region of a frame and its (x, y) offset.
+    Returns the full frame with offset (0, 0) when no board was detected.
+    """
+    if pcb_detection is None or not pcb_detection.detected or pcb_detection.bbox is None:
+        return img, (0, 0)
+    x1, y1, x2, y2 = pcb_detection.padded_bbox(img.shape, pad_ratio)
+    return img[y1:y2, x1:x2], (x1, y1)
+
+
+def shift_detections(dets, offset):
+    """Map Detections from ROI coordinates back to frame coordinates."""
+    if dets is None or offset == (0, 0):
+        return dets
+    ox, oy = offset
+    return dets._replace(xyxy=dets.xyxy + np.array([ox, oy, ox, oy], dtype=dets.xyxy.dtype))
+
+
+def filter_detections(dets, frame_shape, min_w, min_h, min_area, min_ratio, max_ratio=None, clip=False):
+    """
+    Drop implausible boxes with one mask over the Detections arrays.
+    Boxes are truncated to whole pixels (and optionally clipped to the frame)
+    before the size and area-ratio tests; Python objects are only built for
+    the survivors. Returns (boxes, labels, scores) lists.
+    """
+    if dets is None or len(dets.xyxy) == 0:
+        return [], [], []
+
+    H, W = frame_shape[:2]
+    xyxy = np.asarray(dets.xyxy).astype(np.int64)  # truncates like int()
+    if clip:
+        xyxy[:, :2] = np.maximum(xyxy[:, :2], 0)
+        xyxy[:, 2:] = np.minimum(xyxy[:, 2:], [W, H])
+
+    bw = xyxy[:, 2] - xyxy[:, 0]
+    bh = xyxy[:, 3] - xyxy[:, 1]
+    area = bw * bh
+    ratio = area / (H * W)
+
+    mask = (bw >= min_w) & (bh >= min_h) & (area >= min_area) & (ratio >= min_ratio)
+    if max_ratio is not None:
+        mask &= ratio <= max_ratio
+
+    classes = np.asarray(dets.cls)[mask].astype(np.int64).tolist()
+    labels = [dets.names.get(c, "unknown") for c in classes]
+    return xyxy[mask].tolist(), labels, np.asarray(dets.conf)[mask].astype(float).tolist()
+
+
+def letterbox(img, new_shape):
+    """Resize keeping aspect ratio and pad to new_shape (h, w). Returns (img, ratio, (pad_x, pad_y))."""
+    h, w = img.shape[:2]
+    r = min(new_shape[0] / h, new_shape[1] / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    if (nw, nh) != (w, h):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+
+    top = (new_shape[0] - nh) // 2
+    left = (new_shape[1] - nw) // 2
+    img = cv2.copyMakeBorder(
+        img, top, new_shape[0] - nh - top, left, new_shape[1] - nw - left,
+        cv2.BORDER_CONSTANT, value=(114, 114, 114)
+    )
+    return img, r, (left, top)
+
+
+def decode_yolo_output(output, conf, iou, max_det, ratio, pad, orig_shape, names):
+    """
+    Decode a raw YOLOv8 detection head output of shape (1, 4 + nc, N)
+    into Detections in original image coordinates.
+    """
+    pred = np.squeeze(output, 0).T  # (N, 4 + nc)
+    class_scores = pred[:, 4:]
+    cls = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(cls)), cls]
+
+    mask = scores >= conf
+    pred, cls, scores = pred[mask], cls[mask], scores[mask]
+    if len(pred) == 0:
+        return Detections(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64), names)
+
+    cx, cy, bw, bh = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    xyxy = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+
+    # Class-aware NMS in one call by shifting each class into its own region
+    offsets = (cls * MAX_WH)[:, None].astype(np.float32)
+    rects = np.concatenate([xyxy[:, :2] + offsets, xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+    keep = np.asarray(cv2.dnn.NMSBoxes(rects, scores.astype(np.float32), conf, iou), dtype=np.int64).reshape(-1)
+    keep = keep[:max_det]
+
+    xyxy = xyxy[keep]
+    xyxy[:, [0, 2]] -= pad[0]
+    xyxy[:, [1, 3]] -= pad[1]
+    xyxy /= ratio
+    H, W = orig_shape[:2]
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, W)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, H)
+
+    return Detections(xyxy.astype(np.float32), scores[keep].astype(np.float32), cls[keep].astype(np.int64), names)
+
+
+# ---------------- Backends ----------------
+class InferenceBackend:
+    """
+    Common interface for the detection engines.
+    predict() takes a BGR frame and returns Detections in frame coordinates.
+    """
+
+    name = None
+
+    def __init__(self, names):
+        self.names = names
+
+    @classmethod
+    def from_weights(cls, pt_path):
+        raise NotImplementedError
+
+    def predict(self, img, conf=0.25, iou=0.5, max_det=300, imgsz=None):
+        raise NotImplementedError
+
+    def nbytes(self):
+        return 0
+
+
+class TorchBackend(InferenceBackend):
+    """ultralytics YOLO on torch (the original engine)."""
+
+    name = "torch"
+
+    def __init__(self, model, pt_path):
+        super().__init__(dict(model.names))
+        self.model = model
+        self.pt_path = pt_path
+
+    @classmethod
+    def from_weights(cls, pt_path):
+        from ultralytics import YOLO
+        return cls(YOLO(pt_path, task="detect"), pt_path)
+
+    def predict(self, img, conf=0.25, iou=0.5, max_det=300, imgsz=None):
+        kwargs = {"imgsz": imgsz} if imgsz else {}
+        results = self.model.predict(img, conf=conf, iou=iou, max_det=max_det, save=False, **kwargs)
+        if not results or results[0].boxes is None:
+            return None
+
+        boxes = results[0].boxes
+        return Detections(
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy().astype(np.int64),
+            self.names,
+        )
+
+    def nbytes(self):
+        net = self.model.model
+        total = sum(p.numel() * p.element_size() for p in net.parameters())
+        return total + sum(b.numel() * b.element_size() for b in net.buffers())
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """ONNX Runtime on CPU, no torch import at inference time."""
+
+    name = "onnxruntime"
+
+    def __init__(self, onnx_path, meta):
+        import onnxruntime as ort
+
+        super().__init__(meta["names"])
+        self.onnx_path = onnx_path
+        self.imgsz = tuple(meta["imgsz"])
+        self.dynamic = meta.get("dynamic", False)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(onnx_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    @classmethod
+    def from_weights(cls, pt_path):
+        return cls(*export_onnx(pt_path, dynamic=True))
+
+    def predict(self, img, conf=0.25, iou=0.5, max_det=300, imgsz=None):
+        # Dynamic exports honour a per-call input size (e.g. aspect-matched ROI)
+        padded, ratio, pad = letterbox(img, tuple(imgsz) if imgsz and self.dynamic else self.imgsz)
+        blob = cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)
+        output = self.session.run(None, {self.input_name: blob})[0]
+        return decode_yolo_output(output, conf, iou, max_det, ratio, pad, img.shape, self.names)
+
+    def nbytes(self):
+        return os.path.getsize(self.onnx_path)
+
+
+class OnnxRuntimeInt8Backend(OnnxRuntimeBackend):
+    """ONNX Runtime on a statically quantized INT8 export (opt-in, see backend/quantization.py)."""
+
+    name = "onnxruntime-int8"
+
+    @classmethod
+    def from_weights(cls, pt_path):
+        from backend.quantization import quantize_int8
+        return cls(*quantize_int8(pt_path))
+
+
+class OpenCVDnnBackend(InferenceBackend):
+    """OpenCV DNN module; needs nothing beyond opencv-python."""
+
+    name = "opencv"
+
+    def __init__(self, onnx_path, meta):
+        super().__init__(meta["names"])
+        self.onnx_path = onnx_path
+        self.imgsz = tuple(meta["imgsz"])
+        self.net = cv2.dnn.readNetFromONNX(onnx_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self._lock = threading.Lock()  # cv2.dnn.Net is not safe to share across threads
+
+    @classmethod
+    def from_weights(cls, pt_path):
+        return cls(*export_onnx(pt_path))
+
+    def predict(self, img, conf=0.25, iou=0.5, max_det=300, imgsz=None):
+        padded, ratio, pad = letterbox(img, self.imgsz)
+        blob = cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+        return decode_yolo_output(output, conf, iou, max_det, ratio, pad, img.shape, self.names)
+
+    def nbytes(self):
+        return os.path.getsize(self.onnx_path)
+
+
+BACKENDS = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+    OnnxRuntimeInt8Backend.name: OnnxRuntimeInt8Backend,
+    OpenCVDnnBackend.name: OpenCVDnnBackend,
+}
+
+
+def load_backend(pt_path, backend=None):
+    """
+    Borrow an inference backend for a .pt file from the shared model registry.
+    Falls back to torch if the requested engine isn't installed or fails to load.
+    """
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    try:
+        return model_registry.get(pt_path, loader=BACKENDS[backend].from_weights, variant=backend)
+    except Exception as e:
+        if backend == DEFAULT_BACKEND:
+            raise
+        print(f"[Inference Backend] {backend} unavailable for {pt_path} ({e}), falling back to {DEFAULT_BACKEND}")
+        return model_registry.get(pt_path, loader=TorchBackend.from_weights, variant=DEFAULT_BACKEND)
@@ -0,0 +1,160 @@
+import time
+import threading
+from collections import namedtuple
+
+from backend.inference_backend import filter_detections, adaptive_imgsz
+from backend.parallel_inference import predict_arrays
+from backend.nms import nms_by_label, CROSS_MODEL_NMS_IOU
+
+# LIVE_INSPECTION section of grading_config.json: inference FPS cap,
+# network long side, overlay lifetime (s)
+DEFAULT_LIVE_CONFIG = {"max_fps": 4, "imgsz": 480, "stale_after": 2.0}
+DEFAULT_FILTERS = {"min_w": 1, "min_h": 1, "min_area": 1, "min_ratio": 0.0}
+
+# boxes: [[x1, y1, x2, y2], ...] in frame pixels; timestamp: time.monotonic() of the frame
+LiveResult = namedtuple("LiveResult", ["boxes", "labels", "timestamp"])
+
+
+class LiveInspector:
+    """
+    Runs a model on a decimated camera stream for on-preview overlays.
+
+    The camera thread offers every frame with submit(); only the newest one is
+    kept (latest frame wins), so frames arriving while inference runs are
+    skipped. Inference is capped at max_fps and never touches the Tk thread;
+    the preview just reads latest() on its own tick.
+    """
+
+    def __init__(self, models, model_config, live_config=None, filters=None):
+        """
+        models: loaded inference backends (all run on each frame)
+        model_config: {conf, iou, max_det}
+        live_config: {max_fps, imgsz (long side), stale_after}
+        filters: filter_detections() limits (min_w, min_h, min_area, min_ratio, max_ratio)
+        """
+        self.models = models
+        self.model_config = model_config
+        self.live_config = {**DEFAULT_LIVE_CONFIG, **(live_config or {})}
+        self.filters = {**DEFAULT_FILTERS, **(filters or {})}
+
+        self._frame = None
+        self._frame_time = 0.0
+        self._result = None
+        self._lock = threading.Lock()
+        self._has_frame = threading.Event()
+        self._running = False
+        self._thread = None
+
+    # -------------------------------------------------
+    def start(self):
+        """
+        Start (or restart) the worker. A worker stopped without waiting may
+        still be finishing an inference on the shared models; the new worker
+        joins it before running its own, so the models are never used twice.
+        """
+        if self._running:
+            return
+        previous = self._thread
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run_loop, args=(previous,), name="live-inspection", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop the worker; with wait, also let an in-flight inference finish.
+        The thread is kept until it exits (see alive / join()).
+        """
+        self._running = False
+        self._has_frame.set()
+        if wait:
+            self.join()
+        with self._lock:
+            self._frame = None
+            self._result = None
+
+    def join(self, timeout=None):
+        """Wait for a stopped worker to finish its in-flight inference. Returns True once it has exited."""
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        return not self.alive
+
+    @property
+    def alive(self):
+        """True while the worker thread (running or stopping) still exists."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def running(self):
+        return self._running
+
+    # -------------------------------------------------
+    def submit(self, frame):
+        """Offer a BGR frame; replaces any frame still waiting for inference."""
+        if not self._running:
+            return
+        with self._lock:
+            self._frame = frame
+            self._frame_time = time.monotonic()
+        self._has_frame.set()
+
+    def latest(self):
+        """Most recent LiveResult, or None if there is none or it is stale."""
+        with self._lock:
+            result = self._result
+        if result is None or time.monotonic() - result.timestamp > self.live_config["stale_after"]:
+            return None
+        return result
+
+    # -------------------------------------------------
+    def _detect(self, frame):
+        all_boxes, all_labels, all_scores = [], [], []
+        imgsz = adaptive_imgsz(frame.shape, long_side=self.live_config["imgsz"])
+        for model in self.models:
+            boxes, labels, scores = filter_detections(
+                predict_arrays(model, frame, self.model_config, imgsz), frame.shape, **self.filters
+            )
+            all_boxes.extend(boxes)
+            all_labels.extend(labels)
+            all_scores.extend(scores)
+
+        keep = nms_by_label(all_boxes, all_scores, all_labels, CROSS_MODEL_NMS_IOU)
+        return [all_boxes[i] for i in keep], [all_labels[i] for i in keep]
+
+    def _current(self):
+        # False once this worker was stopped, even if a newer one has started since
+        return self._running and self._thread is threading.current_thread()
+
+    def _run_loop(self, previous=None):
+        if previous is not None:
+            previous.join()
+        min_interval = 1.0 / max(self.live_config["max_fps"], 1e-3)
+        last_run = 0.0
+
+        while self._current():
+            self._has_frame.wait()
+
+            # FPS cap: frames offered meanwhile just replace each other
+            delay = last_run + min_interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            with self._lock:
+                frame, frame_time = self._frame, self._frame_time
+                self._frame = None
+                self._has_frame.clear()
+            if frame is None or not self._current():
+                continue
+
+            last_run = time.monotonic()
+            try:
+                boxes, labels = self._detect(frame)
+            except Exception as e:
+                print(f"[Live Inspection] Inference failed: {e}")
+                continue
+
+            with self._lock:
+                if self._current():
+                    self._result = LiveResult(boxes, labels, frame_time)
@@ -1,129 +1,454 @@
 import cv2
 import numpy as np
+from collections import namedtuple
+from backend.nms import overlap_candidates
 
 MAX_DISTANCE_PX = 15
 MIN_TRACE_AREA = 500
 EDGE_SAMPLES = 15
 PARALLEL_ANGLE_THRESHOLD = 5  # degrees
+MIN_TRACE_WIDTH_PX = 5  # narrower traces are reported as width violations
+RAY_STEPS = np.linspace(1, MAX_DISTANCE_PX, MAX_DISTANCE_PX*2)  # distances (px) sampled along a normal
+
+# Struct of arrays describing N traces; row k of every array belongs to contours[k]
+TraceFeatures = namedtuple(
+    "TraceFeatures", ["idx", "contours", "area", "centroid", "direction", "bbox", "edge_pts"]
+)
 
 # ---------- Helpers ----------
-def sample_edge_points(contour, n):
-    contour = contour.reshape(-1, 2)
-    idxs = np.linspace(0, len(contour)-1, n).astype(int)
-    return contour[idxs]
-
-def angle_between_vectors(v1, v2):
-    """Angle in degrees between two vectors"""
-    dot = np.dot(v1, v2)
-    mag = np.linalg.norm(v1) * np.linalg.norm(v2)
-    if mag == 0:
-        return 0
-    cos_theta = np.clip(dot / mag, -1.0, 1.0)
-    angle = np.arccos(cos_theta) * 180 / np.pi
-    return min(angle, 180 - angle)
+def trace_features(contours, edge_samples=EDGE_SAMPLES):
+    """
+    Features of all contours in one batched pass over their concatenated points:
+    idx (N,): position in contours
+    area (N,): polygon area, as cv2.contourArea
+    centroid (N, 2), direction (N, 2): centroid and unit principal axis from
+        the polygon moments (Green's theorem, as cv2.moments on a contour)
+    bbox (N, 4): x, y, w, h, as cv2.boundingRect
+    edge_pts (N, edge_samples, 2): contour points spread evenly along the contour
+    """
+    n = len(contours)
+    if n == 0:
+        return TraceFeatures(
+            np.empty(0, dtype=int), [], np.empty(0), np.empty((0, 2)), np.empty((0, 2)),
+            np.empty((0, 4), dtype=int), np.empty((0, edge_samples, 2), dtype=int),
+        )
+
+    lens = np.array([len(c) for c in contours])
+    pts = np.concatenate([c.reshape(-1, 2) for c in contours])
+    starts = np.cumsum(lens) - lens
+
+    # Polygon edges (p_i, p_i+1), closing each contour on its first point
+    nxt = np.arange(len(pts)) + 1
+    nxt[starts + lens - 1] = starts
+    x0, y0 = pts[:, 0].astype(np.float64), pts[:, 1].astype(np.float64)
+    x1, y1 = x0[nxt], y0[nxt]
+    cross = x0 * y1 - x1 * y0
+
+    def per_trace(values):
+        return np.add.reduceat(values, starts)
+
+    signed_area = per_trace(cross) / 2
+    a = np.where(signed_area == 0, 1.0, signed_area)
+    cx = per_trace((x0 + x1) * cross) / (6 * a)
+    cy = per_trace((y0 + y1) * cross) / (6 * a)
+    mu20 = per_trace((x0 * x0 + x0 * x1 + x1 * x1) * cross) / (12 * a) - cx * cx
+    mu02 = per_trace((y0 * y0 + y0 * y1 + y1 * y1) * cross) / (12 * a) - cy * cy
+    mu11 = per_trace((x0 * y1 + 2 * x0 * y0 + 2 * x1 * y1 + x1 * y0) * cross) / (24 * a) - cx * cy
+    theta = 0.5 * np.arctan2(2 * mu11, mu20 - mu02)
+
+    x_min, y_min = np.minimum.reduceat(pts[:, 0], starts), np.minimum.reduceat(pts[:, 1], starts)
+    x_max, y_max = np.maximum.reduceat(pts[:, 0], starts), np.maximum.reduceat(pts[:, 1], starts)
+
+    edge_idx = starts[:, None] + np.linspace(0, lens - 1, edge_samples, axis=1).astype(int)
+
+    return TraceFeatures(
+        idx=np.arange(n),
+        contours=list(contours),
+        area=np.abs(signed_area),
+        centroid=np.stack([cx, cy], axis=1),
+        direction=np.stack([np.cos(theta), np.sin(theta)], axis=1),
+        bbox=np.stack([x_min, y_min, x_max - x_min + 1, y_max - y_min + 1], axis=1),
+        edge_pts=pts[edge_idx],
+    )
+
+def select_traces(features, keep):
+    """Rows of a TraceFeatures selected by a boolean mask (idx is kept as-is)."""
+    rows = np.flatnonzero(keep)
+    return TraceFeatures(*(
+        f[rows] if isinstance(f, np.ndarray) else [f[k] for k in rows]
+        for f in features
+    ))
+
+def candidate_pairs(traces, max_distance=MAX_DISTANCE_PX, max_angle=PARALLEL_ANGLE_THRESHOLD):
+    """
+    Index pairs (i, j), i < j, of traces that can have a clearance violation:
+    bounding boxes within max_distance of each other (sweep-and-prune) and
+    directions within max_angle degrees. Sorted like the nested i/j loop.
+    """
+    if len(traces.idx) < 2:
+        return np.empty((0, 2), dtype=int)
+
+    # A ray of at most max_distance px from t1's edge can only land in t2
+    # if t2's box meets t1's box grown by that distance (+1 px for rounding)
+    rects = traces.bbox.astype(np.float64)
+    pad = max_distance + 1
+    x1, y1 = rects[:, 0] - pad, rects[:, 1] - pad
+    x2, y2 = rects[:, 0] + rects[:, 2] + pad, rects[:, 1] + rects[:, 3] + pad
+
+    a, b = overlap_candidates(x1, x2)
+    near = (y1[a] < y2[b]) & (y1[b] < y2[a])
+    i, j = np.minimum(a, b)[near], np.maximum(a, b)[near]
+
+    # Parallel test on all surviving pairs at once (angle between axes, 0-90 degrees)
+    directions = traces.direction
+    cos = np.abs(np.einsum("ij,ij->i", directions[i], directions[j]))
+    angle = np.degrees(np.arccos(np.clip(cos, 0.0, 1.0)))
+    parallel = angle <= max_angle
+    i, j = i[parallel], j[parallel]
+
+    order = np.lexsort((j, i))
+    return np.stack([i[order], j[order]], axis=1)
+
+def pair_normals(traces, pairs):
+    """Per pair, the normal of t1 that points towards t2's centroid."""
+    normals = np.stack([-traces.direction[:, 1], traces.direction[:, 0]], axis=1)
+    centroids = traces.centroid
+    i, j = pairs[:, 0], pairs[:, 1]
+    towards = np.einsum("ij,ij->i", normals[i], centroids[j] - centroids[i])
+    return np.where((towards >= 0)[:, None], normals[i], -normals[i])
+
+def cast_rays(traces, pairs, labels, normals):
+    """
+    Step from every edge point of t1 along its normal and find the first
+    sample landing on t2, for all pairs at once.
+
+    labels: int image (ROI coordinates), trace k painted as k+1
+    Returns (edge, step) index arrays per pair; edge is -1 for pairs without a hit.
+    Rays stop at the ROI border; among edge points the shortest hit wins,
+    the earliest point on ties.
+    """
+    H, W = labels.shape
+    edge_pts = traces.edge_pts[pairs[:, 0]].astype(np.float64)  # (P, E, 2)
+
+    # (P, E, S) sample coordinates
+    xs = edge_pts[:, :, 0, None] + normals[:, None, None, 0] * RAY_STEPS
+    ys = edge_pts[:, :, 1, None] + normals[:, None, None, 1] * RAY_STEPS
+    inside = np.logical_and.accumulate((xs >= 0) & (xs < W) & (ys >= 0) & (ys < H), axis=2)
+
+    # A sample is on t2 when all four surrounding pixel centres are, which
+    # matches pointPolygonTest exactly along axis-aligned edges
+    target = (pairs[:, 1] + 1)[:, None, None]
+    x_lo = np.clip(np.floor(xs), 0, W - 1).astype(np.intp)
+    y_lo = np.clip(np.floor(ys), 0, H - 1).astype(np.intp)
+    x_hi = np.clip(np.ceil(xs), 0, W - 1).astype(np.intp)
+    y_hi = np.clip(np.ceil(ys), 0, H - 1).astype(np.intp)
+    hit = inside & (labels[y_lo, x_lo] == target)
+    for yi, xi in ((y_lo, x_hi), (y_hi, x_lo), (y_hi, x_hi)):
+        hit &= labels[yi, xi] == target
+
+    first = np.where(hit.any(axis=2), hit.argmax(axis=2), len(RAY_STEPS))  # (P, E)
+    edge = first.argmin(axis=1)
+    step = first[np.arange(len(pairs)), edge]
+    edge[step == len(RAY_STEPS)] = -1
+    return edge, step
+
+def prepare_traces(filtered_contours, pcb_roi_shape, features):
+    """
+    Traces of at least MIN_TRACE_AREA and their label image (ROI coordinates,
+    trace k painted as k+1).
+    """
+    H, W = pcb_roi_shape[:2]
+
+    if features is None:
+        features = trace_features(filtered_contours)
+    traces = select_traces(features, features.area >= MIN_TRACE_AREA)
+
+    labels = np.zeros((H, W), dtype=np.int32)
+    for k, cnt in enumerate(traces.contours):
+        cv2.drawContours(labels, [cnt], -1, k + 1, cv2.FILLED)
+
+    return traces, labels
+
+def record_violation(meta, results, coord_logs):
+    """Append one coord_logs entry (frame coordinates) and its (from, to, distance) result."""
+    results.append((meta["from_trace"], meta["to_trace"], float(meta["steps"])))
+    coord_logs.append(meta)
+
+def log_violations(coord_logs):
+    print(f"[Trace Clearance] {len(coord_logs)} violations")
+    for meta in coord_logs:
+        print(
+            f"[Trace Clearance] T{meta['from_trace']} -> T{meta['to_trace']} | "
+            f"start={meta['start']} end={meta['end']} | "
+            f"steps={meta['steps']:.2f} | "
+            f"normal=({meta['normal'][0]:.2f},{meta['normal'][1]:.2f})"
+        )
+
+def finish(results, coord_logs, filtered_contours, pcb_roi_shape, pcb_image, offset, annotate, features):
+    """Engine return value; the annotated image and log lines only when annotate."""
+    annotated_img = None
+    if annotate:
+        annotated_img = render_trace_annotations(
+            pcb_image, filtered_contours, coord_logs, pcb_roi_shape, offset, features
+        )
+        log_violations(coord_logs)
+    return results, annotated_img, coord_logs
+
+# ---------- Annotation ----------
+def draw_violation(annotated_img, meta):
+    """Draw one coord_logs entry (frame coordinates) onto annotated_img."""
+    p1i = (int(round(meta["start"][0])), int(round(meta["start"][1])))
+    p2i = (int(round(meta["end"][0])), int(round(meta["end"][1])))
+    cv2.line(annotated_img, p1i, p2i, (0,165,255), 5)
+    cv2.circle(annotated_img, p1i, 2, (0,165,255), -1)
+    cv2.circle(annotated_img, p2i, 2, (0,165,255), -1)
+
+def render_trace_annotations(pcb_image, filtered_contours, coord_logs, pcb_roi_shape=None, offset=(0,0),
+                             features=None):
+    """
+    Annotated copy of pcb_image: traces of at least MIN_TRACE_AREA in green and
+    every coord_logs entry as a line. The measurement functions are data-only;
+    call this only when the picture is needed.
+    filtered_contours: trace contours in ROI coordinates; offset: ROI origin in pcb_image
+    pcb_image None: a black canvas of pcb_roi_shape
+    """
+    if pcb_image is None:
+        H, W = pcb_roi_shape[:2]
+        annotated_img = np.zeros((H, W, 3), dtype=np.uint8)
+    else:
+        annotated_img = pcb_image.copy()
+
+    if features is None:
+        features = trace_features(filtered_contours)
+    traces = select_traces(features, features.area >= MIN_TRACE_AREA)
+    cv2.drawContours(annotated_img, list(traces.contours), -1, (0,255,0), cv2.FILLED, offset=tuple(offset))
+
+    for meta in coord_logs:
+        draw_violation(annotated_img, meta)
+    return annotated_img
 
 # ---------- Main function ----------
-def measure_parallel_trace_distances(filtered_contours, pcb_roi_shape, pcb_image=None, offset=(0,0)):
+def measure_parallel_trace_distances(filtered_contours, pcb_roi_shape, pcb_image=None, offset=(0,0), annotate=True,
+                                     features=None):
+    """
+    Clearance violations between nearby parallel traces, ray-cast from
+    EDGE_SAMPLES points per trace along its normal.
+    filtered_contours: trace contours in ROI coordinates; offset: ROI origin in pcb_image
+    annotate: also render (render_trace_annotations) and log every violation;
+        False is the data-only path: no image is allocated (None is returned) and nothing is formatted
+    features: trace_features(filtered_contours) when the caller already has them
+    Returns (results, annotated_img, coord_logs).
+    """
     ox, oy = offset
-    H, W = pcb_roi_shape[:2]
+    if features is None:
+        features = trace_features(filtered_contours)
+    traces, labels = prepare_traces(filtered_contours, pcb_roi_shape, features)
+
+    results = []
+    coord_logs = []
 
-    annotated_img = pcb_image.copy() if pcb_image is not None else np.zeros((H,W,3), dtype=np.uint8)
-    full_H, full_W = annotated_img.shape[:2]
+    # ---------- Measure clearances ----------
+    # Only nearby, parallel pairs are ray-cast, all against one label image
+    pairs = candidate_pairs(traces)
 
-    trace_mask = np.zeros((full_H, full_W), dtype=np.uint8)
-    traces = []
+    if len(pairs):
+        normals = pair_normals(traces, pairs)
+        edges, steps = cast_rays(traces, pairs, labels, normals)
+    else:
+        normals = edges = steps = ()
 
-    # ---------- Build trace data ----------
-    for idx, cnt in enumerate(filtered_contours):
-        if cv2.contourArea(cnt) < MIN_TRACE_AREA:
+    for (i, j), normal, e, s in zip(pairs, normals, edges, steps):
+        if e < 0:
             continue
+        d = RAY_STEPS[s]
+        x0, y0 = float(traces.edge_pts[i, e, 0]), float(traces.edge_pts[i, e, 1])
+        x = x0 + normal[0]*d
+        y = y0 + normal[1]*d
+        record_violation({
+            "kind": "clearance",
+            "from_trace": int(traces.idx[i]),
+            "to_trace": int(traces.idx[j]),
+            "start": (x0+ox, y0+oy),
+            "end": (x+ox, y+oy),
+            "normal": (normal[0], normal[1]),
+            "steps": d
+        }, results, coord_logs)
 
-        cnt_shifted = cnt + np.array([[ox, oy]])
-        cv2.drawContours(trace_mask, [cnt_shifted], -1, 255, cv2.FILLED)
-
-        vx, vy, _, _ = cv2.fitLine(cnt, cv2.DIST_L2, 0, 0.01, 0.01)
-        direction = np.array([vx[0], vy[0]], dtype=np.float64)
-        direction /= np.linalg.norm(direction)
-        normal1 = np.array([-direction[1], direction[0]], dtype=np.float64)
-        normal2 = -normal1
-        centroid = np.mean(cnt.reshape(-1, 2), axis=0)
-
-        traces.append({
-            "idx": idx,
-            "contour": cnt,
-            "direction": direction,
-            "normals": [normal1, normal2],
-            "centroid": centroid,
-            "edge_pts": sample_edge_points(cnt, EDGE_SAMPLES)
-        })
+    return finish(results, coord_logs, filtered_contours, pcb_roi_shape, pcb_image, offset, annotate, features)
 
-    # Paint all traces green
-    annotated_img[trace_mask>0] = (0,255,0)
+def measure_trace_clearances_dt(filtered_contours, pcb_roi_shape, pcb_image=None, offset=(0,0), annotate=True,
+                                features=None):
+    """
+    Clearance violations between all neighbouring traces, over their whole
+    edges, from one distance transform of the gap regions.
+
+    Every pixel gets its nearest copper pixel (distanceTransformWithLabels),
+    hence its nearest trace. Where two adjacent pixels belong to different
+    traces, the two nearest copper pixels span the gap there; the shortest
+    such span per trace pair is its clearance. Same arguments, return value
+    and coord_logs schema as measure_parallel_trace_distances ("steps" is
+    the copper-to-copper distance, "normal" the unit vector from start to end).
+    """
+    ox, oy = offset
+    if features is None:
+        features = trace_features(filtered_contours)
+    traces, labels = prepare_traces(filtered_contours, pcb_roi_shape, features)
+    H, W = labels.shape
 
     results = []
     coord_logs = []
-    seen = set()
+    if len(traces.idx) < 2:
+        return finish(results, coord_logs, filtered_contours, pcb_roi_shape, pcb_image, offset, annotate, features)
 
-    # ---------- Measure clearances ----------
-    for i, t1 in enumerate(traces):
-        for t2 in traces[i+1:]:
-            key = frozenset({t1["idx"], t2["idx"]})
-            if key in seen:
-                continue
-
-            angle = angle_between_vectors(t1["direction"], t2["direction"])
-            if angle > PARALLEL_ANGLE_THRESHOLD:
-                continue
-
-            vec_centroids = t2["centroid"] - t1["centroid"]
-            vec_centroids /= (np.linalg.norm(vec_centroids) + 1e-6)
-            normal = max(t1["normals"], key=lambda n: np.dot(n, vec_centroids))
-
-            min_dist = None
-            best_pair = None
-            best_meta = None
-
-            for p in t1["edge_pts"]:
-                x0, y0 = float(p[0]), float(p[1])
-                for d in np.linspace(1, MAX_DISTANCE_PX, MAX_DISTANCE_PX*2):
-                    x = x0 + normal[0]*d
-                    y = y0 + normal[1]*d
-                    if x<0 or x>=W or y<0 or y>=H:
-                        break
-                    if cv2.pointPolygonTest(t2["contour"], (x,y), False)>=0:
-                        intersect_vec = np.array([x-x0, y-y0], dtype=np.float64)
-                        intersect_vec /= (np.linalg.norm(intersect_vec)+1e-6)
-                        if np.dot(intersect_vec, normal) < 0.7:
-                            continue
-                        if min_dist is None or d<min_dist:
-                            min_dist = d
-                            best_pair = ((x0,y0),(x,y))
-                            best_meta = {
-                                "from_trace": t1["idx"],
-                                "to_trace": t2["idx"],
-                                "start": (x0+ox, y0+oy),
-                                "end": (x+ox, y+oy),
-                                "normal": (normal[0], normal[1]),
-                                "steps": d
-                            }
-                        break
-
-            if min_dist is not None:
-                seen.add(key)
-                results.append((t1["idx"], t2["idx"], float(min_dist)))
-                coord_logs.append(best_meta)
-                p1, p2 = best_pair
-                p1i = (int(round(p1[0]+ox)), int(round(p1[1]+oy)))
-                p2i = (int(round(p2[0]+ox)), int(round(p2[1]+oy)))
-                cv2.line(annotated_img, p1i, p2i, (0,165,255), 5)
-                cv2.circle(annotated_img, p1i, 2, (0,165,255), -1)
-                cv2.circle(annotated_img, p2i, 2, (0,165,255), -1)
-
-                print(
-                    f"[Trace Clearance] T{best_meta['from_trace']} -> T{best_meta['to_trace']} | "
-                    f"start={best_meta['start']} end={best_meta['end']} | "
-                    f"steps={best_meta['steps']:.2f} | "
-                    f"normal=({best_meta['normal'][0]:.2f},{best_meta['normal'][1]:.2f})"
-                )
+    # ---------- Nearest copper pixel for every pixel ----------
+    gaps = (labels == 0).astype(np.uint8)
+    dist, nearest = cv2.distanceTransformWithLabels(
+        gaps, cv2.DIST_L2, cv2.DIST_MASK_5, labelType=cv2.DIST_LABEL_PIXEL
+    )
+    copper = np.flatnonzero(gaps.ravel() == 0)  # pixel labels count copper pixels in raster order
+    nearest = copper[nearest.ravel() - 1].reshape(H, W)
+    owner = labels.ravel()[nearest]
 
-    return results, annotated_img, coord_logs
+    # ---------- Spans across every boundary between two traces' regions ----------
+    # A span of at most MAX_DISTANCE_PX has its boundary pixels about half that from copper
+    reach = dist <= MAX_DISTANCE_PX / 2 + 1
+    spans = []
+    for dy, dx in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        p = (slice(0, H - dy), slice(max(0, -dx), W - max(0, dx)))
+        q = (slice(dy, H), slice(max(0, dx), W - max(0, -dx)))
+        boundary = (owner[p] != owner[q]) & reach[p] & reach[q]
+        spans.append(np.stack([nearest[p][boundary], nearest[q][boundary]], axis=1))
+    spans = np.concatenate(spans)
+    if len(spans) == 0:
+        return finish(results, coord_logs, filtered_contours, pcb_roi_shape, pcb_image, offset, annotate, features)
+
+    # Orient spans from the lower- to the higher-numbered trace
+    a, b = spans[:, 0], spans[:, 1]
+    flip = owner.ravel()[a] > owner.ravel()[b]
+    a, b = np.where(flip, b, a), np.where(flip, a, b)
+    ay, ax = np.divmod(a, W)
+    by, bx = np.divmod(b, W)
+    length = np.hypot(bx - ax, by - ay)
+
+    # Shortest span per trace pair, pairs in (from, to) order
+    la, lb = owner.ravel()[a], owner.ravel()[b]
+    order = np.lexsort((length, lb, la))
+    la, lb = la[order], lb[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (la[1:] != la[:-1]) | (lb[1:] != lb[:-1])
+    best = order[first]
+    best = best[length[best] <= MAX_DISTANCE_PX]
+
+    for k in best:
+        d = length[k]
+        normal = ((bx[k] - ax[k]) / d, (by[k] - ay[k]) / d)
+        record_violation({
+            "kind": "clearance",
+            "from_trace": int(traces.idx[owner.ravel()[a[k]] - 1]),
+            "to_trace": int(traces.idx[owner.ravel()[b[k]] - 1]),
+            "start": (float(ax[k] + ox), float(ay[k] + oy)),
+            "end": (float(bx[k] + ox), float(by[k] + oy)),
+            "normal": normal,
+            "steps": float(d)
+        }, results, coord_logs)
+
+    return finish(results, coord_logs, filtered_contours, pcb_roi_shape, pcb_image, offset, annotate, features)
+
+# ---------- Trace width ----------
+def measure_trace_widths(trace_mask, features, offset=(0,0), min_width=MIN_TRACE_WIDTH_PX):
+    """
+    Minimum and median width of every trace of at least MIN_TRACE_AREA, in a
+    few whole-ROI operations: one distance transform of trace_mask sampled
+    along its ridge (the skeleton), grouped per trace with one sort.
+
+    trace_mask: uint8 ROI mask the contours were found in
+    features: trace_features of those contours (ROI coordinates)
+    Width at a skeleton pixel is 2 * distance - 1 px (exact for odd widths,
+    1 px low for even ones). Ridge pixels with fewer than two ridge
+    neighbours (line ends, bumps on an edge) are ignored, and so is the
+    ridge within the trace's median half-width (+1 px) of either end along
+    its principal axis, where the distance transform tapers into the
+    corners. Traces too short to keep any ridge pixel are not measured.
+
+    Returns (widths, coord_logs): widths maps trace idx to {"min", "median"};
+    coord_logs has one entry per trace narrower than min_width, in the
+    clearance schema with from_trace == to_trace, start/end on opposite
+    edges across the narrowest point and "steps" the width.
+    """
+    ox, oy = offset
+    traces = select_traces(features, features.area >= MIN_TRACE_AREA)
+    if len(traces.idx) == 0:
+        return {}, []
+
+    dist = cv2.distanceTransform(trace_mask, cv2.DIST_L2, cv2.DIST_MASK_5)
+    ridge = (dist > 0) & (dist >= cv2.dilate(dist, np.ones((3, 3), np.uint8)))
+    ridge_u8 = ridge.astype(np.uint8)
+    neighbours = cv2.filter2D(ridge_u8, -1, np.ones((3, 3), np.float32), borderType=cv2.BORDER_CONSTANT) - ridge_u8
+    skeleton = ridge & (neighbours >= 2)
+
+    # Mask component -> trace row, through each contour's first point
+    n_comp, comp = cv2.connectedComponents(trace_mask, connectivity=8)
+    row_of = np.full(n_comp, -1)
+    first_pts = traces.edge_pts[:, 0]
+    row_of[comp[first_pts[:, 1], first_pts[:, 0]]] = np.arange(len(traces.idx))
+    row_of[0] = -1
+
+    ys, xs = np.nonzero(skeleton)
+    rows = row_of[comp[ys, xs]]
+    on_trace = rows >= 0
+    ys, xs, rows = ys[on_trace], xs[on_trace], rows[on_trace]
+    if len(rows) == 0:
+        return {}, []
+
+    # Drop the tapering ridge at both ends of each trace
+    radius = dist[ys, xs]
+    order = np.lexsort((radius, rows))
+    ys, xs, rows, radius = ys[order], xs[order], rows[order], radius[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    counts = np.diff(np.r_[starts, len(rows)])
+    margin = np.repeat((radius[starts + (counts - 1) // 2] + radius[starts + counts // 2]) / 2 + 1, counts)
+    along = xs * traces.direction[rows, 0] + ys * traces.direction[rows, 1]
+    lo = np.repeat(np.minimum.reduceat(along, starts), counts)
+    hi = np.repeat(np.maximum.reduceat(along, starts), counts)
+    inner = (along - lo > margin) & (hi - along > margin)
+    ys, xs, rows = ys[inner], xs[inner], rows[inner]
+    if len(rows) == 0:
+        return {}, []
+    width = 2 * dist[ys, xs] - 1
+
+    # Group by trace, narrowest first
+    order = np.lexsort((width, rows))
+    ys, xs, rows, width = ys[order], xs[order], rows[order], width[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    counts = np.diff(np.r_[starts, len(rows)])
+    medians = (width[starts + (counts - 1) // 2] + width[starts + counts // 2]) / 2
+
+    widths = {}
+    coord_logs = []
+    for k, m, med in zip(starts, rows[starts], medians):
+        idx = int(traces.idx[m])
+        widths[idx] = {"min": float(width[k]), "median": float(med)}
+        if width[k] >= min_width:
+            continue
+        dx, dy = traces.direction[m]
+        normal = (-float(dy), float(dx))
+        half = float(dist[ys[k], xs[k]])
+        cx, cy = float(xs[k] + ox), float(ys[k] + oy)
+        coord_logs.append({
+            "kind": "width",
+            "from_trace": idx,
+            "to_trace": idx,
+            "start": (cx - normal[0]*half, cy - normal[1]*half),
+            "end": (cx + normal[0]*half, cy + normal[1]*half),
+            "normal": normal,
+            "steps": float(width[k])
+        })
+
+    return widths, coord_logs
+
+# Selectable in detect_traces
+CLEARANCE_ENGINES = {
+    "rays": measure_parallel_trace_distances,
+    "distance_transform": measure_trace_clearances_dt,
+}
+DEFAULT_CLEARANCE_ENGINE = "rays"
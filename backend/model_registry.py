@@ -0,0 +1,168 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# ---------------- Config ----------------
+DEFAULT_BUDGET_MB = 1024
+
+MODEL_PATHS = {
+    "Model 1": "/home/jmc2/VisionBoard-Proj/machine_learning_models/model_a",
+    "Model 2": "/home/jmc2/VisionBoard-Proj/machine_learning_models/model_b",
+    "Model 3": "/home/jmc2/VisionBoard-Proj/machine_learning_models/model_c",
+}
+
+
+def _load_torch(path):
+    # Imported lazily so that importing the registry never pulls in torch
+    from backend.inference_backend import TorchBackend
+    return TorchBackend.from_weights(path)
+
+
+def _estimate_bytes(model, path):
+    """Approximate resident size of a loaded model (parameters + buffers)."""
+    if hasattr(model, "nbytes"):
+        try:
+            total = model.nbytes()
+            if total > 0:
+                return total
+        except Exception:
+            pass
+    try:
+        net = model.model
+        total = sum(p.numel() * p.element_size() for p in net.parameters())
+        total += sum(b.numel() * b.element_size() for b in net.buffers())
+        if total > 0:
+            return total
+    except Exception:
+        pass
+    return os.path.getsize(path)
+
+
+# ---------------- Registry ----------------
+class ModelRegistry:
+    """
+    Process-wide cache of loaded detection models.
+
+    Entries are keyed by (absolute weight path, file mtime, variant) so that
+    re-training a model in place invalidates the cached copy automatically.
+    When the estimated resident size of all cached models exceeds the RAM
+    budget, the least recently used entries are evicted.
+
+    Models load outside the registry lock: lookups of other (or already
+    loaded) models never wait for a slow load, and concurrent requests for
+    the model being loaded wait on that one load.
+    """
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._entries = OrderedDict()  # key -> (model, size_bytes)
+        self._loading = {}  # key -> Future of the load in progress
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------------- Keys ----------------
+    @staticmethod
+    def _make_key(path, variant):
+        path = os.path.abspath(path)
+        return path, os.path.getmtime(path), variant
+
+    # ---------------- Budget ----------------
+    def set_budget(self, budget_mb):
+        with self._lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            self._evict()
+
+    def _used_bytes(self):
+        return sum(size for _, size in self._entries.values())
+
+    def _evict(self):
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while len(self._entries) > 1 and self._used_bytes() > self.budget_bytes:
+            key, _ = self._entries.popitem(last=False)
+            self.evictions += 1
+            print(f"[Model Registry] Evicted {key[0]} ({key[2]})")
+
+    # ---------------- Lookup ----------------
+    def get(self, path, loader=None, variant="torch"):
+        """
+        Return a loaded model for `path`, loading it with `loader` on a miss.
+
+        loader: callable(path) -> model, defaults to the torch backend
+        variant: distinguishes different loaded forms of the same weights
+        """
+        key = self._make_key(path, variant)
+        with self._lock:
+            # Drop stale entries left behind by an older mtime of the same file
+            for stale in [k for k in self._entries if k[0] == key[0] and k[2] == variant and k != key]:
+                del self._entries[stale]
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+            pending = self._loading.get(key)
+            if pending is None:
+                self.misses += 1
+                future = self._loading[key] = Future()
+            else:
+                self.hits += 1
+
+        if pending is not None:
+            return pending.result()
+
+        try:
+            model = (loader or _load_torch)(key[0])
+            size = _estimate_bytes(model, key[0])
+        except BaseException as e:
+            with self._lock:
+                del self._loading[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._entries[key] = (model, size)
+            del self._loading[key]
+            self._evict()
+        future.set_result(model)
+        return model
+
+    def get_many(self, paths, loader=None, variant="torch"):
+        return [self.get(p, loader=loader, variant=variant) for p in paths]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ---------------- Stats ----------------
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "used_mb": round(self._used_bytes() / (1024 * 1024), 1),
+                "budget_mb": round(self.budget_bytes / (1024 * 1024), 1),
+            }
+
+
+# ---------------- Path helpers ----------------
+def resolve_model_paths(path):
+    """Return the .pt files for a model folder, or the file itself."""
+    if os.path.isfile(path) and path.endswith(".pt"):
+        return [path]
+    if os.path.isdir(path):
+        return sorted(
+            os.path.join(path, f)
+            for f in os.listdir(path)
+            if f.endswith(".pt")
+        )
+    return []
+
+
+# Singleton registry instance
+model_registry = ModelRegistry()
@@ -0,0 +1,98 @@
+import numpy as np
+
+# IoU used when merging boxes from several models (historic pipeline default)
+CROSS_MODEL_NMS_IOU = 0.3
+
+
+# ---------------- Kernels ----------------
+def overlap_candidates(x1, x2):
+    """
+    Index pairs (i, j) whose x-extents overlap, found with a vectorized
+    sweep-and-prune over boxes sorted by x1. Only these pairs can have IoU > 0.
+    Not ordered: i may sort after j in the input.
+    """
+    n = len(x1)
+    by_x = np.argsort(x1, kind="stable")
+    # For the k-th box in x order, later boxes starting before it ends are candidates
+    ends = np.searchsorted(x1[by_x], x2[by_x], side="left")
+    counts = np.maximum(ends - np.arange(n) - 1, 0)
+
+    first = np.repeat(np.arange(n), counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    second = first + 1 + (np.arange(counts.sum()) - starts)
+    return by_x[first], by_x[second]
+
+
+def non_max_suppression(boxes, scores, iou_thresh=CROSS_MODEL_NMS_IOU):
+    """
+    Greedy single-class NMS on arrays, without a Python loop per kept box.
+
+    Overlapping pairs are found by sweep-and-prune and their IoU computed in
+    one shot. The greedy result is then the fixed point of
+    "keep j unless a kept, higher-scoring box overlaps it", which a few
+    whole-array passes over the (sparse) overlap edges reach.
+
+    boxes: (N, 4) xyxy, scores: (N,)
+    Returns kept indices, highest score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float64).reshape(-1)
+    n = len(boxes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = boxes.T
+    order = np.argsort(-scores, kind="stable")
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+
+    # -------- IoU on candidate pairs only --------
+    i, j = overlap_candidates(x1, x2)
+    w = np.maximum(0.0, np.minimum(x2[i], x2[j]) - np.maximum(x1[i], x1[j]))
+    h = np.maximum(0.0, np.minimum(y2[i], y2[j]) - np.maximum(y1[i], y1[j]))
+    inter = w * h
+    areas = (x2 - x1) * (y2 - y1)
+    union = areas[i] + areas[j] - inter
+    # Zero-area pairs have no IoU; count them as not overlapping so both are kept
+    iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+    # Edges point from the higher-scoring box to the one it may suppress
+    over = iou > iou_thresh
+    i, j = i[over], j[over]
+    src = np.where(rank[i] < rank[j], i, j)
+    dst = np.where(rank[i] < rank[j], j, i)
+
+    # -------- Greedy fixed point --------
+    keep = np.ones(n, dtype=bool)
+    for _ in range(n):
+        suppressed = np.zeros(n, dtype=bool)
+        suppressed[dst[keep[src]]] = True
+        if np.array_equal(~suppressed, keep):
+            break
+        keep = ~suppressed
+
+    return order[keep[order]]
+
+
+def batched_nms(boxes, scores, class_ids, iou_thresh=CROSS_MODEL_NMS_IOU):
+    """
+    Class-aware NMS in a single pass: every class is shifted into its own
+    coordinate range so boxes of different classes can never overlap.
+    Returns kept indices, highest score first.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    class_ids = np.asarray(class_ids, dtype=np.int64).reshape(-1)
+    offset = boxes.max() - boxes.min() + 1.0
+    shifted = boxes + (class_ids * offset)[:, None]
+    return non_max_suppression(shifted, scores, iou_thresh)
+
+
+def nms_by_label(boxes, scores, labels, iou_thresh=CROSS_MODEL_NMS_IOU):
+    """batched_nms keyed by label strings (models disagree on class ids)."""
+    if len(labels) == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, class_ids = np.unique(np.asarray(labels), return_inverse=True)
+    return batched_nms(boxes, scores, class_ids, iou_thresh)
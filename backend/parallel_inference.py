@@ -0,0 +1,97 @@
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from backend.inference_backend import load_backend
+
+EXECUTION_MODES = ("sequential", "thread", "process")
+DEFAULT_DETECTION_CONFIG = {"conf": 0.25, "iou": 0.5, "max_det": 300}
+
+# Pools outlive individual pipelines, which are rebuilt for every capture
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+# ---------------- Worker setup ----------------
+def set_intra_op_threads(n):
+    """
+    Limit torch intra-op threads for the calling worker process so concurrent
+    models don't oversubscribe the CPU cores.
+    torch.set_num_threads is process-global, so this is only used as a
+    process-pool initializer; thread workers share the parent's setting.
+    """
+    if not n:
+        return
+    try:
+        import torch
+        torch.set_num_threads(int(n))
+    except ImportError:
+        pass
+
+
+def _get_executor(mode, workers, intra_op_threads):
+    key = (mode, workers, intra_op_threads)
+    with _executors_lock:
+        if key not in _executors:
+            if mode == "thread":
+                _executors[key] = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix="inference",
+                )
+            else:
+                # spawn: forking a parent that already holds torch threads can deadlock
+                _executors[key] = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=set_intra_op_threads,
+                    initargs=(intra_op_threads,),
+                )
+        return _executors[key]
+
+
+def shutdown_executors():
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+
+# ---------------- Inference ----------------
+def predict_arrays(model, img, cfg_m, imgsz=None):
+    """
+    Run one inference backend and return Detections (xyxy, conf, cls, names).
+    Plain arrays keep the result cheap to pickle back from worker processes.
+    """
+    return model.predict(img, conf=cfg_m["conf"], iou=cfg_m["iou"], max_det=cfg_m["max_det"], imgsz=imgsz)
+
+
+def _predict_in_worker(pt, img, cfg_m, imgsz):
+    # Each worker process keeps its own registry, so weights load once per worker
+    return predict_arrays(load_backend(pt, cfg_m.get("backend")), img, cfg_m, imgsz)
+
+
+def run_models(jobs, img, mode="sequential", workers=None, intra_op_threads=None, imgsz=None):
+    """
+    Run several models on the same frame.
+
+    jobs: list of (weight_path, model_or_None, detection_config)
+    mode: "sequential", "thread" or "process"
+    imgsz: optional (h, w) network input size
+    Returns one predict_arrays() result per job, in job order.
+    In "process" mode even a single job runs in the pool, so the caller never loads weights.
+    """
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode: {mode}")
+
+    def backend_for(pt, model, cfg_m):
+        return model if model is not None else load_backend(pt, cfg_m.get("backend"))
+
+    if mode == "sequential" or (mode == "thread" and len(jobs) < 2):
+        return [predict_arrays(backend_for(*job), img, job[2], imgsz) for job in jobs]
+
+    executor = _get_executor(mode, workers or len(jobs), intra_op_threads)
+    if mode == "thread":
+        futures = [executor.submit(predict_arrays, backend_for(*job), img, job[2], imgsz) for job in jobs]
+    else:
+        futures = [executor.submit(_predict_in_worker, pt, img, cfg_m, imgsz) for pt, _, cfg_m in jobs]
+
+    return [f.result() for f in futures]
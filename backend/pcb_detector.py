@@ -9,6 +9,13 @@ class PCBDetectionResult:
     bbox: Optional[Tuple[int, int, int, int]] = None
     area_ratio: float = 0.0
 
+    def padded_bbox(self, frame_shape, pad_ratio=0.05) -> Tuple[int, int, int, int]:
+        """(x1, y1, x2, y2) of the board grown by pad_ratio of its size, clipped to the frame."""
+        H, W = frame_shape[:2]
+        x, y, w, h = self.bbox
+        px, py = int(round(w * pad_ratio)), int(round(h * pad_ratio))
+        return max(0, x - px), max(0, y - py), min(W, x + w + px), min(H, y + h + py)
+
 class PCBDetector:
     """
     Robust PCB detector that works for multiple PCB colors under varying illumination.
@@ -0,0 +1,100 @@
+import os
+import json
+import shutil
+import threading
+
+import cv2
+from backend.inference_backend import export_onnx, letterbox, DEFAULT_IMGSZ
+
+# ---------------- Config ----------------
+# Calibrate on training images so the validation split stays unseen by the
+# quantizer and can be used to judge the INT8 models (quantization_report)
+CALIBRATION_DIR = "/home/jmc2/VisionBoard-Proj/dataset/train"
+VALIDATION_DIR = "/home/jmc2/VisionBoard-Proj/dataset/val"
+CALIBRATION_IMAGES = 100
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+_quantize_lock = threading.Lock()
+
+
+# ---------------- Dataset helpers ----------------
+def list_images(folder):
+    """Images of a YOLO split folder (val/images/*) or of a flat folder."""
+    images_dir = os.path.join(folder, "images")
+    if os.path.isdir(images_dir):
+        folder = images_dir
+    if not os.path.isdir(folder):
+        return []
+    return sorted(
+        os.path.join(folder, f)
+        for f in os.listdir(folder)
+        if f.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def _make_calibration_reader(image_paths, input_name, imgsz):
+    from onnxruntime.quantization import CalibrationDataReader
+
+    class ImageCalibrationReader(CalibrationDataReader):
+        """Feeds calibration images through the same preprocessing as OnnxRuntimeBackend."""
+
+        def __init__(self):
+            self._paths = iter(image_paths)
+
+        def get_next(self):
+            for path in self._paths:
+                img = cv2.imread(path)
+                if img is None:
+                    continue
+                padded, _, _ = letterbox(img, imgsz)
+                return {input_name: cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)}
+            return None
+
+    return ImageCalibrationReader()
+
+
+# ---------------- Quantization ----------------
+def quantize_int8(pt_path, calib_dir=CALIBRATION_DIR, num_images=CALIBRATION_IMAGES, imgsz=DEFAULT_IMGSZ):
+    """
+    Statically quantize a model to INT8 (QDQ, per-channel weights) calibrated
+    on images from the training split. The result sits next to the FP32
+    export in the export cache and is only built once per weight hash.
+    Returns (onnx_path, metadata) like export_onnx().
+    """
+    fp32_path, meta = export_onnx(pt_path, imgsz=imgsz, dynamic=True)
+    # The calibration split is part of the name: models calibrated elsewhere are not reused
+    split = os.path.basename(os.path.normpath(calib_dir))
+    int8_path = fp32_path[:-len(".onnx")] + f"_int8_{split}.onnx"
+
+    with _quantize_lock:
+        if not os.path.exists(int8_path):
+            import onnxruntime as ort
+            from onnxruntime.quantization import quantize_static, QuantFormat, QuantType
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            image_paths = list_images(calib_dir)[:num_images]
+            if not image_paths:
+                raise FileNotFoundError(f"No calibration images found in {calib_dir}")
+
+            print(f"[Quantization] Calibrating {pt_path} on {len(image_paths)} images")
+            prep_path = fp32_path[:-len(".onnx")] + "_prep.onnx"
+            quant_pre_process(fp32_path, prep_path)
+
+            input_name = ort.InferenceSession(prep_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            tmp_path = int8_path + ".tmp"
+            quantize_static(
+                prep_path,
+                tmp_path,
+                _make_calibration_reader(image_paths, input_name, tuple(meta["imgsz"])),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+            )
+            shutil.move(tmp_path, int8_path)
+            os.remove(prep_path)
+
+            with open(int8_path[:-len(".onnx")] + ".json", "w") as f:
+                json.dump({"calibration_dir": calib_dir, "calibration_images": len(image_paths)}, f, indent=2)
+
+    return int8_path, meta
@@ -0,0 +1,242 @@
+"""
+Accuracy-vs-latency report for the INT8 inference path.
+
+Runs every configured model over the validation split with its FP32 engine
+and its INT8 engine, using the conf/iou/max_det values from
+MODEL_DETECTION_CONFIGS, and compares per-class precision/recall and latency.
+The INT8 models are calibrated on a separate split (CALIBRATION_DIR), so the
+validation images are unseen by the quantizer.
+
+    python -m backend.quantization_report --out quantization_report.json
+"""
+import os
+import json
+import time
+import argparse
+
+import cv2
+import numpy as np
+from backend.final_grading_pipeline import load_grading_config
+from backend.model_registry import MODEL_PATHS, resolve_model_paths
+from backend.model_registry import model_registry
+from backend.inference_backend import BACKENDS
+from backend.quantization import CALIBRATION_DIR, VALIDATION_DIR, list_images
+
+MATCH_IOU = 0.5
+MAX_RECALL_DROP = 0.02
+MAX_PRECISION_DROP = 0.02
+WARMUP_RUNS = 3
+
+
+# ---------------- Ground truth ----------------
+def load_class_names(split_dir):
+    """Dataset class names from classes.txt next to the split, if present."""
+    path = os.path.join(os.path.dirname(os.path.abspath(split_dir)), "classes.txt")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_labels(image_path, shape, class_names):
+    """YOLO txt labels for an image as (xyxy pixels, label names)."""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    folder = os.path.dirname(image_path)
+    label_path = os.path.join(os.path.dirname(folder), "labels", stem + ".txt")
+    if not os.path.exists(label_path):
+        label_path = os.path.join(folder, stem + ".txt")
+    if not os.path.exists(label_path):
+        return np.zeros((0, 4)), []
+
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 4)), []
+
+    H, W = shape[:2]
+    cx, cy, bw, bh = rows[:, 1] * W, rows[:, 2] * H, rows[:, 3] * W, rows[:, 4] * H
+    xyxy = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+    ids = rows[:, 0].astype(int)
+    labels = [class_names[i] if class_names and i < len(class_names) else str(i) for i in ids]
+    return xyxy, labels
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes."""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_class(pred_boxes, pred_scores, gt_boxes):
+    """Greedy highest-confidence-first matching. Returns (tp, fp, fn)."""
+    if len(pred_boxes) == 0:
+        return 0, 0, len(gt_boxes)
+    if len(gt_boxes) == 0:
+        return 0, len(pred_boxes), 0
+
+    ious = box_iou(pred_boxes[np.argsort(-pred_scores)], gt_boxes)
+    matched = np.zeros(len(gt_boxes), dtype=bool)
+    tp = 0
+    for row in ious:
+        row = np.where(matched, -1.0, row)
+        j = int(row.argmax())
+        if row[j] >= MATCH_IOU:
+            matched[j] = True
+            tp += 1
+    return tp, len(pred_boxes) - tp, len(gt_boxes) - tp
+
+
+# ---------------- Evaluation ----------------
+def evaluate(backend, samples, cfg_m):
+    """Per-class counts and per-image latency of one backend over the samples."""
+    model_classes = set(backend.names.values())
+    counts = {}
+    latencies = []
+
+    for i, (img, gt_boxes, gt_labels) in enumerate(samples):
+        start = time.perf_counter()
+        dets = backend.predict(img, conf=cfg_m["conf"], iou=cfg_m["iou"], max_det=cfg_m["max_det"])
+        elapsed = time.perf_counter() - start
+        if i >= WARMUP_RUNS or len(samples) <= WARMUP_RUNS:
+            latencies.append(elapsed * 1000)
+
+        if dets is None:
+            pred_labels, pred_boxes, pred_scores = np.array([]), np.zeros((0, 4)), np.zeros(0)
+        else:
+            pred_labels = np.array([backend.names.get(int(c), "unknown") for c in dets.cls])
+            pred_boxes, pred_scores = dets.xyxy, dets.conf
+
+        gt_labels = np.array(gt_labels)
+        for label in model_classes:
+            p_mask = pred_labels == label
+            g_mask = gt_labels == label if len(gt_labels) else np.zeros(0, dtype=bool)
+            tp, fp, fn = match_class(pred_boxes[p_mask], pred_scores[p_mask], gt_boxes[g_mask])
+            c = counts.setdefault(label, {"tp": 0, "fp": 0, "fn": 0})
+            c["tp"] += tp
+            c["fp"] += fp
+            c["fn"] += fn
+
+    per_class = {}
+    for label, c in sorted(counts.items()):
+        per_class[label] = {
+            "precision": c["tp"] / (c["tp"] + c["fp"]) if c["tp"] + c["fp"] else None,
+            "recall": c["tp"] / (c["tp"] + c["fn"]) if c["tp"] + c["fn"] else None,
+            **c,
+        }
+
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "per_class": per_class,
+        "latency_ms": {
+            "mean": round(float(lat.mean()), 2),
+            "p50": round(float(np.percentile(lat, 50)), 2),
+            "p95": round(float(np.percentile(lat, 95)), 2),
+        },
+    }
+
+
+def compare(baseline, candidate):
+    """Per-class metric drops and an overall verdict for one model."""
+    deltas = {}
+    safe = True
+    for label, base in baseline["per_class"].items():
+        cand = candidate["per_class"].get(label, {})
+        d = {}
+        for metric, limit in (("recall", MAX_RECALL_DROP), ("precision", MAX_PRECISION_DROP)):
+            if base.get(metric) is None or cand.get(metric) is None:
+                d[metric] = None
+                continue
+            d[metric] = round(cand[metric] - base[metric], 4)
+            if -d[metric] > limit:
+                safe = False
+        deltas[label] = d
+
+    speedup = baseline["latency_ms"]["mean"] / max(candidate["latency_ms"]["mean"], 1e-6)
+    return {"deltas": deltas, "speedup": round(speedup, 2), "safe_for_grading": safe}
+
+
+def load_samples(split_dir, limit=None):
+    class_names = load_class_names(split_dir)
+    samples = []
+    for path in list_images(split_dir)[:limit]:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        boxes, labels = load_labels(path, img.shape, class_names)
+        samples.append((img, boxes, labels))
+    return samples
+
+
+def load_engine(pt, backend):
+    """
+    The requested engine for a .pt file, with no torch fallback: a report
+    comparing torch against itself would look like a safe quantization.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+    return model_registry.get(pt, loader=BACKENDS[backend].from_weights, variant=backend)
+
+
+def build_report(model_names, split_dir, baseline_backend, limit=None):
+    cfg = load_grading_config()
+    model_cfgs = cfg.get("MODEL_DETECTION_CONFIGS", {})
+    if os.path.abspath(split_dir) == os.path.abspath(CALIBRATION_DIR):
+        raise ValueError(f"{split_dir} is the INT8 calibration split; evaluate on held-out images")
+    samples = load_samples(split_dir, limit)
+    if not samples:
+        raise FileNotFoundError(f"No validation images found in {split_dir}")
+
+    report = {"split": split_dir, "images": len(samples), "baseline": baseline_backend, "models": {}}
+    for name in model_names:
+        cfg_m = model_cfgs.get(name)
+        if cfg_m is None:
+            print(f"[Quantization Report] No detection config for {name}, skipping")
+            continue
+
+        for pt in resolve_model_paths(MODEL_PATHS[name]):
+            print(f"[Quantization Report] {name}: {os.path.basename(pt)}")
+            fp32 = evaluate(load_engine(pt, baseline_backend), samples, cfg_m)
+            int8 = evaluate(load_engine(pt, "onnxruntime-int8"), samples, cfg_m)
+            report["models"][f"{name}:{os.path.basename(pt)}"] = {
+                "config": {k: cfg_m[k] for k in ("conf", "iou", "max_det")},
+                "fp32": fp32,
+                "int8": int8,
+                "comparison": compare(fp32, int8),
+            }
+    return report
+
+
+def print_summary(report):
+    for key, entry in report["models"].items():
+        cmp = entry["comparison"]
+        verdict = "SAFE" if cmp["safe_for_grading"] else "NOT SAFE"
+        print(
+            f"{key}: fp32 {entry['fp32']['latency_ms']['mean']} ms -> "
+            f"int8 {entry['int8']['latency_ms']['mean']} ms ({cmp['speedup']}x) | {verdict}"
+        )
+        for label, d in cmp["deltas"].items():
+            print(f"    {label:<12} recall {d['recall']}  precision {d['precision']}")
+
+
+# ---------------- CLI ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Compare FP32 and INT8 detection accuracy and latency.")
+    parser.add_argument("--models", nargs="+", default=list(MODEL_PATHS), help="model names, e.g. 'Model 1'")
+    parser.add_argument("--split", default=VALIDATION_DIR, help="validation split folder (not the calibration split)")
+    parser.add_argument("--baseline", default="onnxruntime", help="FP32 backend to compare against")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate at most N images")
+    parser.add_argument("--out", default="quantization_report.json")
+    args = parser.parse_args()
+
+    report = build_report(args.models, args.split, args.baseline, args.limit)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"[Quantization Report] Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
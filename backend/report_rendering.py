@@ -0,0 +1,171 @@
+import os
+import cv2
+from PIL import Image, ImageDraw, ImageFont
+from ui.theme import theme
+
+try:
+    from fpdf import FPDF
+except ImportError:
+    FPDF = None
+
+# ---------------- LABELS ----------------
+DEFECT_FULL_LABELS = {
+    "open": "Open Circuit",
+    "short": "Short Circuit",
+    "90": "90° Angle Traces",
+    "ps": "Poor Solder",
+    "sb": "Solder Bridges",
+    "mc": "Missing Components",
+    "resistor": "Resistor",
+    "capacitor": "Capacitor",
+}
+
+# Boxes outside these limits are not drawn on the merged result
+MIN_BOX_W = 4
+MIN_BOX_H = 4
+MIN_AREA = 50
+MAX_AREA_RATIO = 0.95
+
+
+def get_custom_color(label, custom_colors=None):
+    # ensure custom_colors is always a dict
+    if not isinstance(custom_colors, dict):
+        custom_colors = {}
+
+    rgb = custom_colors.get(label)
+    if rgb is None:
+        rgb = theme.colors().get("defect_colors", {}).get(label)
+    if rgb is None:
+        rgb = (255, 0, 0)  # fallback
+
+    return rgb
+
+
+def get_full_label(label):
+    return DEFECT_FULL_LABELS.get(label, label)
+
+
+def load_label_font(size=24):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except IOError:
+        return ImageFont.load_default()
+
+
+# ---------------- Merged result image ----------------
+def draw_trace_violations(draw, trace_coords, font, box_size=6):
+    """Start/end markers, connecting line and T<n> label for every clearance violation."""
+    trace_color = get_custom_color("trace_violation")
+
+    for idx, coord in enumerate(trace_coords):
+        start = tuple(coord["start"])
+        end = tuple(coord["end"])
+
+        # Draw rectangles at start/end
+        draw.rectangle([start[0]-box_size, start[1]-box_size,
+                        start[0]+box_size, start[1]+box_size],
+                       outline=trace_color, width=2)
+        draw.rectangle([end[0]-box_size, end[1]-box_size,
+                        end[0]+box_size, end[1]+box_size],
+                       outline=trace_color, width=2)
+
+        # Draw connecting line
+        draw.line([start, end], fill=trace_color, width=4)
+
+        # Label T1, T2, ... on a small white background for readability
+        label_text = f"T{idx+1}"
+        x, y = start[0] + 8, start[1] - 8
+        left, top, right, bottom = draw.textbbox((x, y), label_text, font=font)
+        draw.rectangle([left-1, top-1, right+1, bottom+1], fill=(255, 255, 255))
+        draw.text((x, y), label_text, fill=trace_color, font=font)
+
+
+def render_merged_image(img_bgr, defects_per_model, trace_coords=None, font=None):
+    """
+    Results-page image: every model's defect boxes plus trace violations
+    drawn over the capture. Returns an RGB PIL image.
+    """
+    pil_img = Image.fromarray(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB))
+    draw = ImageDraw.Draw(pil_img)
+    img_area = pil_img.width * pil_img.height
+
+    for model_defects in (defects_per_model or {}).values():
+        for defect in model_defects:
+            if not isinstance(defect, dict) or "bbox" not in defect:
+                continue
+            x1, y1, x2, y2 = defect["bbox"]
+            bw, bh = x2 - x1, y2 - y1
+            area = bw * bh
+            if bw < MIN_BOX_W or bh < MIN_BOX_H or area < MIN_AREA or area / img_area > MAX_AREA_RATIO:
+                continue  # skip invalid/huge boxes
+            draw.rectangle([x1, y1, x2, y2], outline=get_custom_color(defect["label"]), width=3)
+
+    if trace_coords:
+        draw_trace_violations(draw, trace_coords, font or load_label_font())
+
+    return pil_img
+
+
+# ---------------- PDF report ----------------
+def build_report_pdf(image, defect_summary, grade, pdf_path):
+    """
+    One-page PDF: merged result image, legend with counts and the final grade.
+    image: RGB PIL image (e.g. from render_merged_image)
+    """
+    if FPDF is None:
+        raise ImportError("fpdf is not installed")
+
+    # fpdf 1.7 embeds images from files only
+    img_path = os.path.splitext(pdf_path)[0] + "_tmp.jpg"
+    image.convert("RGB").save(img_path, format="JPEG")
+
+    try:
+        pdf = FPDF()
+        pdf.add_page()
+        pdf.set_font("Arial", "B", 30)
+        pdf.cell(0, 10, "Analysis Results", ln=True, align="C")
+        pdf.ln(10)
+
+        # Fit image to PDF width
+        pdf_w = pdf.w - 20
+        iw, ih = image.size
+        pdf.image(img_path, x=10, y=None, w=pdf_w, h=ih * pdf_w / iw)
+        pdf.ln(10)
+
+        # ---------------- Draw legend ----------------
+        pdf.set_font("Arial", "B", 18)
+        pdf.cell(0, 8, "Legend:", ln=True)
+        pdf.ln(5)
+
+        rect_size = 5
+        spacing_x = 5
+        spacing_y = 3
+
+        for label, count in dict(defect_summary).items():
+            full_label = "Trace Violation" if label == "trace_violation" else get_full_label(label)
+            color = get_custom_color(label)
+
+            x, y = pdf.get_x(), pdf.get_y()
+            pdf.set_fill_color(*color)
+            if color == (255, 255, 255):
+                pdf.set_draw_color(0, 0, 0)
+            else:
+                pdf.set_draw_color(*color)
+
+            pdf.rect(x, y, rect_size, rect_size, style="FD")
+            pdf.set_xy(x + rect_size + spacing_x, y)
+            pdf.set_text_color(0, 0, 0)
+            pdf.cell(0, rect_size, f"{full_label} ({count})", ln=True)
+            pdf.ln(spacing_y)
+
+        if grade:
+            pdf.ln(10)
+            pdf.set_font("Arial", "B", 28)
+            pdf.set_text_color(0, 0, 0)
+            pdf.cell(0, 10, f"Final Grade: {grade}", ln=True, align="C")
+
+        pdf.output(pdf_path)
+    finally:
+        os.remove(img_path)
+
+    return pdf_path
@@ -0,0 +1,210 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from backend.inference_backend import file_sha256
+
+# ---------------- Config ----------------
+RESULT_CACHE_DIR = "/home/jmc2/VisionBoard-Proj/cache/results"
+DEFAULT_RESULT_CACHE_CONFIG = {"enabled": True, "memory_entries": 64, "disk_budget_mb": 256}
+DISK_RESCAN_EVERY = 100  # puts between full scans that pick up other processes' files
+
+# Tiers reported in pipeline results
+MEMORY = "memory"
+DISK = "disk"
+MISS = "miss"
+
+
+# ---------------- Keys ----------------
+def frame_digest(frame):
+    """Content hash of a decoded frame (pixels, shape and dtype)."""
+    frame = np.ascontiguousarray(frame)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{frame.shape}{frame.dtype}".encode())
+    h.update(memoryview(frame).cast("B"))
+    return h.hexdigest()
+
+
+def config_digest(obj):
+    """Stable hash of a JSON-serialisable config fragment."""
+    blob = json.dumps(obj, sort_keys=True, default=str).encode()
+    return hashlib.blake2b(blob, digest_size=16).hexdigest()
+
+
+def weights_digest(paths):
+    """Combined content hash of model weight files, in the given order."""
+    return config_digest([file_sha256(p) for p in paths])
+
+
+def make_key(namespace, *parts):
+    """Cache key for one analysis, e.g. make_key("final", frame, weights, config)."""
+    return f"{namespace}-{config_digest(parts)}"
+
+
+# ---------------- Cache ----------------
+class ResultCache:
+    """
+    Two-tier cache of analysis results.
+
+    Memory tier: LRU capped by entry count. Values are kept pickled, so
+    every get() returns a fresh copy callers may modify.
+    Disk tier: one pickle per key, shared by every process on the kiosk
+    (UI, batch workers); the least recently used files are removed once the
+    folder exceeds its size budget. The folder size is tracked from this
+    process's writes and only rescanned when over budget or every
+    DISK_RESCAN_EVERY puts. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, cache_dir=RESULT_CACHE_DIR, memory_entries=None, disk_budget_mb=None):
+        self.cache_dir = cache_dir
+        self.enabled = DEFAULT_RESULT_CACHE_CONFIG["enabled"]
+        self.memory_entries = memory_entries or DEFAULT_RESULT_CACHE_CONFIG["memory_entries"]
+        self.disk_budget_bytes = int((disk_budget_mb or DEFAULT_RESULT_CACHE_CONFIG["disk_budget_mb"]) * 1024 * 1024)
+        self._entries = OrderedDict()  # key -> pickled value
+        self._lock = threading.RLock()
+        self._disk_used = None  # bytes, None until the folder is scanned
+        self._puts_since_scan = 0
+        self.hits = {MEMORY: 0, DISK: 0}
+        self.misses = 0
+        self.evictions = 0
+
+    # ---------------- Limits ----------------
+    def configure(self, cache_cfg=None):
+        """Apply a RESULT_CACHE config block."""
+        cache_cfg = {**DEFAULT_RESULT_CACHE_CONFIG, **(cache_cfg or {})}
+        with self._lock:
+            self.enabled = cache_cfg["enabled"]
+            self.memory_entries = int(cache_cfg["memory_entries"])
+            self.disk_budget_bytes = int(cache_cfg["disk_budget_mb"] * 1024 * 1024)
+            self._evict_memory()
+
+    def _evict_memory(self):
+        while len(self._entries) > max(self.memory_entries, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _scan_disk(self):
+        """(mtime, size, path) of every cache file; also resets the tracked folder size."""
+        try:
+            files = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".pkl")]
+        except OSError:
+            files = []
+        stats = []
+        for e in files:
+            try:
+                st = e.stat()
+            except OSError:
+                continue  # removed by another process meanwhile
+            stats.append((st.st_mtime, st.st_size, e.path))
+        self._disk_used = sum(size for _, size, _ in stats)
+        self._puts_since_scan = 0
+        return stats
+
+    def _evict_disk(self):
+        used = self._disk_used
+        for _, size, path in sorted(self._scan_disk()):
+            if used <= self.disk_budget_bytes:
+                break
+            try:
+                os.remove(path)
+                used -= size
+                self.evictions += 1
+            except OSError:
+                pass
+        self._disk_used = used
+
+    def _track_disk_write(self, added, replaced):
+        self._puts_since_scan += 1
+        if self._disk_used is None or self._puts_since_scan >= DISK_RESCAN_EVERY:
+            self._scan_disk()
+        else:
+            self._disk_used += added - replaced
+        if self._disk_used > self.disk_budget_bytes:
+            self._evict_disk()
+
+    # ---------------- Access ----------------
+    def get(self, key):
+        """(value, tier) where tier is "memory", "disk" or "miss" (value None)."""
+        if not self.enabled:
+            return None, MISS
+
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+                self.hits[MEMORY] += 1
+        if blob is not None:
+            return pickle.loads(blob), MEMORY
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            value = pickle.loads(blob)
+            os.utime(path)  # recency for disk eviction
+        except (OSError, EOFError, pickle.UnpicklingError):
+            with self._lock:
+                self.misses += 1
+            return None, MISS
+
+        with self._lock:
+            self.hits[DISK] += 1
+            self._entries[key] = blob
+            self._evict_memory()
+        return value, DISK
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+
+        # Pickled once: the memory copy is immune to later changes of value
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._entries[key] = blob
+            self._entries.move_to_end(key)
+            self._evict_memory()
+
+        if self.disk_budget_bytes <= 0:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[Result Cache] Failed to write {key}: {e}")
+            return
+        with self._lock:
+            self._track_disk_write(len(blob), replaced)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_entries": self.memory_entries,
+                "disk_budget_mb": round(self.disk_budget_bytes / (1024 * 1024), 1),
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Process-wide instance shared by both pipelines and trace detection
+result_cache = ResultCache()
@@ -1,47 +1,116 @@
 import os
-import json
-import cv2
+import time
 from datetime import datetime
-from backend.trace_detector import detect_traces
+from backend.trace_detector import detect_traces, DEFAULT_CLEARANCE_ENGINE
+from backend.timing import span
+from backend.result_cache import result_cache, frame_digest, config_digest, make_key
+from backend.trace_log import trace_log
+from backend import measure_trace_dist
 from ui.theme import theme  # optional for color choices
 
 # ------------------------- Folders -------------------------
 TRACE_SAVE_DIR = "/home/jmc2/VisionBoard-Proj/pcb_trace_results"
-TRACE_LOG_DIR = os.path.join(TRACE_SAVE_DIR, "trace_data")
 
 os.makedirs(TRACE_SAVE_DIR, exist_ok=True)
-os.makedirs(TRACE_LOG_DIR, exist_ok=True)
+
+# "TRACES" in the grading config: detect_traces options for every pipeline
+DEFAULT_TRACE_CONFIG = {"clearance_engine": DEFAULT_CLEARANCE_ENGINE, "coarse_scale": 1, "measure_width": False}
+
+
+def trace_options(cfg):
+    """run_trace_detection_and_save keyword arguments from a grading config."""
+    return {**DEFAULT_TRACE_CONFIG, **(cfg or {}).get("TRACES", {})}
+
+
+def trace_cache_key(frame_hash, params, pcb_detection=None):
+    """
+    Result cache key for trace analysis: frame content, clearance limits,
+    the detect_traces parameters and the board box it was given.
+    """
+    limits = (
+        measure_trace_dist.MAX_DISTANCE_PX,
+        measure_trace_dist.MIN_TRACE_AREA,
+        measure_trace_dist.EDGE_SAMPLES,
+        measure_trace_dist.PARALLEL_ANGLE_THRESHOLD,
+        measure_trace_dist.MIN_TRACE_WIDTH_PX,
+    )
+    board = None
+    if pcb_detection is not None:
+        board = (pcb_detection.detected, pcb_detection.bbox and tuple(int(v) for v in pcb_detection.bbox))
+    return make_key("traces", frame_hash, limits, config_digest(params), board)
+
+
+def log_cached_trace_result(capture_id, coord_logs, distances, annotated_path=""):
+    """Log a trace result a pipeline served from its own result cache under this run's capture id."""
+    trace_log.append(capture_id, coord_logs, distances, image_path=annotated_path or "", cached=True)
+
 
 # ------------------------- Function -------------------------
-def run_trace_detection_and_save(frame, visualize: bool = True) -> tuple[str, list, list]:
+def run_trace_detection_and_save(frame, visualize: bool = True, pcb_detection=None,
+                                 capture_id=None, coarse_scale: int = 1,
+                                 clearance_engine: str = DEFAULT_CLEARANCE_ENGINE,
+                                 measure_width: bool = False) -> tuple[str, list, list]:
     """
-    Detect copper traces and save:
+    Detect copper traces and record:
     - annotated image (optional)
-    - trace measurement logs (JSON)
+    - trace measurements in the trace log store (backend/trace_log.py)
+    Both are written by the store's background thread.
+
+    pcb_detection: PCBDetectionResult from capture time, so the board is not detected again.
+    capture_id: key for trace_log.query(), e.g. the capture file name (default: frame content hash)
+    coarse_scale: 2 or 4 runs detect_traces coarse-to-fine (faster, coarser contours); 1 is full resolution
+    clearance_engine: "rays" or "distance_transform" (see measure_trace_dist.CLEARANCE_ENGINES)
+    measure_width: also report traces narrower than measure_trace_dist.MIN_TRACE_WIDTH_PX
+        ("kind": "width" entries in coord_logs); needs coarse_scale 1
+    Pipelines pass trace_options(cfg), i.e. the "TRACES" section of the grading config.
+
+    Results are cached by frame content and detection parameters, so
+    re-analysing the same frame (results page, re-grading) skips detection.
+    The annotated image path is only cached once the writer has stored the
+    PNG; until then the entry only serves visualize=False calls.
 
     Returns:
         annotated_path: str
         distances: list
         coord_logs: list
     """
+    params = {"clearance_engine": clearance_engine, "coarse_scale": coarse_scale, "measure_width": measure_width}
+    with span("trace.cache_lookup"):
+        frame_hash = frame_digest(frame)
+        key = trace_cache_key(frame_hash, params, pcb_detection)
+        cached, tier = result_cache.get(key)
+    capture_id = capture_id or frame_hash
+
+    if cached is not None:
+        annotated_path, distances, coord_logs = cached
+        if not visualize or (annotated_path and os.path.exists(annotated_path)):
+            print(f"[Trace Detection] Result cache hit ({tier})")
+            log_cached_trace_result(capture_id, coord_logs, distances, annotated_path)
+            return (annotated_path if visualize else ""), distances, coord_logs
+
     # 1️⃣ Detect traces
-    contours, processed_img, distances, coord_logs = detect_traces(frame, visualize=visualize)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    start = time.perf_counter()
+    contours, processed_img, distances, coord_logs, _ = detect_traces(
+        frame, visualize=visualize, pcb_detection=pcb_detection, **params
+    )
+    timings = {"detect_ms": round((time.perf_counter() - start) * 1000, 2)}
 
-    # 2️⃣ Save annotated image
-    annotated_filename = f"pcb_traces_{timestamp}.png"
-    annotated_path = os.path.join(TRACE_SAVE_DIR, annotated_filename)
+    # 2️⃣ Queue annotated image + measurements for the background writer
+    annotated_path = ""
+    image = None
     if visualize and processed_img is not None:
-        cv2.imwrite(annotated_path, processed_img)
-        print(f"[Trace Detection] Annotated image saved at: {annotated_path}")
-    else:
-        annotated_path = ""  # skip image saving if not visualizing
-
-    # 3️⃣ Save measurement logs
-    log_filename = f"trace_coords_{timestamp}.json"
-    log_path = os.path.join(TRACE_LOG_DIR, log_filename)
-    with open(log_path, "w") as f:
-        json.dump(coord_logs, f, indent=2)
-    print(f"[Trace Detection] Trace coordinates saved at: {log_path}")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        annotated_path = os.path.join(TRACE_SAVE_DIR, f"pcb_traces_{timestamp}.png")
+        image = processed_img
+
+    # Cached without the image for now; the writer adds the path once the PNG is on disk
+    result_cache.put(key, ("", distances, coord_logs))
+
+    def on_written(path):
+        result_cache.put(key, (path, distances, coord_logs))
+
+    with span("trace.log"):
+        trace_log.append(capture_id, coord_logs, distances, timings, annotated_path, image, on_written=on_written)
+    print(f"[Trace Detection] {len(coord_logs)} clearance violations logged for {capture_id}")
 
     return annotated_path, distances, coord_logs
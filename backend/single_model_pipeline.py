@@ -1,9 +1,18 @@
 import os
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from ui.theme import theme
-from backend.final_grading_pipeline import load_grading_config, get_color
+from backend.final_grading_pipeline import (
+    load_grading_config, get_color, load_frame, frame_basename, archive_image, capture_id_for
+)
+from backend.model_registry import model_registry, resolve_model_paths
+from backend.inference_backend import (
+    load_backend, crop_to_roi, shift_detections, filter_detections, adaptive_imgsz
+)
+from backend.parallel_inference import predict_arrays
+from backend.nms import nms_by_label, CROSS_MODEL_NMS_IOU
+from backend.timing import run_timer, span
+from backend.result_cache import result_cache, frame_digest, config_digest, weights_digest, make_key, MISS
 
 class SingleModelPipeline:
     MIN_BOX_W = 4
@@ -15,128 +24,78 @@ class SingleModelPipeline:
     def __init__(self, model_path: str, model_config: dict, enable_trace: bool = False):
         """
         model_path: folder or .pt file
-        model_config: {conf, iou, max_det}
+        model_config: {conf, iou, max_det, backend}
         enable_trace: True only if trace detection is needed
         """
         self.cfg = model_config
-        self.model_paths = self._resolve_model_paths(model_path)
-        self.models = [YOLO(p) for p in self.model_paths]
+        self.model_paths = resolve_model_paths(model_path)
+        model_registry.set_budget(load_grading_config()["MODEL_CACHE_BUDGET_MB"])
+        self.models = [load_backend(p, self.cfg.get("backend")) for p in self.model_paths]
         self.enable_trace = enable_trace
 
-    # ---------------- Utils ----------------
-    @staticmethod
-    def _resolve_model_paths(path):
-        if os.path.isfile(path) and path.endswith(".pt"):
-            return [path]
-        if os.path.isdir(path):
-            return [
-                os.path.join(path, f)
-                for f in os.listdir(path)
-                if f.endswith(".pt")
-            ]
-        return []
-
-    @staticmethod
-    def non_max_suppression(boxes, scores, iou_thresh=0.3):
-        if not boxes:
-            return []
-
-        boxes = np.array(boxes)
-        scores = np.array(scores)
-
-        x1, y1, x2, y2 = boxes.T
-        areas = (x2 - x1) * (y2 - y1)
-        order = scores.argsort()[::-1]
-
-        keep = []
-        while order.size > 0:
-            i = order[0]
-            keep.append(i)
-
-            xx1 = np.maximum(x1[i], x1[order[1:]])
-            yy1 = np.maximum(y1[i], y1[order[1:]])
-            xx2 = np.minimum(x2[i], x2[order[1:]])
-            yy2 = np.minimum(y2[i], y2[order[1:]])
-
-            w = np.maximum(0, xx2 - xx1)
-            h = np.maximum(0, yy2 - yy1)
-            inter = w * h
-            iou = inter / (areas[i] + areas[order[1:]] - inter)
-
-            order = order[np.where(iou <= iou_thresh)[0] + 1]
-
-        return keep
-
     # ---------------- Main ----------------
-    def run(self, image_path: str):
-        img = cv2.imread(image_path)
+    def run(self, image_path: str = None, image: np.ndarray = None, pcb_detection=None,
+            annotated_dir: str = "annotated_images/single_model"):
+        """
+        image: decoded BGR frame (preferred, avoids re-reading the capture)
+        image_path: capture on disk, used when no frame is given and for naming outputs
+        pcb_detection: PCBDetectionResult for the frame; inference then only covers the padded board
+            and trace detection reuses it instead of detecting the board again
+        annotated_dir: folder the annotated copy is archived to
+        Result carries a per-stage "timings" breakdown (ms) and "cache": "memory", "disk" or "miss".
+        """
+        cfg = load_grading_config()
+        with run_timer("single_model", cfg) as timer:
+            result = self._run(cfg, image_path, annotated_dir, image, pcb_detection)
+        if result is not None:
+            result["timings"] = timer.timings
+        return result
+
+    def _run(self, cfg, image_path, annotated_dir, image, pcb_detection):
+        with span("decode"):
+            img = load_frame(image, image_path)
         if img is None or img.size == 0:
             return None
 
-        H, W = img.shape[:2]
-        img_area = H * W
-
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        if not (2 < np.mean(gray) < 250):
-            return None
-
-        all_boxes, all_labels, all_scores = [], [], []
-
-        cfg = load_grading_config()
-
-        # -------- YOLO inference --------
-        for model in self.models:
-            results = model.predict(
-                image_path,
-                conf=self.cfg["conf"],
-                iou=self.cfg["iou"],
-                max_det=self.cfg["max_det"],
-                save=False,
-            )
-
-            if not results or results[0].boxes is None:
-                continue
-
-            boxes = results[0].boxes
-            names = model.names
-
-            for i, box in enumerate(boxes.xyxy):
-                x1, y1, x2, y2 = map(int, box)
-                x1, y1 = max(0, x1), max(0, y1)
-                x2, y2 = min(W, x2), min(H, y2)
-
-                bw, bh = x2 - x1, y2 - y1
-                area = bw * bh
-
-                if (
-                    bw < self.MIN_BOX_W
-                    or bh < self.MIN_BOX_H
-                    or area < self.MIN_AREA
-                ):
-                    continue
-
-                ratio = area / img_area
-                if not (self.MIN_AREA_RATIO <= ratio <= self.MAX_AREA_RATIO):
-                    continue
-
-                label = names.get(int(boxes.cls[i]), "unknown")
-                score = float(boxes.conf[i])
-
-                all_boxes.append([x1, y1, x2, y2])
-                all_labels.append(label)
-                all_scores.append(score)
+        with span("brightness_check"):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if not (2 < np.mean(gray) < 250):
+                return None
 
-        # -------- NMS per label --------
-        final_boxes, final_labels = [], []
-        for lbl in set(all_labels):
-            idxs = [i for i, l in enumerate(all_labels) if l == lbl]
-            lbl_boxes = [all_boxes[i] for i in idxs]
-            lbl_scores = [all_scores[i] for i in idxs]
+        # -------- Restrict inference to the board --------
+        with span("roi"):
+            roi, offset = crop_to_roi(img, pcb_detection, cfg["ROI_PADDING"])
+            imgsz = adaptive_imgsz(roi.shape) if roi is not img else None
 
-            keep = self.non_max_suppression(lbl_boxes, lbl_scores)
-            for i in keep:
-                final_boxes.append(lbl_boxes[i])
-                final_labels.append(lbl)
+        traces = None
+        if self.enable_trace:
+            from backend.run_trace_detection import trace_options
+            traces = trace_options(cfg)
+
+        # -------- Result cache --------
+        with span("cache_lookup"):
+            result_cache.configure(cfg.get("RESULT_CACHE"))
+            key = self.cache_key(img, (*offset, *roi.shape[:2]), traces)
+            analysis, cache_tier = result_cache.get(key)
+
+        if analysis is None:
+            analysis = self.analyse(img, roi, offset, imgsz, pcb_detection, capture_id_for(image_path), traces)
+            with span("cache_store"):
+                result_cache.put(key, analysis)
+        else:
+            print(f"[Single Model] Result cache hit ({cache_tier})")
+
+        final_boxes, final_labels = analysis["boxes"], analysis["labels"]
+        trace_data = analysis["trace"]
+        if trace_data is not None:
+            self.trace_coords = trace_data["trace_coords"]
+            if cache_tier != MISS:
+                # Trace detection didn't run; still log its results under this capture
+                from backend.run_trace_detection import log_cached_trace_result
+                log_cached_trace_result(
+                    capture_id_for(image_path) or frame_digest(img),
+                    trace_data["trace_coords"], trace_data["trace_distances"],
+                )
 
         # -------- Build summary --------
         defect_summary = {}
@@ -146,34 +105,84 @@ class SingleModelPipeline:
             defect_summary[label] = defect_summary.get(label, 0) + 1
             defects.append({"label": label, "bbox": tuple(box)})
 
+        # -------- Build annotated image (ALWAYS) --------
+        with span("draw"):
+            annotated_img = img.copy()
+            for box, label in zip(final_boxes, final_labels):
+                x1, y1, x2, y2 = box
+                color = get_color(label, cfg["CUSTOM_DEFECT_COLORS"])  # consistent with grading
+                cv2.rectangle(annotated_img, (x1, y1), (x2, y2), color, 2)
+
+        annotated_path = os.path.join(annotated_dir, frame_basename(image_path))
+        with span("archive"):
+            archive_image(annotated_path, annotated_img)
+
+        return {
+            "defect_summary": defect_summary,
+            "defects": defects,
+            "trace": trace_data,
+            "annotated_image_path": annotated_path,
+            "annotated_image": annotated_img,
+            "cache": cache_tier,
+        }
+
+    def cache_key(self, img, roi_box, traces=None):
+        """Result cache key: frame content, board crop, model weights and detection config."""
+        config = {
+            "model": self.cfg,
+            "limits": (self.MIN_BOX_W, self.MIN_BOX_H, self.MIN_AREA, self.MIN_AREA_RATIO, self.MAX_AREA_RATIO),
+            "trace": traces,
+        }
+        return make_key("single", frame_digest(img), roi_box, weights_digest(self.model_paths), config_digest(config))
+
+    def analyse(self, img, roi, offset, imgsz, pcb_detection=None, capture_id=None, traces=None):
+        """
+        Detections after NMS plus trace data for one frame; the cacheable part of a run.
+        traces: run_trace_detection_and_save options (trace_options(cfg)), None when tracing is off.
+        Returns {"boxes", "labels", "trace"}.
+        """
+        all_boxes, all_labels, all_scores = [], [], []
+
+        # -------- YOLO inference --------
+        for model in self.models:
+            with span("inference"):
+                output = predict_arrays(model, roi, self.cfg, imgsz)
+            with span("filter"):
+                boxes, labels, scores = filter_detections(
+                    shift_detections(output, offset),
+                    img.shape,
+                    min_w=self.MIN_BOX_W,
+                    min_h=self.MIN_BOX_H,
+                    min_area=self.MIN_AREA,
+                    min_ratio=self.MIN_AREA_RATIO,
+                    max_ratio=self.MAX_AREA_RATIO,
+                    clip=True,
+                )
+            all_boxes.extend(boxes)
+            all_labels.extend(labels)
+            all_scores.extend(scores)
+
+        # -------- NMS per label --------
+        with span("nms"):
+            keep = nms_by_label(all_boxes, all_scores, all_labels, CROSS_MODEL_NMS_IOU)
+
         # -------- Trace detection (DATA ONLY) --------
         trace_data = None
         if self.enable_trace:
             from backend.run_trace_detection import run_trace_detection_and_save
-            trace_result = run_trace_detection_and_save(img, visualize=False)
-            self.trace_coords = trace_result[2] if trace_result and len(trace_result) > 2 else []
+            with span("trace_detection"):
+                trace_result = run_trace_detection_and_save(
+                    img, visualize=False, pcb_detection=pcb_detection, capture_id=capture_id,
+                    **(traces or {})
+                )
             trace_data = {
                 "trace_distances": trace_result[1] if trace_result and len(trace_result) > 1 else None,
                 "trace_coords": trace_result[2] if trace_result and len(trace_result) > 2 else [],
             }
 
-        # -------- Build annotated image (ALWAYS) --------
-        annotated_img = img.copy()
-        for box, label in zip(final_boxes, final_labels):
-            x1, y1, x2, y2 = box
-            color = get_color(label, cfg["CUSTOM_DEFECT_COLORS"])  # consistent with grading
-            cv2.rectangle(annotated_img, (x1, y1), (x2, y2), color, 2)
-
-        annotated_dir = os.path.join("annotated_images", "single_model")
-        os.makedirs(annotated_dir, exist_ok=True)
-        basename = os.path.basename(image_path)
-        annotated_path = os.path.join(annotated_dir, basename)
-        cv2.imwrite(annotated_path, annotated_img)
-
         return {
-            "defect_summary": defect_summary,
-            "defects": defects,
+            "boxes": [all_boxes[i] for i in keep],
+            "labels": [all_labels[i] for i in keep],
             "trace": trace_data,
-            "annotated_image_path": annotated_path,
         }
 
@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; processes then merge without a file lock
+    fcntl = None
+
+TIMINGS_PATH = "/home/jmc2/VisionBoard-Proj/logs/pipeline_timings.json"
+DEFAULT_TIMINGS_CONFIG = {"enabled": True}
+TIMING_WINDOW = 50  # runs kept per pipeline
+FLUSH_INTERVAL_S = 2.0  # buffered runs are merged into TIMINGS_PATH this often
+
+# Timer of the run in progress on this thread (None: spans are no-ops)
+_current = contextvars.ContextVar("visionboard_timer", default=None)
+# Called with the name of every span entered on this thread (progress, cancellation)
+_stage_listener = contextvars.ContextVar("visionboard_stage_listener", default=None)
+_NULL_SPAN = nullcontext()
+
+
+# ---------------- Spans ----------------
+def span(name):
+    """
+    Time a block into the active run timer, e.g.
+
+        with span("trace.contours"):
+            ...
+
+    Without an active timer this returns a shared no-op context manager,
+    so instrumented code costs two context-variable lookups. A stage
+    listener (observe_stages) is called before the block starts and may
+    raise to stop the run there.
+    """
+    listener = _stage_listener.get()
+    if listener is not None:
+        listener(name)
+    timer = _current.get()
+    if timer is None:
+        return _NULL_SPAN
+    return timer.span(name)
+
+
+@contextmanager
+def observe_stages(listener):
+    """Call listener(name) at the start of every span on this thread while the block runs."""
+    token = _stage_listener.set(listener)
+    try:
+        yield
+    finally:
+        _stage_listener.reset(token)
+
+
+class RunTimer:
+    """
+    Per-run collection of spans (milliseconds, summed per name).
+    Used as a context manager around a pipeline run; on exit the total is
+    recorded and the run is added to the rolling aggregate.
+    """
+
+    def __init__(self, pipeline, enabled=True, stats=None):
+        self.pipeline = pipeline
+        self.enabled = enabled
+        self.stats = stats
+        self.timings = {}
+        self._token = None
+        self._start = 0.0
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def __enter__(self):
+        if self.enabled:
+            self._token = _current.set(self)
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.enabled:
+            return False
+        _current.reset(self._token)
+        self.timings["total"] = (time.perf_counter() - self._start) * 1000
+        self.timings = {k: round(v, 2) for k, v in self.timings.items()}
+        if exc_type is None and self.stats is not None:
+            self.stats.record(self.pipeline, self.timings)
+        return False
+
+
+# ---------------- Rolling aggregate ----------------
+class TimingStats:
+    """
+    Recent run timings per pipeline, shared through a JSON file so the
+    webserver (a separate process) can expose them.
+
+    record() only buffers the run; a background thread merges buffered runs
+    into the file every flush_interval seconds. The kiosk and batch workers
+    share the file: each merge re-reads it under an exclusive file lock and
+    keeps the other processes' runs (the last `window` per pipeline).
+    """
+
+    def __init__(self, path=TIMINGS_PATH, window=TIMING_WINDOW, flush_interval=FLUSH_INTERVAL_S):
+        self.path = path
+        self.window = window
+        self.flush_interval = flush_interval
+        self._runs = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def record(self, pipeline, timings):
+        with self._lock:
+            runs = self._runs.setdefault(pipeline, deque(maxlen=self.window))
+            runs.append(timings)
+            self._pending.append((pipeline, timings))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_flusher, name="timing-stats", daemon=True)
+                self._thread.start()
+
+    def summary(self):
+        """Aggregate of the runs recorded by this process."""
+        with self._lock:
+            return self._summary(self._runs)
+
+    def _summary(self, runs_by_pipeline):
+        pipelines = {}
+        for pipeline, runs in runs_by_pipeline.items():
+            stages = {}
+            for name in {k for run in runs for k in run}:
+                values = np.array([run[name] for run in runs if name in run])
+                stages[name] = {
+                    "mean_ms": round(float(values.mean()), 2),
+                    "p50_ms": round(float(np.percentile(values, 50)), 2),
+                    "p95_ms": round(float(np.percentile(values, 95)), 2),
+                    "last_ms": round(float(values[-1]), 2),
+                }
+            pipelines[pipeline] = {"runs": len(runs), "stages": dict(sorted(stages.items()))}
+        return {"updated": datetime.now().isoformat(timespec="seconds"), "window": self.window, "pipelines": pipelines}
+
+    # ---------------- Persistence ----------------
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Merge the buffered runs into the shared file."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path + ".lock", "w") as lock:
+                    if fcntl is not None:
+                        fcntl.flock(lock, fcntl.LOCK_EX)  # released when the file closes
+                    recent = self._load_recent()
+                    for pipeline, timings in pending:
+                        recent.setdefault(pipeline, []).append(timings)
+                    recent = {pipeline: runs[-self.window:] for pipeline, runs in recent.items()}
+                    self._save({**self._summary(recent), "recent": recent})
+            except OSError as e:
+                print(f"[Timing] Failed to save {self.path}: {e}")
+
+    def _load_recent(self):
+        """Raw recent runs per pipeline from the shared file ({} if missing or unreadable)."""
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f).get("recent", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, snapshot):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+timing_stats = TimingStats()
+
+# The flusher is a daemon thread; merge the last runs at interpreter exit
+atexit.register(timing_stats.flush)
+
+
+def run_timer(pipeline, cfg=None):
+    """RunTimer for one pipeline run, honouring the TIMINGS config block."""
+    timings_cfg = {**DEFAULT_TIMINGS_CONFIG, **((cfg or {}).get("TIMINGS") or {})}
+    return RunTimer(pipeline, enabled=timings_cfg["enabled"], stats=timing_stats)
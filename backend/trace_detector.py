@@ -1,67 +1,270 @@
 import cv2
 import numpy as np
 from backend.pcb_detector import PCBDetector
-from backend.measure_trace_dist import measure_parallel_trace_distances
+from backend.measure_trace_dist import (
+    trace_features, select_traces, measure_trace_widths, render_trace_annotations, log_violations,
+    CLEARANCE_ENGINES, DEFAULT_CLEARANCE_ENGINE, MAX_DISTANCE_PX
+)
+from backend.timing import span
 
-def detect_traces(frame: np.ndarray, visualize: bool = True, angle_threshold: float = 10):
+CLAHE_TILES = 8  # CLAHE tile grid over the whole ROI
+TOPHAT_KERNEL_PX = 10  # top-hat/black-hat kernel at full resolution
+REFINE_MARGIN_PX = 48  # full-resolution context kept around each coarse candidate
+
+def segment_traces(roi, scale=1, tiles=(CLAHE_TILES, CLAHE_TILES)):
     """
-    Detect and highlight copper traces on a PCB.
-    Measures distances between parallel traces.
+    Binary trace mask of a BGR board image (ROI or window).
+    scale: how many full-resolution pixels one roi pixel covers (kernel size is scaled to match)
+    tiles: CLAHE tile grid
     """
-    if frame is None or frame.size == 0:
-        return [], frame, [], []
-
-    output_img = frame.copy()
-
-    # 1️⃣ Detect PCB region
-    pcb_detector = PCBDetector()
-    result = pcb_detector.detect(frame)
-    if not result.detected or result.bbox is None:
-        print("[Trace Detection] PCB not detected.")
-        return [], output_img, [], []
-
-    x, y, w, h = result.bbox
-    pcb_roi = frame[y:y+h, x:x+w]
-
     # 2️⃣ Grayscale + CLAHE
-    gray = cv2.cvtColor(pcb_roi, cv2.COLOR_BGR2GRAY)
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=tiles)
     gray = clahe.apply(gray)
 
     # 3️⃣ Decide black/white traces
+    k = max(3, int(round(TOPHAT_KERNEL_PX / scale)) + (scale >= 4))
     mean_val = np.mean(gray)
     if mean_val > 127:
         morph_image = cv2.morphologyEx(
             gray, cv2.MORPH_BLACKHAT,
-            cv2.getStructuringElement(cv2.MORPH_RECT, (10, 10))
+            cv2.getStructuringElement(cv2.MORPH_RECT, (k, k))
         )
         _, trace_mask = cv2.threshold(morph_image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
     else:
         morph_image = cv2.morphologyEx(
             gray, cv2.MORPH_TOPHAT,
-            cv2.getStructuringElement(cv2.MORPH_RECT, (10, 10))
+            cv2.getStructuringElement(cv2.MORPH_RECT, (k, k))
         )
         _, trace_mask = cv2.threshold(morph_image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
     # 4️⃣ Morphological cleaning
+    # (on downsampled images a 3x3 opening erases whole traces and closing bridges real gaps)
     morph_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3,3))
-    clean_mask = cv2.morphologyEx(trace_mask, cv2.MORPH_CLOSE, morph_kernel, iterations=2)
-    clean_mask = cv2.morphologyEx(clean_mask, cv2.MORPH_OPEN, morph_kernel, iterations=1)
-
-    # 5️⃣ Find contours
-    contours, _ = cv2.findContours(clean_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    filtered_contours = [cnt for cnt in contours if 10 < cv2.contourArea(cnt) < (w*h*0.6)]
-
-    # 6️⃣ Measure distances between parallel traces
-    distances, dist_img, coord_logs = measure_parallel_trace_distances(
-        filtered_contours,
-        pcb_roi.shape,
-        pcb_image=output_img,
-        offset=(x, y)
+    if scale == 1:
+        clean_mask = cv2.morphologyEx(trace_mask, cv2.MORPH_CLOSE, morph_kernel, iterations=2)
+        clean_mask = cv2.morphologyEx(clean_mask, cv2.MORPH_OPEN, morph_kernel, iterations=1)
+    else:
+        clean_mask = cv2.morphologyEx(trace_mask, cv2.MORPH_CLOSE, morph_kernel, iterations=2 // scale)
+    return clean_mask
+
+def downsample(roi, scale):
+    """
+    roi shrunk by an integer scale (area averaging). Halving steps on a crop to
+    whole multiples of the scale keep INTER_AREA on its fast block-averaging path.
+    """
+    h, w = roi.shape[:2]
+    small = roi[:max(1, h // scale) * scale, :max(1, w // scale) * scale]
+    while scale > 1:
+        step = 2 if scale % 2 == 0 else scale
+        small = cv2.resize(
+            small, (small.shape[1] // step, small.shape[0] // step), interpolation=cv2.INTER_AREA
+        )
+        scale //= step
+    return small
+
+def candidate_windows(coarse_mask, scale, margin, roi_shape):
+    """
+    Full-resolution ROI windows (x, y, w, h) around every gap of the coarse
+    mask narrower than about MAX_DISTANCE_PX.
+
+    Gap centres are the ridge (local maxima) of the distance transform of the
+    background; a ridge pixel within half the clearance of copper lies
+    between two edges closer than the clearance, whether or not the coarse
+    pass merged them into one region. Candidates within 2 * margin of each
+    other share a window.
+    """
+    H, W = roi_shape[:2]
+    gaps = (coarse_mask == 0).astype(np.uint8)
+    dist = cv2.distanceTransform(gaps, cv2.DIST_L2, cv2.DIST_MASK_5)
+    reach = (MAX_DISTANCE_PX / scale) / 2 + 1
+    ridge = (dist > 0) & (dist <= reach) & (dist >= cv2.dilate(dist, np.ones((3, 3), np.uint8)))
+    candidates = ridge.astype(np.uint8)
+    if not candidates.any():
+        return []
+
+    k = 2 * int(np.ceil(margin / scale)) + 1
+    grown = cv2.dilate(candidates, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(grown, connectivity=8)
+    windows = []
+    for bx, by, bw, bh, _ in stats[1:]:
+        x0, y0 = bx * scale, by * scale
+        x1, y1 = min((bx + bw) * scale, W), min((by + bh) * scale, H)
+        windows.append((int(x0), int(y0), int(x1 - x0), int(y1 - y0)))
+    return windows
+
+def refine_clearances(pcb_roi, coarse_mask, features, scale, margin, offset, clearance_engine):
+    """
+    Full-resolution clearances, measured only inside candidate_windows.
+
+    Each window is segmented again at full resolution and measured with
+    clearance_engine. Trace pieces are numbered after the coarse trace they
+    lie on, so results refer to features.idx; pieces the coarse pass missed
+    take the nearest coarse trace. Where the coarse pass merged several
+    traces, the separate pieces are numbered from len(features.idx) on
+    (the largest keeps the coarse number). Pieces are identified across
+    windows by the connected components of all window masks together, so a
+    split trace has the same number in every window. Pairs reported by more
+    than one window keep their shortest clearance.
+    Returns (distances, coord_logs) like the clearance engines.
+    """
+    ox, oy = offset
+    H, W = pcb_roi.shape[:2]
+
+    # Nearest coarse trace (number + 1) for every coarse pixel
+    painted = np.zeros(coarse_mask.shape, dtype=np.int32)
+    for i, cnt in zip(features.idx, features.contours):
+        cv2.drawContours(painted, [cnt // scale], -1, int(i) + 1, cv2.FILLED)
+    background = (painted == 0).astype(np.uint8)
+    if background.all():
+        return [], []
+    _, nearest = cv2.distanceTransformWithLabels(
+        background, cv2.DIST_L2, cv2.DIST_MASK_5, labelType=cv2.DIST_LABEL_PIXEL
     )
+    trace_ids = painted[background == 0][nearest - 1]  # pixel labels count trace pixels in raster order
+
+    # Segment every window; their union numbers the full-resolution pieces
+    windows = []
+    union = np.zeros((H, W), dtype=np.uint8)
+    for wx, wy, ww, wh in candidate_windows(coarse_mask, scale, margin, pcb_roi.shape):
+        tiles = (max(1, round(CLAHE_TILES * ww / W)), max(1, round(CLAHE_TILES * wh / H)))
+        window_mask = segment_traces(pcb_roi[wy:wy+wh, wx:wx+ww], tiles=tiles)
+        contours, _ = cv2.findContours(window_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            continue
+        pieces = trace_features(contours)
+        pieces = select_traces(pieces, pieces.area > 10)
+        if len(pieces.idx) == 0:
+            continue
+        union[wy:wy+wh, wx:wx+ww] |= window_mask
+        windows.append((wx, wy, window_mask, pieces))
+    if not windows:
+        return [], []
+    _, piece_labels, piece_stats, _ = cv2.connectedComponentsWithStats(union, connectivity=8)
+
+    # Coarse number of every piece, and the pieces that split one coarse trace in some window
+    number = {}
+    split = {}
+    for wx, wy, _, pieces in windows:
+        first = pieces.edge_pts[:, 0] + (wx, wy)
+        labels = piece_labels[first[:, 1], first[:, 0]]
+        coarse = trace_ids[
+            np.minimum(first[:, 1] // scale, trace_ids.shape[0] - 1),
+            np.minimum(first[:, 0] // scale, trace_ids.shape[1] - 1),
+        ] - 1
+        for label, i in zip(labels, coarse):
+            number.setdefault(int(label), int(i))
+        for i in np.unique(coarse):
+            in_window = set(int(label) for label in labels[coarse == i])
+            if len(in_window) > 1:
+                split.setdefault(int(i), set()).update(in_window)
+
+    next_id = len(features.idx)
+    for i in sorted(split):
+        by_size = sorted(split[i], key=lambda label: (-piece_stats[label, cv2.CC_STAT_AREA], label))
+        for label in by_size[1:]:
+            number[label] = next_id
+            next_id += 1
+
+    best = {}
+    for wx, wy, window_mask, pieces in windows:
+        first = pieces.edge_pts[:, 0] + (wx, wy)
+        ids = np.array([number[int(label)] for label in piece_labels[first[:, 1], first[:, 0]]])
+        window_distances, _, window_logs = CLEARANCE_ENGINES[clearance_engine](
+            pieces.contours, window_mask.shape, offset=(ox + wx, oy + wy), annotate=False,
+            features=pieces._replace(idx=ids)
+        )
+        for dist, meta in zip(window_distances, window_logs):
+            pair = (meta["from_trace"], meta["to_trace"])
+            if pair not in best or dist[2] < best[pair][0][2]:
+                best[pair] = (dist, meta)
+
+    ordered = [best[pair] for pair in sorted(best)]
+    return [d for d, _ in ordered], [m for _, m in ordered]
+
+def detect_traces(frame: np.ndarray, visualize: bool = True, angle_threshold: float = 10, pcb_detection=None,
+                  clearance_engine: str = DEFAULT_CLEARANCE_ENGINE, measure_width: bool = False,
+                  coarse_scale: int = 1, refine_margin: int = REFINE_MARGIN_PX):
+    """
+    Detect and highlight copper traces on a PCB.
+    Measures distances between parallel traces.
+    pcb_detection: PCBDetectionResult already computed for this frame; detection is skipped when given.
+    clearance_engine: "rays" (sampled edge points, parallel pairs only) or
+        "distance_transform" (whole edges, all neighbouring pairs); see measure_trace_dist.
+    measure_width: also measure per-trace min/median width; width violations are
+        appended to coord_logs and widths is {trace idx: {"min", "median"}} ({} when off).
+    coarse_scale: 1 segments and measures the full-resolution ROI. 2 or 4 segments a
+        downsampled ROI and re-analyses at full resolution only windows of refine_margin
+        px around candidate violations: faster, but contours have the coarse precision.
+        measure_width needs the full-resolution mask and so requires coarse_scale 1.
+    Only the board ROI (a view, not a copy) is processed. With visualize False no
+    annotation image is allocated and the frame itself is returned as the image.
+    Returns (contours, image, distances, coord_logs, widths).
+    """
+    if measure_width and coarse_scale > 1:
+        raise ValueError("measure_width requires coarse_scale 1")
+    empty = ([], frame, [], [], {})
+    if frame is None or frame.size == 0:
+        return empty
+
+    # 1️⃣ Detect PCB region
+    result = pcb_detection
+    if result is None:
+        with span("trace.pcb_detect"):
+            result = PCBDetector().detect(frame)
+    if not result.detected or result.bbox is None:
+        print("[Trace Detection] PCB not detected.")
+        return empty
+
+    x, y, w, h = result.bbox
+    pcb_roi = frame[y:y+h, x:x+w]
+
+    with span("trace.segment"):
+        if coarse_scale > 1:
+            clean_mask = segment_traces(downsample(pcb_roi, coarse_scale), scale=coarse_scale)
+        else:
+            clean_mask = segment_traces(pcb_roi)
+
+    with span("trace.contours"):
+        # 5️⃣ Find contours (in ROI coordinates at any scale)
+        contours, _ = cv2.findContours(clean_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if coarse_scale > 1:
+            contours = tuple(cnt * coarse_scale for cnt in contours)
+        # Areas, moments and edge samples for every contour in one pass
+        features = trace_features(contours)
+        features = select_traces(features, (features.area > 10) & (features.area < w*h*0.6))
+        features = features._replace(idx=np.arange(len(features.contours)))
+        filtered_contours = features.contours
+
+    # 6️⃣ Measure distances between traces (data only; the picture is rendered below if wanted)
+    with span("trace.measure"):
+        if coarse_scale > 1:
+            distances, coord_logs = refine_clearances(
+                pcb_roi, clean_mask, features, coarse_scale, refine_margin, (x, y), clearance_engine
+            )
+        else:
+            distances, _, coord_logs = CLEARANCE_ENGINES[clearance_engine](
+                filtered_contours, pcb_roi.shape, offset=(x, y), annotate=False, features=features
+            )
+    print(f"[Trace Detection] {len(filtered_contours)} traces, {len(coord_logs)} clearance violations")
 
     # Overlay visualization
-    if visualize and dist_img is not None:
-        output_img = cv2.addWeighted(output_img, 0.7, dist_img, 0.3, 0)
+    output_img = frame
+    if visualize:
+        with span("trace.overlay"):
+            dist_img = render_trace_annotations(frame, filtered_contours, coord_logs, offset=(x, y), features=features)
+            output_img = cv2.addWeighted(frame, 0.7, dist_img, 0.3, 0)
+        log_violations(coord_logs)
+
+    if not measure_width:
+        return filtered_contours, output_img, distances, coord_logs, {}
 
-    return filtered_contours, output_img, distances, coord_logs
+    # 7️⃣ Trace widths along the skeleton of the cleaned mask
+    with span("trace.width"):
+        widths, width_logs = measure_trace_widths(clean_mask, features, offset=(x, y))
+    if visualize:
+        for log in width_logs:
+            start = tuple(int(round(v)) for v in log["start"])
+            end = tuple(int(round(v)) for v in log["end"])
+            cv2.line(output_img, start, end, (255, 0, 255), 3)
+    return filtered_contours, output_img, distances, coord_logs + width_logs, widths
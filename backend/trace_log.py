@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+from datetime import datetime
+
+import cv2
+
+TRACE_LOG_DB = "/home/jmc2/VisionBoard-Proj/pcb_trace_results/trace_logs.sqlite3"
+MAX_TRACE_RECORDS = 5000  # oldest records are dropped beyond this
+ROTATE_EVERY = 100  # inserts between rotations
+EXIT_FLUSH_TIMEOUT_S = 10  # at interpreter exit, give up on records not stored by then
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trace_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    capture_id TEXT NOT NULL,
+    created TEXT NOT NULL,
+    image_path TEXT,
+    violations INTEGER,
+    cached INTEGER,
+    timings TEXT,
+    distances TEXT,
+    coords TEXT
+);
+CREATE INDEX IF NOT EXISTS trace_logs_capture ON trace_logs (capture_id);
+"""
+
+
+def _compact(obj):
+    return json.dumps(obj, separators=(",", ":"), default=float)
+
+
+class TraceLogStore:
+    """
+    Append-only store of trace measurements (SQLite, capped at max_records rows).
+
+    append() only queues the record; a background thread writes the
+    annotated PNG (if any) and inserts the row, so trace analysis never
+    waits on the filesystem. Several processes (UI, batch workers) can
+    share the database.
+    """
+
+    def __init__(self, path=TRACE_LOG_DB, max_records=MAX_TRACE_RECORDS):
+        self.path = path
+        self.max_records = max_records
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------------- Writer ----------------
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run_writer, daemon=True)
+                self._thread.start()
+
+    def _run_writer(self):
+        conn = None
+        inserts = 0
+        while True:
+            record = self._queue.get()
+            try:
+                if conn is None:
+                    conn = self._connect()  # retried with the next record if it fails
+                image = record.pop("image", None)
+                on_written = record.pop("on_written", None)
+                if image is not None and not cv2.imwrite(record["image_path"], image):
+                    print(f"[Trace Log] Failed to write {record['image_path']}")
+                    record["image_path"] = ""
+
+                with conn:
+                    conn.execute(
+                        "INSERT INTO trace_logs (capture_id, created, image_path, violations, cached, "
+                        "timings, distances, coords) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            record["capture_id"], record["created"], record["image_path"],
+                            len(record["coords"]), int(record["cached"]),
+                            _compact(record["timings"]), _compact(record["distances"]), _compact(record["coords"]),
+                        ),
+                    )
+                    inserts += 1
+                    orphans = self._rotate(conn) if inserts % ROTATE_EVERY == 0 else []
+                self._remove_images(orphans)  # once the rows are gone for good
+                if on_written is not None and image is not None and record["image_path"]:
+                    on_written(record["image_path"])
+            except Exception as e:
+                print(f"[Trace Log] Failed to store record for {record.get('capture_id')}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _rotate(self, conn):
+        """
+        Drop rows beyond max_records. Returns the annotated PNGs only those
+        rows referenced (cache hits re-log the same image under newer rows).
+        """
+        cutoff = conn.execute("SELECT MAX(id) FROM trace_logs").fetchone()[0] - self.max_records
+        if cutoff <= 0:
+            return []
+        orphans = [
+            path for (path,) in conn.execute(
+                "SELECT DISTINCT image_path FROM trace_logs WHERE id <= ? AND image_path != '' "
+                "AND image_path NOT IN (SELECT image_path FROM trace_logs WHERE id > ? AND image_path IS NOT NULL)",
+                (cutoff, cutoff),
+            )
+        ]
+        conn.execute("DELETE FROM trace_logs WHERE id <= ?", (cutoff,))
+        return orphans
+
+    @staticmethod
+    def _remove_images(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[Trace Log] Failed to remove {path}: {e}")
+
+    # ---------------- API ----------------
+    def append(self, capture_id, coords, distances, timings=None, image_path="", image=None, cached=False,
+               on_written=None):
+        """
+        Queue one measurement. image (BGR) is written to image_path by the writer thread,
+        which then calls on_written(image_path) if the write succeeded.
+        Returns immediately.
+        """
+        self._ensure_writer()
+        self._queue.put({
+            "capture_id": capture_id,
+            "created": datetime.now().isoformat(timespec="milliseconds"),
+            "image_path": image_path,
+            "image": image,
+            "coords": coords,
+            "distances": distances,
+            "timings": timings or {},
+            "cached": cached,
+            "on_written": on_written,
+        })
+
+    def flush(self, timeout=None):
+        """
+        Block until every queued record is stored (or dropped after an error).
+        With a timeout, returns False if records are still pending by then.
+        """
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    print(f"[Trace Log] {self._queue.unfinished_tasks} records not stored after {timeout} s")
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def query(self, capture_id, limit=None):
+        """
+        Stored records for a capture id, newest first. Reads never wait for
+        the writer: records still queued are not included (flush() first if needed).
+        """
+        return self._select("WHERE capture_id = ? ORDER BY id DESC", (capture_id,), limit)
+
+    def recent(self, limit=20):
+        return self._select("ORDER BY id DESC", (), limit)
+
+    def _select(self, clause, params, limit):
+        if not os.path.exists(self.path):
+            return []
+        sql = f"SELECT capture_id, created, image_path, violations, cached, timings, distances, coords " \
+              f"FROM trace_logs {clause}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            rows = conn.execute(sql, params).fetchall()
+        except sqlite3.OperationalError:
+            return []  # table not created yet
+        finally:
+            conn.close()
+        return [
+            {
+                "capture_id": capture_id,
+                "created": created,
+                "image_path": image_path,
+                "violations": violations,
+                "cached": bool(cached),
+                "timings": json.loads(timings),
+                "distances": json.loads(distances),
+                "coords": json.loads(coords),
+            }
+            for capture_id, created, image_path, violations, cached, timings, distances, coords in rows
+        ]
+
+
+trace_log = TraceLogStore()
+
+# The writer is a daemon thread; finish pending records at interpreter exit,
+# but never let a store that cannot be written hold the process up
+atexit.register(trace_log.flush, timeout=EXIT_FLUSH_TIMEOUT_S)
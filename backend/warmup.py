@@ -0,0 +1,163 @@
+import threading
+import numpy as np
+from backend.model_registry import model_registry, resolve_model_paths, MODEL_PATHS
+from backend.inference_backend import load_backend, adaptive_imgsz
+from backend.parallel_inference import predict_arrays, DEFAULT_DETECTION_CONFIG
+from backend.live_inspection import DEFAULT_LIVE_CONFIG
+
+WARMUP_FRAME_SHAPE = (720, 1280, 3)  # camera capture resolution
+# Typical padded board crops; the capture pipelines run each ROI at its
+# adaptive_imgsz, so these are the input sizes worth compiling up front
+WARMUP_ROI_SHAPES = ((720, 1280), (720, 960), (720, 720), (720, 540))
+WARMUP_RUNS = 1  # the first inference at a size pays the setup; later ones don't get faster
+FIXED_SIZE_BACKENDS = {"opencv"}  # ignore imgsz, so one input warms them
+
+
+class WarmupService:
+    """
+    Loads and dry-runs the configured models in the background, so the
+    first capture doesn't pay weight loading, graph construction and
+    first-inference warm-up. Subscribers get the status dict on every change.
+
+    config: the grading config the camera page builds its pipelines from
+    (MODEL_DETECTION_CONFIGS picks each model's backend, LIVE_INSPECTION
+    the live input size), so the warmed variants are the ones it uses.
+    """
+
+    PENDING = "pending"
+    LOADING = "loading"
+    READY = "ready"
+    FAILED = "failed"
+
+    def __init__(self, model_names=None, config=None, runs=WARMUP_RUNS):
+        config = config or {}
+        self.model_names = list(model_names or MODEL_PATHS)
+        self.model_configs = dict(config.get("MODEL_DETECTION_CONFIGS", {}))
+        self.budget_mb = config.get("MODEL_CACHE_BUDGET_MB")
+        self.live_imgsz = {**DEFAULT_LIVE_CONFIG, **config.get("LIVE_INSPECTION", {})}["imgsz"]
+        self.runs = runs
+        self.status = {name: self.PENDING for name in self.model_names}
+        self.subscribers = []
+        self._queue = list(self.model_names)
+        self._attempted = {}  # name -> detection config of its last warm-up (READY or FAILED)
+        self._current = None  # name being warmed
+        self._lock = threading.Lock()
+        self._thread = None  # None once the queue has run dry
+
+    # -------------------------------------------------
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_loop, name="warmup", daemon=True)
+                self._thread.start()
+
+    def prioritize(self, names, model_configs=None):
+        """
+        Warm only these models from now on (e.g. the ones the camera page just
+        opened needs), so the others don't compete with its first capture.
+        model_configs: the detection configs the page's pipelines will use; a
+        model warmed with a different one is warmed again.
+        """
+        with self._lock:
+            for name in names:
+                if model_configs and name in model_configs:
+                    self.model_configs[name] = model_configs[name]
+            self._queue = [
+                name for name in names
+                if name in self.status and name != self._current
+                and self._attempted.get(name) != self._config_for(name)
+            ]
+            rewarm = [name for name in self._queue if name in self._attempted]
+        for name in rewarm:
+            self._set_status(name, self.PENDING)
+        if self._queue:
+            self.start()
+
+    def _config_for(self, name):
+        return self.model_configs.get(name, DEFAULT_DETECTION_CONFIG)
+
+    # -------------------------------------------------
+    def subscribe(self, callback):
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def _notify(self):
+        status = dict(self.status)
+        for cb in list(self.subscribers):
+            cb(status)
+
+    # -------------------------------------------------
+    def is_ready(self, names):
+        """True once every named model is warm (or failed, so callers fall back to loading)."""
+        return all(self.status.get(name) in (self.READY, self.FAILED) for name in names)
+
+    # -------------------------------------------------
+    def _set_status(self, name, state):
+        self.status[name] = state
+        self._notify()
+
+    @staticmethod
+    def warmup_inputs(live_imgsz, backend=None):
+        """
+        (dummy image, imgsz) pairs covering the input sizes used at run time:
+        each board crop at its adaptive size and the live overlay on full
+        frames. Fixed-size backends get a single input.
+        """
+        frame = np.zeros(WARMUP_FRAME_SHAPE, dtype=np.uint8)
+        if backend in FIXED_SIZE_BACKENDS:
+            return [(frame, None)]
+        candidates = [(frame[:h, :w], adaptive_imgsz((h, w))) for h, w in WARMUP_ROI_SHAPES]
+        candidates.append((frame, adaptive_imgsz(frame.shape, long_side=live_imgsz)))
+        inputs, seen = [], set()
+        for img, imgsz in candidates:
+            if imgsz not in seen:
+                seen.add(imgsz)
+                inputs.append((img, imgsz))
+        return inputs
+
+    def _warm(self, name, cfg_m):
+        weights = resolve_model_paths(MODEL_PATHS[name])
+        if not weights:
+            raise FileNotFoundError(f"No .pt files in {MODEL_PATHS[name]}")
+        inputs = self.warmup_inputs(self.live_imgsz, cfg_m.get("backend"))
+        for pt in weights:
+            model = load_backend(pt, cfg_m.get("backend"))
+            for img, imgsz in inputs:
+                for _ in range(self.runs):
+                    predict_arrays(model, img, cfg_m, imgsz)
+
+    def _run_loop(self):
+        if self.budget_mb is not None:
+            model_registry.set_budget(self.budget_mb)
+
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._thread = None
+                    break
+                name = self._current = self._queue.pop(0)
+                cfg_m = self._config_for(name)
+
+            self._set_status(name, self.LOADING)
+            try:
+                self._warm(name, cfg_m)
+                state = self.READY
+                print(f"[Warmup] {name} ready")
+            except Exception as e:
+                state = self.FAILED
+                print(f"[Warmup] {name} failed: {e}")
+
+            with self._lock:
+                self._attempted[name] = cfg_m
+                self._current = None
+                # The page asked for another config meanwhile: warm that one next
+                if cfg_m != self._config_for(name) and name not in self._queue:
+                    self._queue.insert(0, name)
+                    state = self.PENDING
+            self._set_status(name, state)
+
+        print(f"[Model Registry] {model_registry.stats()}")
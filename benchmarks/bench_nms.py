@@ -0,0 +1,107 @@
+"""
+Microbenchmark: shared batched NMS vs the old per-label Python loop.
+
+    python -m benchmarks.bench_nms --models 1 2 3 4 --max-det 300
+"""
+import time
+import argparse
+
+import numpy as np
+from backend.nms import nms_by_label, CROSS_MODEL_NMS_IOU
+
+LABELS = ["open", "short", "90", "ps", "sb", "mc", "resistor", "capacitor"]
+FRAME_W, FRAME_H = 1280, 720
+
+
+# ---------------- Baseline (pre-refactor pipeline code) ----------------
+def legacy_non_max_suppression(boxes, scores, iou_thresh=0.3):
+    if not boxes:
+        return []
+
+    boxes = np.array(boxes)
+    scores = np.array(scores)
+
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+
+        xx1 = np.maximum(x1[i], x1[order[1:]])
+        yy1 = np.maximum(y1[i], y1[order[1:]])
+        xx2 = np.minimum(x2[i], x2[order[1:]])
+        yy2 = np.minimum(y2[i], y2[order[1:]])
+
+        w = np.maximum(0, xx2 - xx1)
+        h = np.maximum(0, yy2 - yy1)
+        inter = w * h
+        iou = inter / (areas[i] + areas[order[1:]] - inter)
+
+        order = order[np.where(iou <= iou_thresh)[0] + 1]
+
+    return keep
+
+
+def legacy_nms_by_label(all_boxes, all_scores, all_labels):
+    final = []
+    for lbl in set(all_labels):
+        idxs = [i for i, l in enumerate(all_labels) if l == lbl]
+        keep = legacy_non_max_suppression([all_boxes[i] for i in idxs], [all_scores[i] for i in idxs])
+        final.extend(idxs[i] for i in keep)
+    return final
+
+
+# ---------------- Inputs ----------------
+def make_detections(n_models, max_det, rng):
+    """Clustered boxes (several models firing on the same defects) as pipeline-style lists."""
+    n = n_models * max_det
+    centers = rng.uniform([40, 40], [FRAME_W - 40, FRAME_H - 40], size=(max(1, n // 4), 2))
+    c = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 6, (n, 2))
+    wh = rng.uniform(10, 60, (n, 2))
+    boxes = np.concatenate([c - wh / 2, c + wh / 2], axis=1).astype(int)
+    scores = rng.uniform(0.25, 1.0, n)
+    labels = [LABELS[i] for i in rng.integers(0, len(LABELS), n)]
+    return boxes.tolist(), scores.tolist(), labels
+
+
+def time_call(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+# ---------------- Main ----------------
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cross-model NMS.")
+    parser.add_argument("--models", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--max-det", type=int, default=300)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'models':>6} {'boxes':>6} {'legacy ms':>10} {'batched ms':>11} {'speedup':>8} {'kept':>6}")
+    for n_models in args.models:
+        boxes, scores, labels = make_detections(n_models, args.max_det, rng)
+
+        legacy_keep = legacy_nms_by_label(boxes, scores, labels)
+        new_keep = nms_by_label(boxes, scores, labels, CROSS_MODEL_NMS_IOU)
+        if sorted(legacy_keep) != sorted(new_keep.tolist()):
+            print(f"[NMS Bench] WARNING: kept sets differ for {n_models} model(s)")
+
+        legacy_ms = time_call(lambda: legacy_nms_by_label(boxes, scores, labels), args.repeats)
+        new_ms = time_call(lambda: nms_by_label(boxes, scores, labels, CROSS_MODEL_NMS_IOU), args.repeats)
+        print(
+            f"{n_models:>6} {len(boxes):>6} {legacy_ms:>10.2f} {new_ms:>11.2f} "
+            f"{legacy_ms / max(new_ms, 1e-9):>7.1f}x {len(new_keep):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+End-to-end benchmark suite: per-stage p50/p95 latency and peak RSS.
+
+Stages: PCBDetector.detect, detect_traces (full resolution and coarse-to-fine), both clearance engines
+(measure_parallel_trace_distances and the distance-transform engine),
+SingleModelPipeline.run, FinalGradingPipeline.run, results-page merged-image
+rendering and PDF generation. Inputs are generated synthetic PCBs (several
+board colors and trace counts), optionally plus real captures from dataset/val.
+
+Every stage runs in its own fresh process, so its peak RSS is not inflated by
+the stages before it. Results are written as JSON for release-to-release
+comparison on the same kiosk hardware.
+
+    python -m benchmarks.bench_pipeline --synthetic 10 --repeats 5 --out bench.json
+    python -m benchmarks.bench_pipeline --real --real-limit 20 --stages pcb_detect detect_traces
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import resource
+import contextlib
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from benchmarks.synthetic_pcb import make_synthetic_pcb, synthetic_set
+
+FINAL_GRADING_MODELS = ["Model 1", "Model 2"]
+SINGLE_MODEL = "Model 1"
+SYNTHETIC_DEFECTS = 20  # random boxes drawn by the rendering stages
+
+
+# ---------------- Inputs ----------------
+def load_input(spec):
+    """spec: ("synthetic", kwargs) or ("real", path)."""
+    kind, value = spec
+    return make_synthetic_pcb(**value) if kind == "synthetic" else cv2.imread(value)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fake_defects(img, rng):
+    """defects_per_model in the shape ResultsPage receives."""
+    H, W = img.shape[:2]
+    labels = ["open", "short", "ps", "sb", "mc"]
+    defects = []
+    for _ in range(SYNTHETIC_DEFECTS):
+        x, y = int(rng.integers(0, W - 80)), int(rng.integers(0, H - 80))
+        w, h = int(rng.integers(10, 80)), int(rng.integers(10, 80))
+        defects.append({"label": labels[int(rng.integers(len(labels)))], "bbox": (x, y, x + w, y + h)})
+    return {"benchmark": defects}
+
+
+# ---------------- Stages ----------------
+# Each stage takes the decoded images and returns (calls, info): one
+# zero-argument callable per image with all setup already done.
+def stage_pcb_detect(images):
+    from backend.pcb_detector import PCBDetector
+    detector = PCBDetector()
+    return [lambda img=img: detector.detect(img) for img in images], {}
+
+
+def stage_detect_traces(images):
+    # As in the app: the board was already detected at capture time
+    from backend.trace_detector import detect_traces
+    return [
+        lambda img=img, det=det: detect_traces(img, visualize=False, pcb_detection=det)
+        for img, det in _detections(images)
+    ], {}
+
+
+def stage_detect_traces_coarse(images):
+    from backend.trace_detector import detect_traces
+    return [
+        lambda img=img, det=det: detect_traces(img, visualize=False, pcb_detection=det, coarse_scale=4)
+        for img, det in _detections(images)
+    ], {"coarse_scale": 4}
+
+
+def _clearance_stage(images, engine):
+    from backend.pcb_detector import PCBDetector
+    from backend.trace_detector import detect_traces
+    from backend.measure_trace_dist import CLEARANCE_ENGINES
+
+    detector = PCBDetector()
+    measure = CLEARANCE_ENGINES[engine]
+    calls, pairs = [], 0
+    for img in images:
+        det = detector.detect(img)
+        if not det.detected:
+            continue
+        x, y, w, h = det.bbox
+        contours, _, _, coord_logs, _ = detect_traces(img, visualize=False, pcb_detection=det, clearance_engine=engine)
+        pairs += len(coord_logs)
+        # Data-only, as detect_traces calls it; rendering is timed by detect_traces(visualize=True)
+        calls.append(
+            lambda contours=contours, shape=(h, w, 3), offset=(x, y):
+                measure(contours, shape, offset=offset, annotate=False)
+        )
+    return calls, {"violations": pairs}
+
+
+def stage_measure_trace_distances(images):
+    return _clearance_stage(images, "rays")
+
+
+def stage_measure_clearances_dt(images):
+    return _clearance_stage(images, "distance_transform")
+
+
+def _detections(images):
+    from backend.pcb_detector import PCBDetector
+    detector = PCBDetector()
+    return [(img, detector.detect(img)) for img in images]
+
+
+def _disable_result_cache():
+    """
+    Point the pipelines at a copy of the grading config with RESULT_CACHE
+    off (in the stage's working folder), so repeats are real runs instead of
+    cache hits. The pipelines re-read the config on every run.
+    """
+    from backend import final_grading_pipeline
+
+    cfg = final_grading_pipeline.load_grading_config()
+    cfg["RESULT_CACHE"] = {**cfg.get("RESULT_CACHE", {}), "enabled": False}
+    path = os.path.abspath("grading_config.json")
+    with open(path, "w") as f:
+        json.dump(cfg, f, indent=4)
+    final_grading_pipeline.CONFIG_PATH = path
+    return cfg
+
+
+def _uncached(run):
+    """Call a pipeline run and check the result cache didn't serve it."""
+    from backend.result_cache import MISS
+
+    result = run()
+    if result is not None and result.get("cache") != MISS:
+        raise AssertionError(f"benchmark run served from the result cache ({result.get('cache')})")
+    return result
+
+
+def stage_single_pipeline(images):
+    from backend.single_model_pipeline import SingleModelPipeline
+    from backend.model_registry import MODEL_PATHS
+    from backend.parallel_inference import DEFAULT_DETECTION_CONFIG
+
+    cfg = _disable_result_cache()
+    cfg_m = cfg.get("MODEL_DETECTION_CONFIGS", {}).get(SINGLE_MODEL, DEFAULT_DETECTION_CONFIG)
+    pipeline = SingleModelPipeline(MODEL_PATHS[SINGLE_MODEL], cfg_m, enable_trace=True)
+    calls = [
+        lambda img=img, det=det: _uncached(lambda: pipeline.run(image=img, pcb_detection=det))
+        for img, det in _detections(images) if det.detected
+    ]
+    return calls, {"models_loaded": len(pipeline.models), "result_cache": False}
+
+
+def stage_final_pipeline(images):
+    from backend.final_grading_pipeline import FinalGradingPipeline
+    from backend.model_registry import MODEL_PATHS
+    from backend.parallel_inference import DEFAULT_DETECTION_CONFIG
+
+    cfg = _disable_result_cache()
+    model_cfgs = cfg.get("MODEL_DETECTION_CONFIGS", {})
+    pipeline = FinalGradingPipeline(
+        model_folders=[MODEL_PATHS[n] for n in FINAL_GRADING_MODELS],
+        model_configs={MODEL_PATHS[n]: model_cfgs.get(n, DEFAULT_DETECTION_CONFIG) for n in FINAL_GRADING_MODELS},
+    )
+    calls = [
+        lambda img=img, det=det: _uncached(
+            lambda: pipeline.run(image=img, pcb_detection=det, annotated_dir="annotated")
+        )
+        for img, det in _detections(images) if det.detected
+    ]
+    return calls, {
+        "models_loaded": len(pipeline.models), "execution_mode": pipeline.execution_mode, "result_cache": False
+    }
+
+
+def _render_inputs(images):
+    from backend.trace_detector import detect_traces
+    rng = np.random.default_rng(0)
+    return [(img, fake_defects(img, rng), detect_traces(img, visualize=False)[3]) for img in images]
+
+
+def stage_merged_render(images):
+    from backend.report_rendering import render_merged_image, load_label_font
+    font = load_label_font()
+    calls = [
+        lambda img=img, defects=defects, coords=coords: render_merged_image(img, defects, coords, font)
+        for img, defects, coords in _render_inputs(images)
+    ]
+    return calls, {}
+
+
+def stage_pdf(images):
+    from backend.report_rendering import render_merged_image, build_report_pdf, load_label_font
+    font = load_label_font()
+    calls = []
+    for i, (img, defects, coords) in enumerate(_render_inputs(images)):
+        merged = render_merged_image(img, defects, coords, font)
+        summary = {}
+        for d in defects["benchmark"]:
+            summary[d["label"]] = summary.get(d["label"], 0) + 1
+        summary["trace_violation"] = len(coords)
+        calls.append(lambda merged=merged, summary=summary, i=i: build_report_pdf(merged, summary, "Pass", f"report_{i}.pdf"))
+    return calls, {}
+
+
+STAGES = {
+    "pcb_detect": stage_pcb_detect,
+    "detect_traces": stage_detect_traces,
+    "detect_traces_coarse": stage_detect_traces_coarse,
+    "measure_trace_distances": stage_measure_trace_distances,
+    "measure_clearances_dt": stage_measure_clearances_dt,
+    "single_pipeline": stage_single_pipeline,
+    "final_pipeline": stage_final_pipeline,
+    "merged_render": stage_merged_render,
+    "pdf": stage_pdf,
+}
+
+
+# ---------------- Child process ----------------
+def run_stage(name, specs, repeats, warmup):
+    """Runs in a fresh process: build inputs, set up the stage, time it."""
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    os.chdir(workdir)  # pipelines archive annotated images relative to the cwd
+    try:
+        images = [img for img in (load_input(spec) for spec in specs) if img is not None]
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                calls, info = STAGES[name](images)
+        except ImportError as e:
+            return {"skipped": f"{type(e).__name__}: {e}"}
+
+        baseline = peak_rss_mb()
+        samples = []
+        with contextlib.redirect_stdout(io.StringIO()):  # pipelines log every step
+            for call in calls:
+                for _ in range(warmup):
+                    call()
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    call()
+                    samples.append((time.perf_counter() - start) * 1000)
+        return {"samples_ms": samples, "inputs": len(calls), "baseline_rss_mb": baseline,
+                "peak_rss_mb": peak_rss_mb(), **info}
+    finally:
+        os.chdir(os.path.dirname(workdir))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(raw):
+    if "skipped" in raw:
+        return raw
+    s = np.array(raw.pop("samples_ms")) if raw["samples_ms"] else None
+    if s is None:
+        return {**raw, "skipped": "no inputs (no PCB detected)"}
+    return {
+        "n": int(s.size),
+        "p50_ms": round(float(np.percentile(s, 50)), 3),
+        "p95_ms": round(float(np.percentile(s, 95)), 3),
+        "mean_ms": round(float(s.mean()), 3),
+        "max_ms": round(float(s.max()), 3),
+        "peak_rss_mb": round(raw.pop("peak_rss_mb"), 1),
+        "baseline_rss_mb": round(raw.pop("baseline_rss_mb"), 1),
+        **raw,
+    }
+
+
+# ---------------- Main ----------------
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the VisionBoard analysis stages.")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--synthetic", type=int, default=10, help="number of synthetic boards")
+    parser.add_argument("--real", nargs="?", const="", default=None,
+                        help="also use real captures (default folder: dataset/val)")
+    parser.add_argument("--real-limit", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args()
+
+    specs = [("synthetic", spec) for _, spec in synthetic_set(args.synthetic, args.seed)]
+    if args.real is not None:
+        from backend.quantization import VALIDATION_DIR, list_images
+        real = list_images(args.real or VALIDATION_DIR)[:args.real_limit]
+        specs += [("real", os.path.abspath(p)) for p in real]
+        print(f"[Bench] {len(real)} real images from {args.real or VALIDATION_DIR}")
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "python": sys.version.split()[0],
+            "cpu_count": os.cpu_count(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "synthetic_images": args.synthetic,
+            "real_images": len(specs) - args.synthetic,
+            "repeats": args.repeats,
+            "warmup": args.warmup,
+            "seed": args.seed,
+        },
+        "stages": {},
+    }
+
+    print(f"{'stage':<24} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'peak MB':>8}")
+    ctx = multiprocessing.get_context("spawn")
+    for name in args.stages:
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+            stats = summarize(executor.submit(run_stage, name, specs, args.repeats, args.warmup).result())
+        results["stages"][name] = stats
+        if "skipped" in stats:
+            print(f"{name:<24} skipped ({stats['skipped']})")
+        else:
+            print(f"{name:<24} {stats['n']:>5} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['peak_rss_mb']:>8.1f}")
+
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[Bench] Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Reproducible synthetic PCB captures for benchmarks.
+
+Each image is a board of a given solder-mask color on a noisy bench
+background, slightly rotated, with groups of parallel copper traces and
+pads. Some trace gaps fall under MAX_DISTANCE_PX, so clearance checks
+have violations to report. The same (seed, color, traces) always gives
+the same image.
+"""
+import cv2
+import numpy as np
+
+FRAME_SHAPE = (720, 1280)  # camera capture resolution (h, w)
+
+# BGR solder-mask / substrate colors seen in the lab
+BOARD_COLORS = {
+    "green": (40, 110, 30),
+    "blue": (140, 60, 20),
+    "red": (30, 30, 150),
+    "black": (25, 25, 25),
+    "bare": (70, 140, 180),  # etched copper-clad FR4
+}
+COPPER = (60, 130, 200)
+TINNED = (185, 185, 185)
+TRACE_COUNTS = (4, 12, 24, 40)
+
+
+def make_synthetic_pcb(seed, board_color="green", n_traces=12, frame_shape=FRAME_SHAPE):
+    """One BGR capture with roughly n_traces traces on a board of board_color."""
+    rng = np.random.default_rng(seed)
+    H, W = frame_shape
+
+    # Bench background
+    img = np.full((H, W, 3), rng.integers(150, 200), dtype=np.uint8)
+    img = cv2.add(img, rng.integers(0, 20, (H, W, 3), dtype=np.uint8))
+
+    # Board: 55-80% of the frame, rotated a few degrees
+    bw, bh = W * rng.uniform(0.45, 0.65), H * rng.uniform(0.55, 0.8)
+    center = (W / 2 + rng.uniform(-40, 40), H / 2 + rng.uniform(-30, 30))
+    angle = rng.uniform(-4, 4)
+    corners = cv2.boxPoints((center, (bw, bh), angle)).astype(np.int32)
+    cv2.fillPoly(img, [corners], BOARD_COLORS[board_color])
+
+    # Traces are drawn on an axis-aligned canvas and rotated with the board
+    canvas = np.zeros((H, W, 3), dtype=np.uint8)
+    mask = np.zeros((H, W), dtype=np.uint8)
+    trace_color = COPPER if board_color != "bare" else TINNED
+    x0, y0 = int(center[0] - bw / 2 + 30), int(center[1] - bh / 2 + 30)
+    x1, y1 = int(center[0] + bw / 2 - 30), int(center[1] + bh / 2 - 30)
+
+    drawn = 0
+    while drawn < n_traces:
+        group = int(min(rng.integers(2, 6), n_traces - drawn))
+        width = int(rng.integers(6, 14))
+        gap = int(rng.choice([rng.integers(4, 14), rng.integers(20, 45)]))  # some under clearance
+        horizontal = rng.random() < 0.6
+        length = rng.uniform(0.3, 0.8) * ((x1 - x0) if horizontal else (y1 - y0))
+        sx = rng.uniform(x0, max(x0 + 1, x1 - (length if horizontal else group * (width + gap))))
+        sy = rng.uniform(y0, max(y0 + 1, y1 - (group * (width + gap) if horizontal else length)))
+
+        for k in range(group):
+            off = k * (width + gap)
+            if horizontal:
+                p, q = (int(sx), int(sy + off)), (int(sx + length), int(sy + off))
+            else:
+                p, q = (int(sx + off), int(sy)), (int(sx + off), int(sy + length))
+            for target, color in ((canvas, trace_color), (mask, 255)):
+                cv2.line(target, p, q, color, width)
+                cv2.circle(target, p, width, color, -1)
+                cv2.circle(target, q, width, color, -1)
+        drawn += group
+
+    rot = cv2.getRotationMatrix2D(center, -angle, 1.0)
+    canvas = cv2.warpAffine(canvas, rot, (W, H))
+    mask = cv2.warpAffine(mask, rot, (W, H))
+    img[mask > 0] = canvas[mask > 0]
+
+    # Sensor noise and a little blur
+    noise = rng.normal(0, 4, img.shape)
+    img = np.clip(img.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(img, (3, 3), 0)
+
+
+def synthetic_set(n_images, seed=0):
+    """
+    n_images (name, spec) pairs cycling through board colors and trace counts.
+    spec is a kwargs dict for make_synthetic_pcb, so child processes can rebuild the image.
+    """
+    colors = list(BOARD_COLORS)
+    specs = []
+    for i in range(n_images):
+        color = colors[i % len(colors)]
+        traces = TRACE_COUNTS[(i // len(colors)) % len(TRACE_COUNTS)]
+        specs.append((f"synthetic_{color}_{traces}t_{i}", {"seed": seed + i, "board_color": color, "n_traces": traces}))
+    return specs
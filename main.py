@@ -1,5 +1,6 @@
 import tkinter as tk
 from pages.welcomepage import WelcomePage
+from pages.choosemodel import CONFIG
 import subprocess
 import sys
 import os
@@ -11,6 +12,7 @@ import requests
 from ui.themetoggle import ThemeToggleButton
 from ui.theme import theme
 from backend.systemmonitor import SystemMonitor
+from backend.warmup import WarmupService
 
 # ==============================
 # SCREEN CONFIG (KIOSK)
@@ -86,6 +88,13 @@ def main():
     monitor = SystemMonitor()
     monitor.start()
 
+    # ------------------------------
+    # Model warm-up (while the user is on the welcome/model pages), from the
+    # same config the camera pages build their pipelines from
+    # ------------------------------
+    warmup = WarmupService(config=CONFIG)
+    warmup.start()
+
     # ------------------------------
     # Tk App
     # ------------------------------
@@ -145,6 +154,8 @@ def main():
             valid_kwargs.setdefault("monitor", monitor)
         if "theme" in sig.parameters:
             valid_kwargs.setdefault("theme", theme)
+        if "warmup" in sig.parameters:
+            valid_kwargs.setdefault("warmup", warmup)
         if "ngrok_url" in sig.parameters and public_url:
             valid_kwargs.setdefault("ngrok_url", public_url)
 
@@ -11,26 +11,48 @@ from ui.roundedbutton import RoundedButton
 from ui.backbtn import BackButton
 from pages.resultpage import ResultsPage
 from pages.errorpage import ErrorPage
-from ultralytics import YOLO
 from ui.actiondialog import ActionDialog
 from ui.theme import theme
 from backend.pcb_detector import PCBDetector
 from backend.single_model_pipeline import SingleModelPipeline
-from backend.final_grading_pipeline import FinalGradingPipeline
+from backend.final_grading_pipeline import FinalGradingPipeline, archive_image, load_grading_config
+from backend.model_registry import model_registry, resolve_model_paths, MODEL_PATHS
+from backend.inference_backend import load_backend
+from backend.live_inspection import LiveInspector
+from backend.analysis_job import AnalysisJob, DEFAULT_ANALYSIS_CONFIG
 
 class CameraPage(tk.Frame):
     CAMERA_INDEX = 0
     VIDEO_WIDTH = 750
     VIDEO_HEIGHT = 420
     FINAL_GRADING_MODELS = ["Model 1", "Model 2"]
-
-    def __init__(self, parent, show_page, monitor, model_name=None, grading=False, config=None):
+    # Progress overlay text per analysis stage (timing span names; "trace.*" share one entry)
+    STAGE_LABELS = {
+        "pcb_detect": "Detecting board",
+        "archive_capture": "Saving capture",
+        "load_models": "Loading models",
+        "decode": "Reading image",
+        "brightness_check": "Checking exposure",
+        "roi": "Locating board",
+        "cache_lookup": "Checking previous results",
+        "inference": "Running models",
+        "filter": "Filtering detections",
+        "nms": "Merging detections",
+        "trace": "Measuring traces",
+        "trace_detection": "Measuring traces",
+        "cache_store": "Saving results",
+        "draw": "Drawing results",
+        "archive": "Saving results",
+    }
+
+    def __init__(self, parent, show_page, monitor, model_name=None, grading=False, config=None, warmup=None):
         super().__init__(parent)
         self.show_page = show_page
         self.monitor = monitor
         self.model_name = model_name
         self.grading = grading
         self.config = config or {}
+        self.warmup = warmup
 
         self.monitor.pause_camera_check()
         self.running = True
@@ -40,6 +62,11 @@ class CameraPage(tk.Frame):
         self.latest_frame_raw = None
         self.dialog = None
         self.imgtk = None
+        self.live = None
+        self.job = None
+        self.stale_job = None  # timed out or cancelled, but its thread may still use the shared models
+        self.resume_live = False
+        self.progress_frame = None
 
         self.colors = theme.colors()
         self.configure(bg=self.colors["bg"])
@@ -59,21 +86,25 @@ class CameraPage(tk.Frame):
         os.makedirs(self.annotated_dir, exist_ok=True)
 
         # ---------------- MODELS ----------------
-        self.model_paths = {
-            "Model 1": "/home/jmc2/VisionBoard-Proj/machine_learning_models/model_a",
-            "Model 2": "/home/jmc2/VisionBoard-Proj/machine_learning_models/model_b",
-            "Model 3": "/home/jmc2/VisionBoard-Proj/machine_learning_models/model_c",
-        }
+        self.model_paths = dict(MODEL_PATHS)
         self.model_configs = self.config.get("MODEL_DETECTION_CONFIGS", {
             "Model 1": {"conf": 0.5, "iou": 0.35, "max_det": 100},
             "Model 2": {"conf": 0.4, "iou": 0.50, "max_det": 200},
             "Model 3": {"conf": 0.3, "iou": 0.50, "max_det": 100},
         })
 
-        # Only load YOLO if single-model detection
-        self.models = {}
-        if not grading and self.model_name:
-            self.models[self.model_name] = YOLO(self.model_paths[self.model_name], task="detect")
+        # Models are warmed in the background by the warm-up service; Capture waits for them
+        self.required_models = self.FINAL_GRADING_MODELS if grading else [self.model_name]
+        if self.warmup is not None:
+            self.warmup.prioritize(self.required_models, self.model_configs)
+            self.warmup.subscribe(self.on_warmup_update)
+            self.on_warmup_update(self.warmup.status)
+        elif not grading and self.model_name:
+            # No warm-up service: load into the shared registry up front so the
+            # first capture doesn't pay weight loading
+            backend = self.model_configs.get(self.model_name, {}).get("backend")
+            for p in resolve_model_paths(self.model_paths[self.model_name]):
+                load_backend(p, backend)
 
         # ---------------- CAMERA ----------------
         self.init_camera()
@@ -135,8 +166,11 @@ class CameraPage(tk.Frame):
         self.buttons_frame = tk.Frame(self.container, bg=self.colors["bg"])
         self.buttons_frame.pack(pady=(5,15))
 
+        self.buttons_row = tk.Frame(self.buttons_frame, bg=self.colors["bg"])
+        self.buttons_row.pack()
+
         self.capture_btn = RoundedButton(
-            self.buttons_frame,
+            self.buttons_row,
             text="Capture",
             width=200,
             height=80,
@@ -144,9 +178,33 @@ class CameraPage(tk.Frame):
             font=(theme.font_regular, theme.sizes["body"]),
             command=self.capture_image
         )
-        self.capture_btn.pack()
+        self.capture_btn.pack(side="left")
         self.capture_btn.apply_theme(self.colors)
 
+        # Live inspection runs the selected model on the preview (single-model mode only)
+        self.live_btn = None
+        if not self.grading:
+            self.live_btn = RoundedButton(
+                self.buttons_row,
+                text="Live: Off",
+                width=140,
+                height=80,
+                radius=20,
+                font=(theme.font_regular, theme.sizes["body"]),
+                command=self.toggle_live
+            )
+            self.live_btn.pack(side="left", padx=(15,0))
+            self.live_btn.apply_theme(self.colors)
+
+        self.status_label = tk.Label(
+            self.buttons_frame,
+            text="",
+            font=(theme.font_regular, theme.sizes["body"]),
+            fg=self.colors["text2"],
+            bg=self.colors["bg"]
+        )
+        self.status_label.pack(pady=(5,0))
+
     # ---------------- TITLE ----------------
     def update_title(self):
         if self.grading:
@@ -193,11 +251,17 @@ class CameraPage(tk.Frame):
                 continue
             self.latest_frame_raw = frame.copy()
             self.latest_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if self.live is not None:
+                self.live.submit(self.latest_frame_raw)
             time.sleep(1/30)
 
     def display_frame(self):
         if self.latest_frame is not None and not self._destroyed:
-            img = Image.fromarray(self.latest_frame).resize(
+            frame = self.latest_frame
+            result = self.live.latest() if self.live is not None else None
+            if result is not None:
+                frame = self.draw_live_overlay(frame, result)
+            img = Image.fromarray(frame).resize(
                 (self.VIDEO_WIDTH, self.VIDEO_HEIGHT)
             )
             self.imgtk = ImageTk.PhotoImage(img)
@@ -205,56 +269,281 @@ class CameraPage(tk.Frame):
         if self.running:
             self.after(33, self.display_frame)
 
+    # ================= LIVE INSPECTION =================
+    def toggle_live(self):
+        if self.live_on():
+            self.stop_live()
+        elif self.models_ready():
+            self.start_live()
+
+    def live_on(self):
+        return self.live is not None and self.live.running
+
+    def start_live(self):
+        # One inspector per page: restarting it waits (on its worker) for an
+        # inference still running from before the last stop
+        if self.live is None:
+            cfg = load_grading_config()
+            model_cfg = self.model_configs[self.model_name]
+            models = [
+                load_backend(p, model_cfg.get("backend"))
+                for p in resolve_model_paths(self.model_paths[self.model_name])
+            ]
+            self.live_colors = cfg["CUSTOM_DEFECT_COLORS"]
+            self.live = LiveInspector(
+                models,
+                model_cfg,
+                live_config=cfg.get("LIVE_INSPECTION"),
+                filters={
+                    "min_w": SingleModelPipeline.MIN_BOX_W,
+                    "min_h": SingleModelPipeline.MIN_BOX_H,
+                    "min_area": SingleModelPipeline.MIN_AREA,
+                    "min_ratio": SingleModelPipeline.MIN_AREA_RATIO,
+                    "max_ratio": SingleModelPipeline.MAX_AREA_RATIO,
+                    "clip": True,
+                },
+            )
+        self.live.start()
+        self.live_btn.itemconfig(self.live_btn.text_id, text="Live: On")
+
+    def stop_live(self):
+        """
+        Stop live inspection without blocking the Tk thread; returns True if
+        it was running. An in-flight inference may still be finishing: code
+        that uses the shared models next waits with self.live.join() off
+        the Tk thread.
+        """
+        if not self.live_on():
+            return False
+        self.live.stop(wait=False)
+        if self.live_btn is not None and not self._destroyed:
+            self.live_btn.itemconfig(self.live_btn.text_id, text="Live: Off")
+        return True
+
+    def draw_live_overlay(self, frame, result):
+        """Latest live boxes over the RGB preview frame."""
+        frame = frame.copy()
+        for (x1, y1, x2, y2), label in zip(result.boxes, result.labels):
+            color = tuple(self.live_colors.get(label.lower(), (255, 255, 255)))
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
+            cv2.putText(frame, label, (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
+        return frame
+
+    # ================= WARM-UP =================
+    def models_ready(self):
+        return self.warmup is None or self.warmup.is_ready(self.required_models)
+
+    def on_warmup_update(self, status):
+        # Called from the warm-up thread; hop onto the Tk thread
+        if not self._destroyed:
+            self.after(0, self._apply_warmup_state)
+
+    def _apply_warmup_state(self):
+        if self._destroyed:
+            return
+        ready = self.models_ready()
+        busy = self.job is not None or self.stale_job is not None
+        self.capture_btn.set_disabled(not ready or busy)
+        if self.live_btn is not None:
+            self.live_btn.set_disabled(not ready or busy)
+        self.status_label.config(text="Model ready" if ready else "Loading model...")
+
     # ================= CAPTURE =================
     def capture_image(self):
-        if self.latest_frame_raw is None:
+        if self.latest_frame_raw is None or not self.models_ready():
+            return
+        if self.job is not None or self.stale_job is not None:
             return
 
-        detection = self.pcb_detector.detect(self.latest_frame_raw)
+        # The pipelines share the live models; the analysis thread lets an
+        # in-flight live inference finish before loading them
+        self.resume_live = self.stop_live()
+
+        # Hold on to this frame; camera_loop swaps in new arrays rather than mutating it
+        frame = self.latest_frame_raw
+        analysis_cfg = {**DEFAULT_ANALYSIS_CONFIG, **load_grading_config().get("ANALYSIS", {})}
+
+        # Analysis runs off the Tk thread; progress and the result come back through after()
+        self.job = AnalysisJob(
+            lambda job: self.analyse_capture(job, frame),
+            on_progress=lambda stage: self._post(self.show_progress, stage),
+            on_done=lambda job: self._post(self.on_analysis_done, job),
+            timeout=analysis_cfg["timeout_s"],
+            name="capture-analysis",
+        )
+        self.show_progress_overlay()
+        self.job.start()
+
+    def analyse_capture(self, job, frame):
+        """Runs on the analysis thread. Returns (result, detection, capture path), or None if there is no PCB."""
+        job.stage("pcb_detect")
+        detection = self.pcb_detector.detect(frame)
         if detection is None or not detection.detected:
-            self.show_no_pcb_dialog()
-            return
+            return None
 
+        # The PNG is only an archive copy; analysis works on the decoded frame
+        job.stage("archive_capture")
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         raw_path = os.path.join(self.captured_dir, f"{ts}.png")
-        cv2.imwrite(raw_path, self.latest_frame_raw)
+        archive_image(raw_path, frame)
 
+        job.stage("load_models")
+        if self.live is not None:
+            self.live.join()
         if self.grading:
-            self.run_final_grading(raw_path)
+            result = self.build_final_pipeline().run(
+                image_path=raw_path, annotated_dir=self.annotated_dir, image=frame, pcb_detection=detection
+            )
         else:
-            self.run_single_model(raw_path)
+            result = self.build_single_pipeline().run(image_path=raw_path, image=frame, pcb_detection=detection)
+        print(f"[Model Registry] {model_registry.stats()}")
+        return (result, detection, raw_path) if result is not None else None
+
+    def on_analysis_done(self, job):
+        if self._destroyed or job is not self.job:
+            return
+        self.job = None
+        if job.status != AnalysisJob.DONE and job.alive:
+            # A timed-out or cancelled stage may still be using the shared models
+            self.stale_job = job
+            self.after(200, self._wait_for_stale_job)
+        self.hide_progress_overlay()
+
+        if job.status == AnalysisJob.DONE and job.result is not None:
+            result, detection, image_path = job.result
+            self.cleanup()
+            if self.grading:
+                self.show_final_results(result, detection)
+            else:
+                self.show_single_model_results(result, detection, image_path)
+            return
+
+        if job.status == AnalysisJob.DONE:
+            self.show_no_pcb_dialog()
+        elif job.status == AnalysisJob.TIMED_OUT:
+            self.show_analysis_dialog(
+                "Analysis Timed Out",
+                f"The analysis did not finish within {job.timeout:g} seconds. Please retake the image.",
+            )
+        elif job.status == AnalysisJob.FAILED:
+            print(f"[Analysis] Failed: {type(job.error).__name__}: {job.error}")
+            self.show_analysis_dialog("Analysis Failed", f"The image could not be analysed ({job.error}).")
+        else:
+            self.status_label.config(text="Analysis cancelled")
+
+        if self.resume_live and self.stale_job is None:
+            self.start_live()
+
+    def _wait_for_stale_job(self):
+        """Keep Capture and Live disabled until the abandoned analysis thread returns."""
+        if self._destroyed or self.stale_job is None:
+            return
+        if self.stale_job.alive:
+            self.after(200, self._wait_for_stale_job)
+            return
+        print(f"[Analysis] Abandoned {self.stale_job.name} thread has exited")
+        self.stale_job = None
+        self._apply_warmup_state()
+        if self.resume_live and self.models_ready():
+            self.start_live()
+
+    def cancel_analysis(self):
+        if self.job is not None:
+            self.progress_stage_label.config(text="Cancelling...")
+            self.job.cancel()
+
+    def _post(self, callback, *args):
+        """Run callback on the Tk thread (from analysis threads)."""
+        if self._destroyed:
+            return
+        try:
+            self.after(0, callback, *args)
+        except (tk.TclError, RuntimeError):
+            pass  # window closed meanwhile
+
+    # ================= PROGRESS OVERLAY =================
+    def show_progress_overlay(self):
+        self.capture_btn.set_disabled(True)
+        if self.live_btn is not None:
+            self.live_btn.set_disabled(True)
+
+        self.progress_frame = tk.Frame(self.video_holder, bg=self.colors["bg"])
+        self.progress_frame.place(relx=0.5, rely=0.5, anchor="center")
+
+        self.progress_title_label = tk.Label(
+            self.progress_frame,
+            text="Analysing...",
+            font=(theme.font_bold, theme.sizes["title2"]),
+            fg=self.colors["text"],
+            bg=self.colors["bg"]
+        )
+        self.progress_title_label.pack(padx=24, pady=(20, 8))
+
+        self.progress_stage_label = tk.Label(
+            self.progress_frame,
+            text=self.STAGE_LABELS["pcb_detect"],
+            font=(theme.font_regular, theme.sizes["subtitle"]),
+            fg=self.colors["text2"],
+            bg=self.colors["bg"]
+        )
+        self.progress_stage_label.pack(padx=24, pady=(0, 16))
+
+        self.cancel_btn = RoundedButton(
+            self.progress_frame,
+            text="Cancel",
+            width=180,
+            height=80,
+            radius=24,
+            command=self.cancel_analysis,
+            bg=self.colors["danger"],
+            fg=self.colors["text"],
+        )
+        self.cancel_btn.pack(pady=(0, 20))
+        self.after(500, self.tick_progress)
+
+    def show_progress(self, stage):
+        if self.job is None or self.progress_frame is None or self.job.cancelled:
+            return
+        label = self.STAGE_LABELS.get(stage) or self.STAGE_LABELS.get(stage.split(".")[0], stage)
+        self.progress_stage_label.config(text=label)
+
+    def tick_progress(self):
+        if self.job is None or self.progress_frame is None or self._destroyed:
+            return
+        self.progress_title_label.config(text=f"Analysing... {int(self.job.elapsed())} s")
+        self.after(500, self.tick_progress)
+
+    def hide_progress_overlay(self):
+        if self.progress_frame is not None:
+            self.progress_frame.destroy()
+            self.progress_frame = None
+        self._apply_warmup_state()
 
     # ================= SINGLE MODEL =================
-    def run_single_model(self, image_path):
-        model_cfg = self.model_configs[self.model_name]
-        pipeline = SingleModelPipeline(
+    def build_single_pipeline(self):
+        return SingleModelPipeline(
             model_path=self.model_paths[self.model_name],
-            model_config=model_cfg,
+            model_config=self.model_configs[self.model_name],
             enable_trace=(self.model_name.lower() == "model 1")
         )
-        result = pipeline.run(image_path=image_path)
-
-        if result is None:
-            self.show_no_pcb_dialog()
-            return
 
+    def show_single_model_results(self, result, detection, image_path):
         annotated_path = result.get("annotated_image_path", image_path)
-        defect_summary = result.get("defect_summary", {})
-
-        self.cleanup()
         self.show_page(
             ResultsPage,
             monitor=self.monitor,
             original_capture_path=annotated_path,
+            original_image=result.get("annotated_image"),
+            pcb_detection=detection,
             result_image_path=annotated_path,
             model_name=self.model_name,
-            defect_summary=defect_summary,
+            defect_summary=result.get("defect_summary", {}),
             grade=None
         )
 
 
     # ================= FINAL GRADING =================
-    def run_final_grading(self, image_path):
+    def build_final_pipeline(self):
         # Prepare list of folders for final grading
         model_folders = [
             self.model_paths["Model 1"],
@@ -262,7 +551,7 @@ class CameraPage(tk.Frame):
         ]
 
         # Pass the configs; make sure keys match folder paths
-        pipeline = FinalGradingPipeline(
+        return FinalGradingPipeline(
             model_folders=model_folders,
             model_configs={
                 self.model_paths["Model 1"]: self.model_configs["Model 1"],
@@ -270,19 +559,15 @@ class CameraPage(tk.Frame):
             }
         )
 
-        result = pipeline.run(image_path=image_path, annotated_dir=self.annotated_dir)
-        if result is None:
-            self.show_no_pcb_dialog()
-            return
-
-        defect_summary = result.get("defect_summary", {})
-        self.cleanup()
+    def show_final_results(self, result, detection):
         self.show_page(
             ResultsPage,
             monitor=self.monitor,
             original_capture_path=result["annotated_image_path"],
+            original_image=result.get("annotated_image"),
+            pcb_detection=detection,
             model_name="Final PCB Grading",
-            defect_summary=defect_summary,
+            defect_summary=result.get("defect_summary", {}),
             defects_per_model=result.get("defects_per_model"),
             grade=result.get("grade", "Pass")
         )
@@ -302,6 +587,19 @@ class CameraPage(tk.Frame):
             toggle_button=getattr(self.master, "toggle", None)
         )
 
+    def show_analysis_dialog(self, title, message):
+        if self.dialog:
+            self.dialog.destroy()
+        self.dialog = ActionDialog(
+            self,
+            title=title,
+            message=message,
+            confirm_text="Retake",
+            confirm_command=lambda: None,
+            cancel_text="",
+            toggle_button=getattr(self.master, "toggle", None)
+        )
+
     # ================= NAVIGATION =================
     def on_back(self):
         self.cleanup()
@@ -312,6 +610,10 @@ class CameraPage(tk.Frame):
     def cleanup(self):
         self.running = False
         self._destroyed = True
+        if self.job is not None:
+            job, self.job = self.job, None
+            job.cancel()
+        self.stop_live()
         if self.cap:
             self.cap.release()
             self.cap = None
@@ -322,6 +624,8 @@ class CameraPage(tk.Frame):
 
     def _on_destroy(self, *_):
         self.cleanup()
+        if self.warmup is not None:
+            self.warmup.unsubscribe(self.on_warmup_update)
         if self.apply_theme in theme.subscribers:
             theme.subscribers.remove(self.apply_theme)
 
@@ -338,8 +642,16 @@ class CameraPage(tk.Frame):
             self.container.configure(bg=colors["bg"])
             self.video_holder.configure(bg=colors["bg"])
             self.buttons_frame.configure(bg=colors["bg"])
+            self.buttons_row.configure(bg=colors["bg"])
             self.capture_btn.apply_theme(colors)
+            if self.live_btn is not None:
+                self.live_btn.apply_theme(colors)
             self.back_btn.apply_theme(colors)
             self.video_frame.configure(bg=colors["bg"])
+            self.status_label.configure(bg=colors["bg"], fg=colors["text2"])
+            if self.progress_frame is not None:
+                self.progress_frame.configure(bg=colors["bg"])
+                self.progress_title_label.configure(bg=colors["bg"], fg=colors["text"])
+                self.progress_stage_label.configure(bg=colors["bg"], fg=colors["text2"])
         except tk.TclError:
             pass
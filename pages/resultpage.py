@@ -15,24 +15,10 @@ from ui.roundedbutton import RoundedButton
 from ui.printbtn import PrintButton
 from pages.errorpage import ErrorPage
 
-try:
-    from fpdf import FPDF
-except ImportError:
-    FPDF = None
-
 from backend.generateURL import generate_download_url  # Your URL generator
-
-# ---------------- LABELS ----------------
-DEFECT_FULL_LABELS = {
-    "open": "Open Circuit",
-    "short": "Short Circuit",
-    "90": "90° Angle Traces",
-    "ps": "Poor Solder",
-    "sb": "Solder Bridges",
-    "mc": "Missing Components",
-    "resistor": "Resistor",
-    "capacitor": "Capacitor",
-}
+from backend.report_rendering import (
+    FPDF, get_custom_color, get_full_label, render_merged_image, build_report_pdf
+)
 
 GRADE_FEEDBACK = {
     "Pass": "Good Job, your PCB is clean and has little to no detected defects! Keep up the good work!",
@@ -44,23 +30,6 @@ GRADE_FEEDBACK = {
     )
 }
 
-def get_custom_color(label, custom_colors=None):
-    # ensure custom_colors is always a dict
-    if not isinstance(custom_colors, dict):
-        custom_colors = {}
-
-    rgb = custom_colors.get(label)
-    if rgb is None:
-        rgb = theme.colors().get("defect_colors", {}).get(label)
-    if rgb is None:
-        rgb = (255, 0, 0)  # fallback
-
-    return rgb
-
-
-def get_full_label(label):
-    return DEFECT_FULL_LABELS.get(label, label)
-
 # ---------------- RESULTS PAGE ----------------
 class ResultsPage(tk.Frame):
     IMAGE_MAX_WIDTH = 800
@@ -71,11 +40,14 @@ class ResultsPage(tk.Frame):
     MAX_AREA_RATIO = 0.95
 
     def __init__(self, parent, show_page, monitor, original_capture_path, model_name,
-                 defect_summary=None, defects_per_model=None, grade=None, result_image_path=None):
+                 defect_summary=None, defects_per_model=None, grade=None, result_image_path=None,
+                 original_image=None, pcb_detection=None):
         """
         defects_per_model: dict of {model_name: [defect_dict,...]} where defect_dict has keys:
             'label': defect label
             'bbox': (x1, y1, x2, y2)
+        original_image: decoded BGR frame of original_capture_path, when the caller already has it
+        pcb_detection: PCBDetectionResult from capture time, reused by trace detection
         """
         super().__init__(parent)
         self.show_page = show_page
@@ -86,6 +58,8 @@ class ResultsPage(tk.Frame):
 
         # Save original capture separately for Retake button
         self.original_capture_path = original_capture_path
+        self.original_frame = original_image
+        self.pcb_detection = pcb_detection
 
         # Merge defects into one summary for legend
         self.defect_summary = defect_summary or {}
@@ -201,11 +175,12 @@ class ResultsPage(tk.Frame):
         self._printer_available = self._detect_printer()
         self.print_btn.set_disabled(not self._printer_available)
 
-        # Load image
-        if not os.path.exists(self.result_image_path):
+        # Load image (already in memory when _generate_merged_image succeeded)
+        if self.original_image is None and os.path.exists(self.result_image_path):
+            self.original_image = Image.open(self.result_image_path)
+        if self.original_image is None:
             self._show_fatal_error("Result image not found.")
         else:
-            self.original_image = Image.open(self.result_image_path)
             self.top_content_frame.bind("<Configure>", self.resize_image)
 
         # ---------------- System monitor subscription ----------------
@@ -216,83 +191,31 @@ class ResultsPage(tk.Frame):
     # ---------------- Merge defects into single image ----------------
     def _generate_merged_image(self):
         import cv2
-        import numpy as np
-        from PIL import ImageDraw, ImageFont
-        from backend.run_trace_detection import run_trace_detection_and_save
+        from backend.run_trace_detection import run_trace_detection_and_save, trace_options
+        from backend.final_grading_pipeline import load_grading_config
 
-        # Load original PCB image
-        img_bgr = cv2.imread(self.original_capture_path)
+        # Load original PCB image (decode from disk only if no frame was handed over)
+        img_bgr = self.original_frame
+        if img_bgr is None:
+            img_bgr = cv2.imread(self.original_capture_path)
         if img_bgr is None:
             print(f"[Error] Failed to load image: {self.original_capture_path}")
             return
 
-        # Convert to RGB for PIL
-        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img_rgb)
-        draw = ImageDraw.Draw(pil_img)
-
-        # Font for labels
-        try:
-            font = ImageFont.truetype("DejaVuSans-Bold.ttf", 24)
-        except IOError:
-            font = ImageFont.load_default()
-
-        img_area = pil_img.width * pil_img.height
-
-        for model_defects in self.defects_per_model.values():
-            for defect in model_defects:
-                if not isinstance(defect, dict) or "bbox" not in defect:
-                    continue
-                x1, y1, x2, y2 = defect["bbox"]
-                bw, bh = x2 - x1, y2 - y1
-                area = bw * bh
-                area_ratio = area / img_area
-                if bw < self.MIN_BOX_W or bh < self.MIN_BOX_H or area < self.MIN_AREA or area_ratio > self.MAX_AREA_RATIO:
-                    continue  # skip invalid/huge boxes
-                color = get_custom_color(defect["label"])
-                draw.rectangle([x1, y1, x2, y2], outline=color, width=3)
-
-        # ---------------- Draw PCB trace clearance ----------------
+        # ---------------- PCB trace clearance ----------------
+        # Stored for resize_image and the PDF legend
+        self.trace_coords = []
         if self.enable_trace:
             try:
-                # Run detection on BGR image
-                contours, processed_img, trace_coords = run_trace_detection_and_save(img_bgr, visualize=False)
-
-                trace_color = get_custom_color("trace_violation")
-                box_size = 6  # bigger rectangles for visibility
-
-                # Store coords for later use in resize_image
-                self.trace_coords = trace_coords
-
-                for idx, coord in enumerate(trace_coords):
-                    start = tuple(coord["start"])
-                    end   = tuple(coord["end"])
-
-                    # Draw rectangles at start/end
-                    draw.rectangle([start[0]-box_size, start[1]-box_size,
-                                    start[0]+box_size, start[1]+box_size],
-                                outline=trace_color, width=2)
-                    draw.rectangle([end[0]-box_size, end[1]-box_size,
-                                    end[0]+box_size, end[1]+box_size],
-                                outline=trace_color, width=2)
-
-                    # Draw connecting line
-                    draw.line([start, end], fill=trace_color, width=4)
-
-                    # Draw label T1, T2, ... with small white background for readability
-                    label_text = f"T{idx+1}"
-                    text_offset = (8, -8)
-                    x, y = start[0]+text_offset[0], start[1]+text_offset[1]
-
-                    # Draw white rectangle behind text
-                    text_w, text_h = draw.textsize(label_text, font=font)
-                    draw.rectangle([x-1, y-1, x+text_w+1, y+text_h+1], fill=(255,255,255))
-                    draw.text((x, y), label_text, fill=trace_color, font=font)
-
+                _, _, self.trace_coords = run_trace_detection_and_save(
+                    img_bgr, visualize=False, pcb_detection=self.pcb_detection,
+                    capture_id=os.path.basename(self.original_capture_path),
+                    **trace_options(load_grading_config()),
+                )
             except Exception as e:
                 print(f"[Trace Annotation] Failed: {e}")
-        else:
-            self.trace_coords = []
+
+        pil_img = render_merged_image(img_bgr, self.defects_per_model, self.trace_coords)
 
         # Save merged image
         os.makedirs(os.path.dirname(self.result_image_path), exist_ok=True)
@@ -496,85 +419,7 @@ class ResultsPage(tk.Frame):
 
                 # Always regenerate merged image to ensure trace violations are drawn
                 self._generate_merged_image()
-
-                # Open merged image
-                img_rgb_path = self.result_image_path
-                with Image.open(img_rgb_path) as im:
-                    if im.mode != "RGB":
-                        im = im.convert("RGB")
-                        tmp_path = os.path.join(model_folder, "tmp_merged_result.jpg")
-                        im.save(tmp_path, format="JPEG")
-                        img_rgb_path = tmp_path
-
-                    # Draw trace violations again to be sure
-                    draw = ImageDraw.Draw(im)
-                    trace_color = get_custom_color("trace_violation")
-                    box_size = 6
-                    for idx, coord in enumerate(getattr(self, "trace_coords", [])):
-                        start = tuple(coord["start"])
-                        end = tuple(coord["end"])
-
-                        draw.rectangle([start[0]-box_size, start[1]-box_size, start[0]+box_size, start[1]+box_size],
-                                    outline=trace_color, width=2)
-                        draw.rectangle([end[0]-box_size, end[1]-box_size, end[0]+box_size, end[1]+box_size],
-                                    outline=trace_color, width=2)
-                        draw.line([start, end], fill=trace_color, width=4)
-                        draw.text((start[0]+8, start[1]-8), f"T{idx+1}", fill=trace_color)
-
-                    # Save temporary image for PDF
-                    tmp_path = os.path.join(model_folder, "tmp_for_pdf.jpg")
-                    im.save(tmp_path, format="JPEG")
-                    img_rgb_path = tmp_path
-
-                # ---------------- Create PDF ----------------
-                pdf = FPDF()
-                pdf.add_page()
-                pdf.set_font("Arial", "B", 30)
-                pdf.cell(0, 10, "Analysis Results", ln=True, align="C")
-                pdf.ln(10)
-
-                # Fit image to PDF width
-                pdf_w = pdf.w - 20
-                img = Image.open(img_rgb_path)
-                iw, ih = img.size
-                ratio = pdf_w / iw
-                pdf.image(img_rgb_path, x=10, y=None, w=pdf_w, h=ih*ratio)
-                pdf.ln(10)
-
-                # ---------------- Draw legend ----------------
-                pdf.set_font("Arial", "B", 18)
-                pdf.cell(0, 8, "Legend:", ln=True)
-                pdf.ln(5)
-
-                rect_size = 5
-                spacing_x = 5
-                spacing_y = 3
-
-                legend_items = dict(self.defect_summary)
-                for label, count in legend_items.items():
-                    full_label = "Trace Violation" if label == "trace_violation" else get_full_label(label)
-                    color = get_custom_color(label)
-
-                    x, y = pdf.get_x(), pdf.get_y()
-                    pdf.set_fill_color(*color)
-                    if color == (255, 255, 255):
-                        pdf.set_draw_color(0, 0, 0)
-                    else:
-                        pdf.set_draw_color(*color)
-                        
-                    pdf.rect(x, y, rect_size, rect_size, style="FD")
-                    pdf.set_xy(x + rect_size + spacing_x, y)
-                    pdf.set_text_color(0, 0, 0)
-                    pdf.cell(0, rect_size, f"{full_label} ({count})", ln=True)
-                    pdf.ln(spacing_y)
-
-                if self.grade:
-                    pdf.ln(10)
-                    pdf.set_font("Arial", "B", 28)
-                    pdf.set_text_color(0, 0, 0)
-                    pdf.cell(0, 10, f"Final Grade: {self.grade}", ln=True, align="C")
-
-                pdf.output(pdf_path)
+                build_report_pdf(self.original_image, self.defect_summary, self.grade, pdf_path)
 
             # Generate signed download URL
             url = generate_download_url(self.model_name, pdf_filename)
@@ -821,6 +666,8 @@ class ResultsPage(tk.Frame):
                     next_page_kwargs={
                         "monitor": self.monitor,
                         "original_capture_path": self.original_capture_path,
+                        "original_image": self.original_frame,
+                        "pcb_detection": self.pcb_detection,
                         "model_name": self.model_name,
                         "defect_summary": self.defect_summary,
                         "defects_per_model": self.defects_per_model,
@@ -8,13 +8,15 @@ from flask import (
     url_for,
     send_file,
     make_response,
-    flash
+    flash,
+    jsonify
 )
 import os
 import time
 import hmac
 import hashlib
 import json
+import sqlite3
 from dotenv import load_dotenv
 
 # -------------------------------------------------
@@ -41,6 +43,8 @@ app.secret_key = FLASK_SECRET
 # -------------------------------------------------
 ANNOTATED_DIR = "/home/jmc2/VisionBoard-Proj/annotated_images"
 CONFIG_PATH = "/home/jmc2/VisionBoard-Proj/config/grading_config.json"
+TIMINGS_PATH = "/home/jmc2/VisionBoard-Proj/logs/pipeline_timings.json"  # written by backend/timing.py
+TRACE_LOG_DB = "/home/jmc2/VisionBoard-Proj/pcb_trace_results/trace_logs.sqlite3"  # written by backend/trace_log.py
 
 # -------------------------------------------------
 # DEFAULT CONFIG
@@ -56,6 +60,9 @@ DEFAULT_CONFIG = {
     "MIN_BOX_HEIGHT": 6
 }
 
+# Inference engines selectable per model (see backend/inference_backend.py)
+INFERENCE_BACKENDS = ["torch", "onnxruntime", "onnxruntime-int8", "opencv"]
+
 # -------------------------------------------------
 # NGROK WARNING SKIP
 # -------------------------------------------------
@@ -86,14 +93,32 @@ def save_config(cfg):
 # -------------------------------------------------
 # SIGNATURE HELPERS (DOWNLOAD SECURITY)
 # -------------------------------------------------
-def generate_signature(model, filename, expires):
-    msg = f"{model}|{filename}|{expires}".encode()
+def generate_signature(purpose, fields, expires):
+    # The purpose names the endpoint, so a link signed for one never verifies on another
+    msg = "|".join([purpose, *fields, str(expires)]).encode()
     return hmac.new(HMAC_SECRET, msg, hashlib.sha256).hexdigest()
 
-def verify_signature(model, filename, expires, signature):
-    expected = generate_signature(model, filename, expires)
+def verify_signature(purpose, fields, expires, signature):
+    expected = generate_signature(purpose, fields, expires)
     return hmac.compare_digest(expected, signature)
 
+def require_signed_link(purpose, *fields):
+    """
+    Same check as the download links: an expiring HMAC over purpose|fields|expires
+    (see backend/generateURL.py generate_signed_url).
+    """
+    expires = request.args.get("expires")
+    signature = request.args.get("sig")
+
+    if not all([expires, signature]):
+        abort(403)
+    try:
+        expired = time.time() > float(expires)
+    except ValueError:
+        abort(403)
+    if expired or not verify_signature(purpose, fields, expires, signature):
+        abort(403)
+
 # =================================================
 # PROFESSOR CONFIG PAGE
 # =================================================
@@ -118,6 +143,7 @@ def config_page():
                 conf = request.form.get(f"conf_{model_name}")
                 iou = request.form.get(f"iou_{model_name}")
                 max_det = request.form.get(f"max_det_{model_name}")
+                backend = request.form.get(f"backend_{model_name}")
 
                 if conf is not None:
                     params["conf"] = float(conf)
@@ -125,6 +151,10 @@ def config_page():
                     params["iou"] = float(iou)
                 if max_det is not None:
                     params["max_det"] = int(max_det)
+                if backend is not None:
+                    if backend not in INFERENCE_BACKENDS:
+                        raise ValueError(f"unknown inference backend '{backend}'")
+                    params["backend"] = backend
 
             save_config(cfg)
             flash("Configuration updated successfully!", "success")
@@ -133,7 +163,50 @@ def config_page():
         except Exception as e:
             flash(f"Error saving config: {e}", "danger")
 
-    return render_template("config.html", config=cfg)
+    return render_template("config.html", config=cfg, backends=INFERENCE_BACKENDS)
+
+# =================================================
+# PIPELINE TIMINGS (rolling aggregate of recent runs)
+# =================================================
+@app.route("/timings")
+def timings_page():
+    require_signed_link("timings")
+    if not os.path.exists(TIMINGS_PATH):
+        return jsonify({"pipelines": {}})
+    with open(TIMINGS_PATH, "r") as f:
+        data = json.load(f)
+    data.pop("recent", None)  # raw runs the pipelines merge into the aggregate
+    return jsonify(data)
+
+# =================================================
+# TRACE MEASUREMENTS (per capture)
+# =================================================
+@app.route("/traces/<capture_id>")
+def trace_logs_page(capture_id):
+    require_signed_link("traces", capture_id)
+    if not os.path.exists(TRACE_LOG_DB):
+        return jsonify([])
+    conn = sqlite3.connect(f"file:{TRACE_LOG_DB}?mode=ro", uri=True, timeout=30)
+    try:
+        rows = conn.execute(
+            "SELECT created, image_path, violations, cached, timings, distances, coords "
+            "FROM trace_logs WHERE capture_id = ? ORDER BY id DESC LIMIT 20",
+            (capture_id,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return jsonify([
+        {
+            "created": created,
+            "image_path": image_path,
+            "violations": violations,
+            "cached": bool(cached),
+            "timings": json.loads(timings),
+            "distances": json.loads(distances),
+            "coords": json.loads(coords),
+        }
+        for created, image_path, violations, cached, timings, distances, coords in rows
+    ])
 
 # =================================================
 # STUDENT DOWNLOAD PAGE
@@ -151,7 +224,7 @@ def download_page():
     if time.time() > float(expires):
         return "<h2>Link expired</h2>", 403
 
-    if not verify_signature(model, filename, expires, signature):
+    if not verify_signature("download", (model, filename), expires, signature):
         abort(403)
 
     preview_url = url_for(
@@ -193,7 +266,7 @@ def download_file():
         abort(403)
     if time.time() > float(expires):
         return "<h2>Link expired</h2>", 403
-    if not verify_signature(model, filename, expires, signature):
+    if not verify_signature("download", (model, filename), expires, signature):
         abort(403)
 
     file_path = os.path.join(ANNOTATED_DIR, model, filename)
@@ -0,0 +1,144 @@
+import cv2
+import numpy as np
+import pytest
+
+from backend.measure_trace_dist import (
+    measure_parallel_trace_distances, measure_trace_clearances_dt, trace_features, candidate_pairs,
+    MAX_DISTANCE_PX, RAY_STEPS,
+)
+
+SHAPE = (300, 400)
+
+
+def polygon(points, shape=SHAPE):
+    """Contour of one filled polygon, as detect_traces finds it."""
+    mask = np.zeros(shape, np.uint8)
+    cv2.fillPoly(mask, [np.array(points, np.int32)], 255)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours[0]
+
+
+def rect(x, y, w, h):
+    return polygon([[x, y], [x + w - 1, y], [x + w - 1, y + h - 1], [x, y + h - 1]])
+
+
+def rotated(center, size, angle):
+    return polygon(cv2.boxPoints((center, size, angle)))
+
+
+def rays(contours, **kwargs):
+    return measure_parallel_trace_distances(contours, SHAPE, annotate=False, **kwargs)
+
+
+def distance_transform(contours, **kwargs):
+    return measure_trace_clearances_dt(contours, SHAPE, annotate=False, **kwargs)
+
+
+def test_features_match_opencv():
+    contour = rotated((200, 150), (180, 24), 30)
+    features = trace_features([contour])
+    moments = cv2.moments(contour)
+
+    assert features.area[0] == pytest.approx(cv2.contourArea(contour))
+    assert features.centroid[0] == pytest.approx((moments["m10"] / moments["m00"], moments["m01"] / moments["m00"]))
+    assert tuple(features.bbox[0]) == cv2.boundingRect(contour)
+    vx, vy = cv2.fitLine(contour, cv2.DIST_L2, 0, 0.01, 0.01).ravel()[:2]
+    assert abs(np.dot(features.direction[0], (vx, vy))) == pytest.approx(1.0, abs=1e-4)
+
+
+def test_pairs_are_near_and_parallel():
+    contours = [
+        rect(20, 40, 200, 20),   # 0
+        rect(20, 66, 200, 20),   # 1: parallel, 6 px gap
+        rect(20, 200, 200, 20),  # 2: parallel, far away
+        rect(226, 20, 20, 120),  # 3: 6 px beside 0 and 1, but perpendicular
+    ]
+    assert candidate_pairs(trace_features(contours)).tolist() == [[0, 1]]
+
+
+def test_angle_threshold():
+    base = rect(20, 40, 300, 20)
+    slightly = rotated((170, 80), (300, 20), 3)
+    tilted = rotated((170, 80), (300, 20), 10)
+    assert candidate_pairs(trace_features([base, slightly])).tolist() == [[0, 1]]
+    assert candidate_pairs(trace_features([base, tilted])).tolist() == []
+
+
+@pytest.mark.parametrize("gap", [1, 4, 9, 14])
+def test_gap_is_measured_to_the_next_ray_step(gap):
+    # Contour rows are gap + 1 px apart; rays sample the normal at RAY_STEPS
+    results, image, coord_logs = rays([rect(20, 40, 200, 20), rect(20, 60 + gap, 200, 20)])
+
+    assert image is None
+    assert len(results) == 1
+    from_trace, to_trace, steps = results[0]
+    assert (from_trace, to_trace) == (0, 1)
+    assert steps == RAY_STEPS[np.searchsorted(RAY_STEPS, gap + 1)]
+    assert coord_logs[0]["kind"] == "clearance"
+    assert coord_logs[0]["start"][1] == 59
+    assert coord_logs[0]["normal"] == pytest.approx((0, 1))
+
+
+def test_gaps_beyond_max_distance_are_not_violations():
+    last = MAX_DISTANCE_PX - 1  # contours MAX_DISTANCE_PX apart: the last ray step
+    assert len(rays([rect(20, 40, 200, 20), rect(20, 60 + last, 200, 20)])[0]) == 1
+    assert rays([rect(20, 40, 200, 20), rect(20, 61 + last, 200, 20)])[0] == []
+
+
+def test_offset_and_small_traces():
+    contours = [rect(20, 40, 200, 20), rect(20, 66, 200, 20), rect(230, 40, 10, 10)]  # last one below MIN_TRACE_AREA
+    _, _, local = rays(contours)
+    results, _, shifted = rays(contours, offset=(100, 50))
+
+    assert [r[:2] for r in results] == [(0, 1)]
+    assert shifted[0]["start"] == (local[0]["start"][0] + 100, local[0]["start"][1] + 50)
+    assert shifted[0]["end"] == (local[0]["end"][0] + 100, local[0]["end"][1] + 50)
+
+
+# ---------- Distance-transform engine ----------
+@pytest.mark.parametrize("gap", [1, 4, 9, 14])
+def test_distance_transform_measures_copper_to_copper(gap):
+    results, image, coord_logs = distance_transform([rect(20, 40, 200, 20), rect(20, 60 + gap, 200, 20)])
+
+    assert image is None
+    assert results == [(0, 1, float(gap + 1))]
+    assert coord_logs[0]["kind"] == "clearance"
+    assert coord_logs[0]["start"][1] == 59
+    assert coord_logs[0]["end"][1] == 60 + gap
+    assert coord_logs[0]["normal"] == pytest.approx((0, 1))
+
+
+def test_distance_transform_max_distance_and_offset():
+    last = MAX_DISTANCE_PX - 1
+    assert len(distance_transform([rect(20, 40, 200, 20), rect(20, 60 + last, 200, 20)])[0]) == 1
+    assert distance_transform([rect(20, 40, 200, 20), rect(20, 61 + last, 200, 20)])[0] == []
+
+    contours = [rect(20, 40, 200, 20), rect(20, 66, 200, 20)]
+    _, _, local = distance_transform(contours)
+    _, _, shifted = distance_transform(contours, offset=(100, 50))
+    assert shifted[0]["start"] == (local[0]["start"][0] + 100, local[0]["start"][1] + 50)
+
+
+def test_distance_transform_measures_every_neighbouring_pair():
+    contours = [rect(20, 40, 200, 20), rect(20, 66, 200, 20), rect(226, 20, 20, 120)]
+    results, _, _ = distance_transform(contours)
+    assert results == [(0, 1, 7.0), (0, 2, 7.0), (1, 2, 7.0)]
+
+
+@pytest.mark.parametrize("angle", [0, 2, 90])
+def test_engines_agree_on_parallel_traces(angle):
+    # Three parallel traces, 5 and 11 px apart, rotated together about the image centre
+    center = np.array([SHAPE[1] / 2, SHAPE[0] / 2])
+    rotation = cv2.getRotationMatrix2D(tuple(center), angle, 1.0)
+    contours = []
+    for y in (90, 115, 146):
+        corners = np.array([[100, y], [299, y], [299, y + 19], [100, y + 19]], np.float64)
+        contours.append(polygon(np.round(cv2.transform(corners[None], rotation)[0])))
+
+    by_rays = {(a, b): d for a, b, d in rays(contours)[0]}
+    by_dt = {(a, b): d for a, b, d in distance_transform(contours)[0]}
+    assert set(by_rays) == set(by_dt) == {(0, 1), (1, 2)}
+    # Rays stop at the next sample; rotated edges are rasterised to within a pixel
+    tolerance = (RAY_STEPS[1] - RAY_STEPS[0]) + 1
+    for pair in by_rays:
+        assert by_rays[pair] == pytest.approx(by_dt[pair], abs=tolerance)
@@ -0,0 +1,48 @@
+import cv2
+import numpy as np
+
+from backend.measure_trace_dist import measure_trace_widths, trace_features
+
+
+def straight_trace(width=9, length=220, tip=20, shape=(60, 320)):
+    """Mask of one horizontal trace whose ends taper to a point over `tip` px."""
+    mask = np.zeros(shape, np.uint8)
+    y0, x0 = shape[0] // 2 - width // 2, 50
+    mask[y0:y0 + width, x0:x0 + length] = 255
+    for x_end, x_tip in ((x0, x0 - tip), (x0 + length - 1, x0 + length - 1 + tip)):
+        cv2.fillPoly(mask, [np.array([[x_end, y0], [x_tip, y0 + width // 2], [x_end, y0 + width - 1]])], 255)
+    return mask
+
+
+def measure(mask, **kwargs):
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    return measure_trace_widths(mask, trace_features(contours), **kwargs)
+
+
+def test_straight_trace_has_no_narrow_ends():
+    widths, coord_logs = measure(straight_trace(width=9))
+    assert widths == {0: {"min": 9.0, "median": 9.0}}
+    assert coord_logs == []
+
+
+def test_neck_in_the_middle_is_reported():
+    mask = straight_trace(width=9)
+    mask[26:29, 150:160] = 0
+    mask[32:35, 150:160] = 0
+
+    widths, coord_logs = measure(mask)
+    assert widths[0]["min"] == 3.0
+    assert widths[0]["median"] == 9.0
+    assert len(coord_logs) == 1
+    assert coord_logs[0]["steps"] == 3.0
+    assert 150 <= coord_logs[0]["start"][0] < 160
+
+
+def test_offset_shifts_logged_coordinates():
+    mask = straight_trace(width=9)
+    mask[26:29, 150:160] = 0
+    mask[32:35, 150:160] = 0
+
+    _, local = measure(mask)
+    _, shifted = measure(mask, offset=(100, 40))
+    assert shifted[0]["start"] == (local[0]["start"][0] + 100, local[0]["start"][1] + 40)
@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+
+import pytest
+
+from backend.model_registry import ModelRegistry, resolve_model_paths
+
+MB = 1024 * 1024
+
+
+class StubModel:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def nbytes(self):
+        return self.size
+
+
+class StubLoader:
+    """Counts loads per path; each one takes `delay` s and yields a model of `size` bytes."""
+
+    def __init__(self, size=MB, delay=0.0):
+        self.size = size
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, path):
+        with self._lock:
+            self.calls.append(path)
+        time.sleep(self.delay)
+        return StubModel(path, self.size)
+
+
+@pytest.fixture
+def weights(tmp_path):
+    def make(name):
+        path = tmp_path / name
+        path.write_bytes(b"weights")
+        return str(path)
+    return make
+
+
+def test_concurrent_gets_load_once(weights):
+    registry = ModelRegistry()
+    loader = StubLoader(delay=0.2)
+    path = weights("a.pt")
+    results = []
+
+    def get():
+        results.append(registry.get(path, loader=loader))
+
+    threads = [threading.Thread(target=get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert loader.calls == [os.path.abspath(path)]
+    assert len(results) == 8 and all(r is results[0] for r in results)
+    assert registry.stats()["misses"] == 1 and registry.stats()["hits"] == 7
+
+
+def test_failed_load_is_not_cached(weights):
+    registry = ModelRegistry()
+    path = weights("a.pt")
+
+    def broken(_):
+        raise RuntimeError("corrupt weights")
+
+    with pytest.raises(RuntimeError):
+        registry.get(path, loader=broken)
+    assert registry.get(path, loader=StubLoader()).path == os.path.abspath(path)
+
+
+def test_changed_mtime_reloads(weights):
+    registry = ModelRegistry()
+    loader = StubLoader()
+    path = weights("a.pt")
+
+    first = registry.get(path, loader=loader)
+    assert registry.get(path, loader=loader) is first
+
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))  # re-trained in place
+    second = registry.get(path, loader=loader)
+
+    assert second is not first
+    assert len(loader.calls) == 2
+    assert registry.stats()["entries"] == 1  # the stale entry is dropped
+
+
+def test_variants_are_cached_separately(weights):
+    registry = ModelRegistry()
+    loader = StubLoader()
+    path = weights("a.pt")
+    assert registry.get(path, loader=loader, variant="torch") is not registry.get(path, loader=loader, variant="onnx")
+    assert len(loader.calls) == 2
+
+
+def test_budget_evicts_least_recently_used(weights):
+    registry = ModelRegistry(budget_mb=2.5)
+    loader = StubLoader(size=MB)
+    a, b, c = weights("a.pt"), weights("b.pt"), weights("c.pt")
+
+    registry.get(a, loader=loader)
+    registry.get(b, loader=loader)
+    registry.get(a, loader=loader)  # a is now the most recently used
+    registry.get(c, loader=loader)  # 3 MB > 2.5 MB: b goes
+
+    assert registry.stats()["evictions"] == 1
+    registry.get(a, loader=loader)
+    registry.get(c, loader=loader)
+    assert len(loader.calls) == 3
+    registry.get(b, loader=loader)
+    assert len(loader.calls) == 4
+
+
+def test_most_recent_entry_survives_a_small_budget(weights):
+    registry = ModelRegistry(budget_mb=1)
+    loader = StubLoader(size=5 * MB)
+    a, b = weights("a.pt"), weights("b.pt")
+
+    registry.get(a, loader=loader)
+    model = registry.get(b, loader=loader)
+    assert registry.stats()["entries"] == 1
+    assert registry.get(b, loader=loader) is model
+
+    registry.set_budget(0)
+    assert registry.stats()["entries"] == 1
+
+
+def test_resolve_model_paths(tmp_path, weights):
+    weights("b.pt")
+    weights("a.pt")
+    (tmp_path / "notes.txt").write_text("")
+    assert resolve_model_paths(str(tmp_path)) == [str(tmp_path / "a.pt"), str(tmp_path / "b.pt")]
+    assert resolve_model_paths(str(tmp_path / "a.pt")) == [str(tmp_path / "a.pt")]
+    assert resolve_model_paths(str(tmp_path / "missing")) == []
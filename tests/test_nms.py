@@ -0,0 +1,95 @@
+import numpy as np
+
+from backend.nms import non_max_suppression, batched_nms, nms_by_label
+
+
+def reference_nms(boxes, scores, iou_thresh):
+    """Plain greedy NMS: take the best remaining box, drop everything above iou_thresh with it."""
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    remaining = list(np.argsort(-np.asarray(scores, dtype=np.float64), kind="stable"))
+    keep = []
+    while remaining:
+        i = remaining.pop(0)
+        keep.append(i)
+        survivors = []
+        for j in remaining:
+            w = max(0.0, min(boxes[i, 2], boxes[j, 2]) - max(boxes[i, 0], boxes[j, 0]))
+            h = max(0.0, min(boxes[i, 3], boxes[j, 3]) - max(boxes[i, 1], boxes[j, 1]))
+            union = areas[i] + areas[j] - w * h
+            if (w * h / union if union > 0 else 0.0) <= iou_thresh:
+                survivors.append(j)
+        remaining = survivors
+    return keep
+
+
+def reference_by_label(boxes, scores, labels, iou_thresh):
+    keep = []
+    for label in set(labels):
+        idxs = [k for k, l in enumerate(labels) if l == label]
+        keep += [idxs[k] for k in reference_nms([boxes[k] for k in idxs], [scores[k] for k in idxs], iou_thresh)]
+    return sorted(keep, key=lambda k: (-scores[k], k))
+
+
+def random_detections(rng, n, n_labels=3):
+    """Boxes clustered around a few defects, as when several models fire on the same spot."""
+    centers = rng.uniform(0, 600, size=(max(1, n // 6), 2))
+    c = centers[rng.integers(len(centers), size=n)] + rng.normal(0, 8, size=(n, 2))
+    wh = rng.uniform(5, 60, size=(n, 2))
+    boxes = np.round(np.hstack([c - wh / 2, c + wh / 2]))
+    scores = np.round(rng.uniform(0.2, 1.0, size=n), 2)  # rounded, so ties occur
+    labels = [f"defect{k}" for k in rng.integers(n_labels, size=n)]
+    return boxes.tolist(), scores.tolist(), labels
+
+
+def test_matches_reference_on_random_clusters():
+    rng = np.random.default_rng(0)
+    for trial in range(200):
+        boxes, scores, labels = random_detections(rng, int(rng.integers(1, 80)))
+        thresh = float(rng.choice([0.1, 0.3, 0.5, 0.7]))
+
+        single = non_max_suppression(boxes, scores, thresh).tolist()
+        assert single == reference_nms(boxes, scores, thresh), trial
+        assert nms_by_label(boxes, scores, labels, thresh).tolist() == \
+            reference_by_label(boxes, scores, labels, thresh), trial
+
+
+def test_identical_boxes_keep_the_first_of_equal_scores():
+    boxes = [[10, 10, 50, 50]] * 3
+    assert non_max_suppression(boxes, [0.5, 0.9, 0.9]).tolist() == [1]
+    assert non_max_suppression(boxes, [0.7, 0.7, 0.7]).tolist() == [0]
+
+
+def test_zero_area_boxes_are_kept():
+    boxes = [[10, 10, 10, 50], [10, 10, 10, 50], [0, 20, 40, 20], [0, 0, 40, 40]]
+    scores = [0.9, 0.8, 0.7, 0.6]
+    keep = non_max_suppression(boxes, scores, 0.3)
+    assert keep.tolist() == [0, 1, 2, 3] == reference_nms(boxes, scores, 0.3)
+
+
+def test_iou_equal_to_threshold_is_kept():
+    # Intersection 40, union 160: IoU is exactly 0.25
+    boxes = [[0, 0, 10, 10], [6, 0, 16, 10]]
+    scores = [0.9, 0.8]
+    assert non_max_suppression(boxes, scores, 0.25).tolist() == [0, 1]
+    assert non_max_suppression(boxes, scores, 0.2499).tolist() == [0]
+
+
+def test_classes_never_suppress_each_other():
+    boxes = [[0, 0, 100, 100], [0, 0, 100, 100], [1, 1, 99, 99]]
+    scores = [0.9, 0.8, 0.7]
+    assert batched_nms(boxes, scores, [0, 1, 0]).tolist() == [0, 1]
+    assert nms_by_label(boxes, scores, ["short", "open", "short"]).tolist() == [0, 1]
+
+
+def test_class_offset_separates_far_apart_boxes():
+    # Overlapping boxes of different classes, spread over the whole coordinate range
+    boxes = [[900, 0, 1000, 100], [0, 0, 100, 100], [-50, 0, 50, 100]]
+    scores = [0.9, 0.8, 0.7]
+    assert sorted(batched_nms(boxes, scores, [0, 1, 2]).tolist()) == [0, 1, 2]
+
+
+def test_empty_input():
+    assert non_max_suppression([], []).tolist() == []
+    assert batched_nms([], [], []).tolist() == []
+    assert nms_by_label([], [], []).tolist() == []
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend import result_cache as rc
+from backend.result_cache import ResultCache, frame_digest, config_digest, make_key, MEMORY, DISK, MISS
+
+
+def make_cache(tmp_path, **cfg):
+    cache = ResultCache(cache_dir=str(tmp_path))
+    cache.configure(cfg)
+    return cache
+
+
+def folder_size(path):
+    return sum(e.stat().st_size for e in os.scandir(path) if e.name.endswith(".pkl"))
+
+
+def test_keys_are_stable_and_content_based():
+    frame = np.arange(60, dtype=np.uint8).reshape(4, 5, 3)
+    assert frame_digest(frame) == frame_digest(frame.copy())
+    assert frame_digest(frame) != frame_digest(frame.reshape(5, 4, 3))
+    assert frame_digest(frame) != frame_digest(frame.astype(np.uint16))
+    assert frame_digest(frame[:, ::-1]) == frame_digest(np.ascontiguousarray(frame[:, ::-1]))
+
+    assert config_digest({"a": 1, "b": [2, 3]}) == config_digest({"b": [2, 3], "a": 1})
+    assert config_digest({"a": 1}) != config_digest({"a": 2})
+    assert make_key("final", "x", 1) == make_key("final", "x", 1)
+    assert make_key("final", "x", 1).startswith("final-")
+    assert make_key("final", "x", 1) != make_key("single", "x", 1)
+
+
+def test_tiers_and_counters(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.get("k") == (None, MISS)
+
+    cache.put("k", {"boxes": [1, 2]})
+    assert cache.get("k") == ({"boxes": [1, 2]}, MEMORY)
+
+    # Another process (or a restart) finds the file, then has it in memory
+    other = make_cache(tmp_path)
+    assert other.get("k") == ({"boxes": [1, 2]}, DISK)
+    assert other.get("k") == ({"boxes": [1, 2]}, MEMORY)
+
+    assert cache.stats()["hits"] == {MEMORY: 1, DISK: 0} and cache.stats()["misses"] == 1
+    assert other.stats()["hits"] == {MEMORY: 1, DISK: 1} and other.stats()["misses"] == 0
+
+
+def test_disabled_cache_always_misses(tmp_path):
+    cache = make_cache(tmp_path, enabled=False)
+    cache.put("k", 1)
+    assert cache.get("k") == (None, MISS)
+    assert folder_size(tmp_path) == 0
+
+
+def test_values_are_copies(tmp_path):
+    cache = make_cache(tmp_path)
+    value = {"boxes": [[1, 2, 3, 4]]}
+    cache.put("k", value)
+    value["boxes"].append([5, 6, 7, 8])
+
+    first, _ = cache.get("k")
+    first["boxes"].clear()
+    assert cache.get("k")[0] == {"boxes": [[1, 2, 3, 4]]}
+
+
+def test_memory_lru_keeps_recently_used(tmp_path):
+    cache = make_cache(tmp_path, memory_entries=2, disk_budget_mb=0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("a") == (1, MEMORY)
+    assert cache.get("c") == (3, MEMORY)
+    assert cache.get("b") == (None, MISS)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_budget_removes_least_recently_used_files(tmp_path):
+    blob = b"x" * 4000
+    cache = make_cache(tmp_path, memory_entries=1, disk_budget_mb=10000 / (1024 * 1024))  # room for two
+    for t, key in enumerate("abc"):
+        cache.put(key, blob)
+        os.utime(cache._path(key), (1000 + t, 1000 + t))
+
+    assert not os.path.exists(cache._path("a"))
+    assert os.path.exists(cache._path("b")) and os.path.exists(cache._path("c"))
+    assert cache._disk_used == folder_size(tmp_path) <= cache.disk_budget_bytes
+
+    # A disk hit refreshes the file, so the other one goes next
+    cache.get("b")
+    cache.put("d", blob)
+    assert os.path.exists(cache._path("b")) and not os.path.exists(cache._path("c"))
+
+
+def test_disk_usage_tracks_rewrites_and_rescans_other_writers(tmp_path, monkeypatch):
+    monkeypatch.setattr(rc, "DISK_RESCAN_EVERY", 3)
+    cache = make_cache(tmp_path)
+    other = make_cache(tmp_path)
+
+    cache.put("a", b"x" * 100)  # first put scans the folder
+    cache.put("a", b"x" * 300)  # replaced, not added
+    assert cache._disk_used == folder_size(tmp_path)
+
+    other.put("b", b"y" * 1000)
+    cache.put("c", b"z" * 10)
+    assert cache._disk_used < folder_size(tmp_path)  # not seen until the next rescan
+    cache.put("d", b"z" * 10)  # third put since the scan
+    assert cache._disk_used == folder_size(tmp_path)
+
+
+@pytest.mark.parametrize("corrupt", [b"", b"not a pickle"])
+def test_unreadable_files_are_misses(tmp_path, corrupt):
+    cache = make_cache(tmp_path)
+    with open(cache._path("k"), "wb") as f:
+        f.write(corrupt)
+    assert cache.get("k") == (None, MISS)
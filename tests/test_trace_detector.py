@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_pcb import make_synthetic_pcb, synthetic_set
+from backend.trace_detector import detect_traces
+
+# Boards whose violations all lie on traces the coarse pass separates cleanly
+BOARDS = [
+    {"seed": 10, "board_color": "green", "n_traces": 24},
+    {"seed": 19, "board_color": "bare", "n_traces": 40},
+]
+
+
+@pytest.mark.parametrize("engine", ["rays", "distance_transform"])
+@pytest.mark.parametrize("spec", BOARDS)
+def test_coarse_to_fine_matches_full_resolution(spec, engine):
+    img = make_synthetic_pcb(**spec)
+    _, _, _, full, _ = detect_traces(img, visualize=False, clearance_engine=engine)
+    _, _, _, coarse, _ = detect_traces(img, visualize=False, clearance_engine=engine, coarse_scale=4)
+
+    assert full and len(coarse) == len(full)
+    for a, b in zip(sorted(full, key=lambda m: m["start"]), sorted(coarse, key=lambda m: m["start"])):
+        assert b["steps"] == pytest.approx(a["steps"], abs=0.5)
+        assert np.hypot(b["start"][0] - a["start"][0], b["start"][1] - a["start"][1]) < 5
+
+
+def test_coarse_pairs_are_between_distinct_traces():
+    for _, spec in synthetic_set(15):
+        img = make_synthetic_pcb(**spec)
+        for engine in ("rays", "distance_transform"):
+            _, _, _, coord_logs, _ = detect_traces(img, visualize=False, clearance_engine=engine, coarse_scale=4)
+            assert all(m["kind"] == "clearance" and m["from_trace"] != m["to_trace"] for m in coord_logs)
+
+
+def test_widths_need_full_resolution():
+    img = make_synthetic_pcb(**BOARDS[0])
+    with pytest.raises(ValueError):
+        detect_traces(img, visualize=False, measure_width=True, coarse_scale=4)
+    *_, widths = detect_traces(img, visualize=False, measure_width=True)
+    assert widths